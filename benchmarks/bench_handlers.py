@@ -0,0 +1,260 @@
+"""End-to-end handler latency, throughput and peak memory, fully offline.
+
+Run from the repository root:
+
+    python benchmarks/bench_handlers.py [--iterations 30] [--only send_sleep] [--quick]
+
+Every ``lambda_handler`` runs against the in-memory stand-ins of
+``benchmarks/fakes.py`` (DynamoDB, Lambda, an OpenAI assistant with a
+canned answer), so nothing leaves the machine. Each scenario sweeps a size:
+records per upload, sensor samples per night, sessions per request or rows
+in the table behind a view. Per size it reports p50/p99 latency over
+``--iterations`` calls, throughput, and the peak memory allocated by one
+call (tracemalloc, measured in separate calls so it does not slow the
+timings down).
+
+Latencies include the stand-ins' own cost and no network time, so use them
+to compare revisions rather than as production numbers. Read paths clear the
+warm-container cache before every call, so they measure the DynamoDB path.
+Needs boto3 and numpy installed locally; openai is not needed.
+"""
+import argparse
+import gc
+import importlib.util
+import json
+import math
+import os
+import sys
+import time
+import tracemalloc
+from decimal import Decimal
+from typing import Any, Callable, Dict, List
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from fakes import ROOT, FakeContext, install_fakes  # noqa: E402
+
+from sleep_common.cache import session_cache  # noqa: E402
+
+NIGHT_START = 1700000000
+EPOCH = 30
+
+def load_handler(handler: str) -> Any:
+    path = os.path.join(ROOT, handler, 'lambda_function.py')
+    spec = importlib.util.spec_from_file_location(f'bench_{handler}', path)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+def get_event(**params: Any) -> Dict[str, Any]:
+    return {'httpMethod': 'GET', 'path': '/bench', 'queryStringParameters': {key: str(value) for key, value in params.items()}}
+
+def stage_rows(session_uuid: str, count: int, client_uuid: str = 'client-0', start: int = NIGHT_START) -> List[Dict[str, Any]]:
+    return [
+        {
+            'session_uuid': session_uuid,
+            'client_uuid': client_uuid,
+            'start_time': start + i * EPOCH,
+            'end_time': start + (i + 1) * EPOCH,
+            'stage': (1, 4, 4, 5, 4, 6)[i % 6]
+        }
+        for i in range(count)
+    ]
+
+def sensor_values(i: int) -> Dict[str, Any]:
+    return {
+        'x': Decimal(str(round(math.sin(i / 7.0), 3))),
+        'y': Decimal(str(round(math.cos(i / 11.0), 3))),
+        'z': Decimal('0.98'),
+        'heart_rate': 55 + i % 10
+    }
+
+def analysis_item(session_uuid: str) -> Dict[str, Any]:
+    return {
+        'session_uuid': session_uuid,
+        'score': 82,
+        'score_source': 'gpt',
+        'analysis': '깊은 수면 비율이 양호합니다. ' * 40,
+        'input_hash': 'bench'
+    }
+
+# --- scenarios ----------------------------------------------------------------
+# A setup receives (fakes, module, size) and returns an event factory taking
+# the iteration number.
+
+def setup_sleep_upload(fakes, module, size):
+    def event(i):
+        records = [
+            {'sessionId': f'session-{i}', 'startTime': row['start_time'], 'endTime': row['end_time'], 'stage': row['stage']}
+            for row in stage_rows(f'session-{i}', size)
+        ]
+        records[-1]['end'] = True
+        return {'httpMethod': 'POST', 'queryStringParameters': {'client_uuid': 'client-0'}, 'body': json.dumps({'sleep_data': records})}
+    return event
+
+def setup_sensor_upload(storage_mode):
+    def setup(fakes, module, size):
+        module.STORAGE_MODE = storage_mode
+        samples = [{'timestamp_ms': (NIGHT_START + i) * 1000, 'seq': 0, 'data': {key: float(value) for key, value in sensor_values(i).items()}} for i in range(size)]
+        return lambda i: {'body': json.dumps({'client': f'client-{i}', 'samples': samples})}
+    return setup
+
+def setup_analysis(storage_mode):
+    def setup(fakes, module, size):
+        from sleep_common.sensor_chunks import encode_chunks
+        module.SENSOR_STORAGE_MODE = storage_mode
+        fakes.dynamodb.Table('sleep_records').load(stage_rows('night', size // EPOCH))
+        samples = [(Decimal(NIGHT_START + i), sensor_values(i)) for i in range(size)]
+        if storage_mode == 'chunked':
+            fakes.dynamodb.Table('sensor_data_chunks').load(encode_chunks('client-0', samples))
+        else:
+            fakes.dynamodb.Table('sensor_data').load([{'client_uuid': 'client-0', 'time': time_key, **data} for time_key, data in samples])
+        return lambda i: {'session_uuid': 'night', 'force': True, 'bypass_cache': True}
+    return setup
+
+def setup_paged_analysis(fetch_workers):
+    def setup(fakes, module, size):
+        # ~4000 sensor items fill a 1 MB page, which takes ~50 ms to arrive
+        fakes.dynamodb.page_items = 4000
+        fakes.dynamodb.request_latency = 0.05
+        module.SENSOR_FETCH_WORKERS = fetch_workers
+        return setup_analysis('items')(fakes, module, size)
+    return setup
+
+def setup_stages(response_format):
+    def setup(fakes, module, size):
+        fakes.dynamodb.Table('sleep_records').load(stage_rows('night', size))
+        return lambda i: get_event(session_uuid='night', format=response_format)
+    return setup
+
+def setup_local_score(fakes, module, size):
+    fakes.dynamodb.Table('sleep_records').load(stage_rows('night', size))
+    return lambda i: get_event(session_uuid='night')
+
+def setup_analysis_read(fakes, module, size):
+    fakes.dynamodb.Table('sleep_analysis').load([analysis_item('night')])
+    return lambda i: get_event(session_uuid='night')
+
+def setup_sessions(fakes, module, size):
+    sessions = [f'session-{i}' for i in range(size)]
+    fakes.dynamodb.Table('sleep_analysis').load([analysis_item(session) for session in sessions])
+    fakes.dynamodb.Table('sleep_records').load([row for session in sessions for row in stage_rows(session, 960)])
+    return lambda i: get_event(session_uuid=','.join(sessions))
+
+def setup_history(fakes, module, size):
+    fakes.dynamodb.Table('client_sessions').load([
+        {'client_uuid': 'client-0', 'session_uuid': f'session-{i}', 'start_time': NIGHT_START + i * 86400,
+         'end_time': NIGHT_START + i * 86400 + 28800, 'score': 80}
+        for i in range(size)
+    ])
+    return lambda i: get_event(client_uuid='client-0', limit=30)
+
+def setup_data_view(client_filter):
+    def setup(fakes, module, size):
+        # One night (960 records) per session, spread over 20 clients
+        rows = []
+        for session in range(math.ceil(size / 960)):
+            rows.extend(stage_rows(f'session-{session}', min(960, size - len(rows)), client_uuid=f'client-{session % 20}'))
+        fakes.dynamodb.Table('sleep_records').load(rows)
+        params = {'limit': 100, 'client_uuid': 'client-1'} if client_filter else {'limit': 100}
+        return lambda i: get_event(**params)
+    return setup
+
+def setup_analysis_view(fakes, module, size):
+    from sleep_common.analysis_summary import excerpt, summary_key
+    month_start = 1698796800  # 2023-11-01
+    fakes.dynamodb.Table('sleep_analysis_summary').load([
+        {**summary_key(f'session-{i}', month_start + i * 60), 'session_uuid': f'session-{i}', 'client_uuid': 'client-0',
+         'date': '2023-11-01', 'start_time': month_start + i * 60, 'score': 80, 'excerpt': excerpt('양호합니다. ' * 40)}
+        for i in range(size)
+    ])
+    return lambda i: get_event(month='2023-11', limit=50)
+
+# (name, handler directory, sizes, size unit, setup, clear the session cache before each call)
+SCENARIOS = [
+    ('recieve_sleep_data', 'recieve_sleep_data', [100, 1000, 5000], 'records/upload', setup_sleep_upload, False),
+    ('receiveSensorData items', 'receiveSensorData', [100, 1000, 5000], 'samples/batch', setup_sensor_upload('items'), False),
+    ('receiveSensorData chunked', 'receiveSensorData', [100, 1000, 5000], 'samples/batch', setup_sensor_upload('chunked'), False),
+    ('sleep_data_analysis items', 'sleep_data_analysis', [3600, 28800], 'samples/night', setup_analysis('items'), False),
+    ('sleep_data_analysis chunked', 'sleep_data_analysis', [3600, 28800], 'samples/night', setup_analysis('chunked'), False),
+    ('sleep_data_analysis paged serial', 'sleep_data_analysis', [28800, 115200], 'samples/night', setup_paged_analysis(1), False),
+    ('sleep_data_analysis paged sliced', 'sleep_data_analysis', [28800, 115200], 'samples/night', setup_paged_analysis(4), False),
+    ('send_sleep_stage', 'send_sleep_stage', [100, 1000], 'records/session', setup_stages('records'), True),
+    ('send_sleep_stage rle', 'send_sleep_stage', [100, 1000], 'records/session', setup_stages('rle'), True),
+    ('send_sleep_score local', 'send_sleep_score', [100, 1000], 'records/session', setup_local_score, True),
+    ('send_sleep_analysis', 'send_sleep_analysis', [1], 'sessions', setup_analysis_read, True),
+    ('send_sleep_session', 'send_sleep_session', [1, 30, 100], 'sessions/request', setup_sessions, True),
+    ('send_sleep_history', 'send_sleep_history', [100, 1000], 'sessions/client', setup_history, False),
+    ('sleep_data_view', 'sleep_data_view', [1000, 10000, 50000], 'table rows', setup_data_view(False), False),
+    ('sleep_data_view client', 'sleep_data_view', [1000, 10000, 50000], 'table rows', setup_data_view(True), False),
+    ('sleep_analysis_view', 'sleep_analysis_view', [1000, 10000], 'summary rows', setup_analysis_view, False),
+]
+
+# --- measurement ---------------------------------------------------------------
+
+def percentile(values: List[float], fraction: float) -> float:
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, max(0, math.ceil(fraction * len(ordered)) - 1))]
+
+def run_scenario(handler: str, setup: Callable, size: int, iterations: int, clear_cache: bool) -> Dict[str, Any]:
+    fakes = install_fakes()
+    session_cache._entries.clear()
+    module = load_handler(handler)
+    make_event = setup(fakes, module, size)
+    context = FakeContext()
+
+    def call(i):
+        if clear_cache:
+            session_cache._entries.clear()
+        response = module.lambda_handler(make_event(i), context)
+        status = response.get('statusCode', 200) if isinstance(response, dict) else 200
+        if status >= 400:
+            raise RuntimeError(f'{handler} returned {status}: {str(response.get("body"))[:200]}')
+
+    call(-1)  # warm-up, also checks the scenario works
+    gc.collect()
+    latencies = []
+    started = time.perf_counter()
+    for i in range(iterations):
+        begin = time.perf_counter()
+        call(i)
+        latencies.append(time.perf_counter() - begin)
+    elapsed = time.perf_counter() - started
+
+    peak = 0
+    tracemalloc.start()
+    for i in range(3):
+        tracemalloc.reset_peak()
+        call(iterations + i)
+        peak = max(peak, tracemalloc.get_traced_memory()[1])
+    tracemalloc.stop()
+
+    return {
+        'p50_ms': percentile(latencies, 0.50) * 1000,
+        'p99_ms': percentile(latencies, 0.99) * 1000,
+        'per_second': iterations / elapsed,
+        'peak_kib': peak / 1024,
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--iterations', type=int, default=30, help='timed calls per scenario and size')
+    parser.add_argument('--only', help='run scenarios whose name contains this text')
+    parser.add_argument('--quick', action='store_true', help='smallest size of every scenario only')
+    args = parser.parse_args()
+
+    print(f'{"scenario":<30}{"size":>8}  {"unit":<17}{"p50 ms":>9}{"p99 ms":>9}{"calls/s":>10}{"peak KiB":>10}')
+    for name, handler, sizes, unit, setup, clear_cache in SCENARIOS:
+        if args.only and args.only not in name:
+            continue
+        for size in sizes[:1] if args.quick else sizes:
+            try:
+                result = run_scenario(handler, setup, size, args.iterations, clear_cache)
+            except Exception as e:
+                print(f'{name:<30}{size:>8}  {unit:<17}failed: {type(e).__name__}: {e}')
+                continue
+            print(f'{name:<30}{size:>8}  {unit:<17}{result["p50_ms"]:>9.2f}{result["p99_ms"]:>9.2f}'
+                  f'{result["per_second"]:>10.1f}{result["peak_kib"]:>10.0f}')
+
+if __name__ == '__main__':
+    main()
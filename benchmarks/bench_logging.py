@@ -0,0 +1,82 @@
+"""Per-invocation logging overhead, before and after sleep_common.logs.
+
+Run from the repository root:
+
+    python benchmarks/bench_logging.py
+
+"before" is what the handlers used to do on every call: ``json.dumps`` of
+the whole event (and of the parsed upload body) at INFO. "after" is
+``log_event`` / ``log_payload`` with the configured level, sample rate and
+byte budget. Records are formatted and written to os.devnull so formatting
+and I/O costs are included.
+"""
+import argparse
+import json
+import logging
+import os
+import sys
+import timeit
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(ROOT, 'layer', 'python'))
+
+from sleep_common import logs  # noqa: E402
+
+def upload_event(records):
+    body = {
+        'sleep_data': [
+            {'sessionId': 'session', 'startTime': 1700000000 + i * 30, 'endTime': 1700000030 + i * 30, 'stage': i % 4 + 4}
+            for i in range(records)
+        ]
+    }
+    return {
+        'httpMethod': 'POST',
+        'path': '/sleep',
+        'queryStringParameters': {'client_uuid': 'client'},
+        'requestContext': {'requestId': 'request'},
+        'body': json.dumps(body)
+    }, body
+
+def configure_logger():
+    logger = logging.getLogger('bench_logging')
+    logger.propagate = False
+    handler = logging.StreamHandler(open(os.devnull, 'w'))
+    handler.setFormatter(logging.Formatter('%(asctime)s %(levelname)s %(message)s'))
+    logger.addHandler(handler)
+    logger.setLevel(logging.INFO)
+    return logger
+
+def before(logger, event, body):
+    logger.info(f"Raw event: {json.dumps(event)}")
+    logger.info(f"Parsed body: {json.dumps(body)}")
+
+def after(logger, event, body):
+    logs.log_event(logger, event)
+    logs.log_payload(logger, 'Parsed body', body)
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--number', type=int, default=50)
+    args = parser.parse_args()
+    logger = configure_logger()
+
+    scenarios = [
+        ('payloads off', 'DEBUG', 1.0),
+        ('INFO, 1% sampled', 'INFO', 0.01),
+        ('INFO, always', 'INFO', 1.0),
+    ]
+
+    print(f'{"records":>8}  {"before us":>10}  ' + '  '.join(f'{name:>18}' for name, _, _ in scenarios))
+    for records in (10, 100, 1000, 10000):
+        event, body = upload_event(records)
+        baseline = min(timeit.repeat(lambda: before(logger, event, body), number=args.number, repeat=3)) / args.number
+        results = []
+        for _, level, rate in scenarios:
+            logs.PAYLOAD_LEVEL = logging.getLevelName(level)
+            logs.PAYLOAD_SAMPLE_RATE = rate
+            elapsed = min(timeit.repeat(lambda: after(logger, event, body), number=args.number, repeat=3)) / args.number
+            results.append(elapsed)
+        print(f'{records:>8}  {baseline * 1e6:>10.1f}  ' + '  '.join(f'{elapsed * 1e6:>18.1f}' for elapsed in results))
+
+if __name__ == '__main__':
+    main()
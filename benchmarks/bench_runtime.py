@@ -0,0 +1,129 @@
+"""Import/init time and JSON serialization time per handler.
+
+Run from the repository root:
+
+    python benchmarks/bench_runtime.py [--runs 10]
+
+Import time is measured in a fresh interpreter for every run, so it reflects
+what a cold start pays before the first event. Run the script on two
+revisions to compare them. Serialization compares the encoder the handlers
+used to inline (``json.dumps`` with a Decimal ``default``) with
+``sleep_common.runtime.dumps`` on a representative response per handler.
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import timeit
+from decimal import Decimal
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+LAYER = os.path.join(ROOT, 'layer', 'python')
+sys.path.insert(0, LAYER)
+
+from sleep_common.runtime import dumps  # noqa: E402
+
+HANDLERS = [
+    'receiveSensorData',
+    'recieve_sleep_data',
+    'send_sleep_analysis',
+    'send_sleep_history',
+    'send_sleep_score',
+    'send_sleep_session',
+    'send_sleep_stage',
+    'sleep_analysis_view',
+    'sleep_data_analysis',
+    'sleep_data_view',
+]
+
+IMPORT_SNIPPET = '''
+import json, sys, time
+sys.path[:0] = [sys.argv[1], sys.argv[2]]
+start = time.perf_counter()
+import lambda_function
+print(json.dumps({'import_ms': (time.perf_counter() - start) * 1000, 'modules': len(sys.modules)}))
+'''
+
+def legacy_decimal_default(obj):
+    if isinstance(obj, Decimal):
+        return float(obj)
+    raise TypeError
+
+def legacy_dumps(obj):
+    return json.dumps(obj, default=legacy_decimal_default)
+
+def stage_records(count):
+    return [
+        {
+            'start_time': Decimal(1700000000 + i * 30),
+            'end_time': Decimal(1700000030 + i * 30),
+            'stage': Decimal(i % 4 + 4)
+        }
+        for i in range(count)
+    ]
+
+def sample_payloads():
+    analysis = '수면 분석 결과입니다. ' * 100
+    return {
+        'receiveSensorData': {'accepted': 500, 'rejected': 0},
+        'recieve_sleep_data': {
+            'client_uuid': 'client',
+            'sleep_data': [
+                {'sessionId': 'session', 'startTime': 1700000000 + i * 30, 'endTime': 1700000030 + i * 30, 'stage': i % 4 + 4}
+                for i in range(1000)
+            ]
+        },
+        'send_sleep_analysis': {'analysis': analysis},
+        'send_sleep_score': {'score': Decimal('82')},
+        'send_sleep_stage': {'records': stage_records(1000)},
+        'sleep_analysis_view': [{'session_uuid': f'session-{i}', 'score': Decimal(80), 'analysis': analysis} for i in range(100)],
+        'sleep_data_analysis': {'session_uuid': 'session', 'score': 82, 'analysis': analysis},
+        'sleep_data_view': stage_records(1000),
+    }
+
+def measure_import(handler, runs):
+    env = dict(os.environ)
+    env.setdefault('AWS_DEFAULT_REGION', 'us-east-1')
+    timings = []
+    modules = 0
+    for _ in range(runs):
+        result = subprocess.run(
+            [sys.executable, '-c', IMPORT_SNIPPET, os.path.join(ROOT, handler), LAYER],
+            capture_output=True, text=True, env=env
+        )
+        if result.returncode != 0:
+            return None, result.stderr.strip().splitlines()[-1]
+        measured = json.loads(result.stdout.strip().splitlines()[-1])
+        timings.append(measured['import_ms'])
+        modules = measured['modules']
+    return timings, modules
+
+def measure_serialization(payload, number):
+    legacy = min(timeit.repeat(lambda: legacy_dumps(payload), number=number, repeat=5)) / number
+    current = min(timeit.repeat(lambda: dumps(payload), number=number, repeat=5)) / number
+    return legacy * 1e6, current * 1e6
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--runs', type=int, default=10, help='fresh interpreters per handler')
+    parser.add_argument('--number', type=int, default=200, help='serializations per timing sample')
+    args = parser.parse_args()
+
+    print(f'{"handler":<22}{"import p50 ms":>15}{"import max ms":>15}{"modules":>10}')
+    for handler in HANDLERS:
+        timings, info = measure_import(handler, args.runs)
+        if timings is None:
+            print(f'{handler:<22}  import failed: {info}')
+            continue
+        print(f'{handler:<22}{statistics.median(timings):>15.1f}{max(timings):>15.1f}{info:>10}')
+
+    print()
+    print(f'{"handler":<22}{"json.dumps us":>15}{"runtime.dumps us":>18}{"speedup":>10}')
+    for handler, payload in sample_payloads().items():
+        legacy, current = measure_serialization(payload, args.number)
+        print(f'{handler:<22}{legacy:>15.1f}{current:>18.1f}{legacy / current:>9.1f}x')
+
+if __name__ == '__main__':
+    main()
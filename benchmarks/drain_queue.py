@@ -0,0 +1,112 @@
+"""Queue mode end to end on the stand-ins: enqueue finished sessions, drain them with the worker.
+
+Run from the repository root:
+
+    python benchmarks/drain_queue.py [--sessions 200] [--error-rate 0.2] [--concurrency 4] [--tokens-per-minute 0]
+
+Every session is uploaded through ``recieve_sleep_data`` with
+``ANALYSIS_TRIGGER_MODE=queue``, so its end marker enqueues it on the
+in-memory SQS queue of ``benchmarks/fakes.py``. ``--missing`` sessions are
+enqueued without records and must end up dead-lettered. The script then
+plays the Lambda event source. It receives batches, calls
+``sleep_data_analysis``'s ``queue_handler``, and deletes every message that
+was not reported in ``batchItemFailures``. When only delayed retries are
+left, it moves the queue's clock forward instead of waiting.
+
+The fake assistant takes ``--openai-latency`` seconds per prompt and fails
+``--error-rate`` of them like a rate-limited request. The report shows
+analyzed and dead-lettered sessions, retries, the simulated backoff, wall
+time and the prompt token rate the budget let through. That rate includes the
+bucket's initial burst of one minute's budget, so short runs exceed
+``--tokens-per-minute``.
+"""
+import argparse
+import json
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+QUEUE_URL = 'https://sqs.local/000000000000/sleep-analysis'
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--sessions', type=int, default=200, help='finished sessions uploaded')
+    parser.add_argument('--missing', type=int, default=5, help='sessions enqueued without records')
+    parser.add_argument('--records', type=int, default=240, help='30 s stage records per session')
+    parser.add_argument('--batch-size', type=int, default=10, help='messages per worker invocation')
+    parser.add_argument('--concurrency', type=int, default=4, help='ANALYSIS_WORKER_CONCURRENCY')
+    parser.add_argument('--tokens-per-minute', type=int, default=0, help='OPENAI_TOKENS_PER_MINUTE (0: unlimited)')
+    parser.add_argument('--max-attempts', type=int, default=5, help='ANALYSIS_MAX_ATTEMPTS')
+    parser.add_argument('--openai-latency', type=float, default=0.02, help='seconds per fake assistant prompt')
+    parser.add_argument('--error-rate', type=float, default=0.2, help='share of prompts failing with a rate limit')
+    parser.add_argument('--seed', type=int, default=1)
+    args = parser.parse_args()
+
+    # The worker reads its configuration at import time
+    os.environ.update({
+        'ANALYSIS_QUEUE_URL': QUEUE_URL,
+        'ANALYSIS_TRIGGER_MODE': 'queue',
+        'ANALYSIS_WORKER_CONCURRENCY': str(args.concurrency),
+        'ANALYSIS_MAX_ATTEMPTS': str(args.max_attempts),
+        'OPENAI_TOKENS_PER_MINUTE': str(args.tokens_per_minute),
+    })
+    from bench_handlers import load_handler, stage_rows
+    from fakes import FakeContext, FakeOpenAI, install_fakes
+    from sleep_common import runtime
+    from sleep_common.analysis_queue import enqueue_analysis
+    from sleep_common.rate_limit import estimate_tokens
+
+    fakes = install_fakes()
+    fakes.openai = runtime._clients['openai'] = FakeOpenAI(latency=args.openai_latency, error_rate=args.error_rate, seed=args.seed)
+    upload = load_handler('recieve_sleep_data')
+    worker = load_handler('sleep_data_analysis')
+    context = FakeContext()
+
+    for session in range(args.sessions):
+        records = [
+            {'sessionId': f'session-{session}', 'startTime': row['start_time'], 'endTime': row['end_time'], 'stage': row['stage']}
+            for row in stage_rows(f'session-{session}', args.records, client_uuid=f'client-{session % 50}')
+        ]
+        records[-1]['end'] = True
+        response = upload.lambda_handler({'queryStringParameters': {'client_uuid': f'client-{session % 50}'},
+                                          'body': json.dumps({'sleep_data': records})}, context)
+        assert response['statusCode'] == 200, response
+    for session in range(args.missing):
+        enqueue_analysis(f'missing-{session}', 1)
+    assert not fakes.lambda_client.invocations, 'queue mode must not invoke the analysis directly'
+
+    invocations = retries = 0
+    backoff = 0.0
+    started = time.perf_counter()
+    while True:
+        event = fakes.sqs.lambda_event(QUEUE_URL, args.batch_size)
+        if not event['Records']:
+            wait = fakes.sqs.next_visible_in(QUEUE_URL)
+            if wait is None:
+                break
+            fakes.sqs.advance(wait + 0.001)
+            backoff += wait
+            continue
+        response = worker.queue_handler(event, context)
+        fakes.sqs.complete(QUEUE_URL, event, response)
+        invocations += 1
+        retries += len(response['batchItemFailures'])
+    elapsed = time.perf_counter() - started
+
+    analyses = fakes.dynamodb.Table('sleep_analysis').items.values()
+    dead_letters = list(fakes.dynamodb.Table('sleep_analysis_dead_letters').items.values())
+    tokens = sum(estimate_tokens('x' * prompt, worker.OPENAI_RESPONSE_TOKENS) for prompt in fakes.openai.prompts)
+    print(f'sessions enqueued     {args.sessions + args.missing}')
+    print(f'analyzed by GPT       {sum(1 for item in analyses if item.get("score_source") == "gpt")}')
+    print(f'dead-lettered         {len(dead_letters)} '
+          f'({sum(1 for item in dead_letters if str(item["session_uuid"]).startswith("missing-"))} without records)')
+    print(f'worker invocations    {invocations}')
+    print(f'retries               {retries}')
+    print(f'simulated backoff     {backoff:.0f} s')
+    print(f'wall time             {elapsed:.2f} s')
+    print(f'prompt tokens/minute  {tokens / elapsed * 60:.0f}')
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,698 @@
+"""In-memory stand-ins for DynamoDB, Lambda and the OpenAI assistant.
+
+``install_fakes()`` puts them into ``sleep_common.runtime``'s client cache,
+so every ``get_table`` / ``get_dynamodb`` / ``get_client`` /
+``get_openai_client`` call of a handler is served in-process with no network
+access. The stand-ins implement the subset of the APIs the handlers use:
+
+- DynamoDB tables: ``get_item``, ``put_item``, ``update_item``, ``query``
+  (including local secondary indexes), ``scan``, ``batch_writer`` with
+  condition, key condition, filter, update and projection expressions, and
+  ``Limit`` / ``ExclusiveStartKey`` pagination. Numbers are stored as
+  Decimal, as DynamoDB returns them. Pages are not cut at 1 MB unless
+  ``FakeDynamoDB.page_items`` caps the items per page, and query/scan
+  requests take ``FakeDynamoDB.request_latency`` seconds (default 0)
+- the low-level DynamoDB client: ``query`` and ``batch_get_item`` on typed
+  attribute values
+- Lambda: ``invoke`` only records the call
+- SQS: ``send_message``, ``receive_message``, ``delete_message`` and
+  ``change_message_visibility`` on in-memory queues with visibility timeouts
+  and receive counts; ``lambda_event`` / ``complete`` play the Lambda event
+  source, and ``advance`` moves the queue's clock forward instead of waiting
+- OpenAI: runs complete immediately (or after ``latency`` seconds) and the
+  assistant answers with a canned JSON block; ``error_rate`` makes that share
+  of prompts fail like a rate-limited request
+
+Tables lock around writes, conditional checks and index rebuilds, so the
+handlers can share one set of stand-ins from several threads.
+
+boto3 has to be installed (for its condition and type helpers), openai does
+not.
+"""
+import bisect
+import os
+import re
+import sys
+import threading
+import time
+import uuid
+from functools import lru_cache
+from types import SimpleNamespace
+from typing import Any, Dict, List, Optional, Tuple
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(ROOT, 'layer', 'python'))
+
+from boto3.dynamodb.conditions import ConditionBase, ConditionExpressionBuilder  # noqa: E402
+from boto3.dynamodb.types import TypeDeserializer, TypeSerializer  # noqa: E402
+from botocore.exceptions import ClientError  # noqa: E402
+
+from sleep_common import runtime  # noqa: E402
+
+# (partition key, sort key) per table, and per local secondary index
+TABLE_KEYS = {
+    'sensor_data': ('client_uuid', 'time'),
+    'sensor_data_chunks': ('client_uuid', 'time'),
+    'sleep_records': ('session_uuid', 'start_time'),
+    'sleep_analysis': ('session_uuid', None),
+    'sleep_analysis_triggers': ('session_uuid', None),
+    'sleep_analysis_dead_letters': ('session_uuid', None),
+    'sleep_analysis_summary': ('month', 'sort_key'),
+    'client_sessions': ('client_uuid', 'session_uuid'),
+}
+INDEX_KEYS = {
+    ('client_sessions', 'start_time-index'): ('client_uuid', 'start_time'),
+    ('sleep_records', 'client_uuid-index'): ('client_uuid', 'start_time'),
+}
+
+_serializer = TypeSerializer()
+_deserializer = TypeDeserializer()
+
+def _client_error(code: str, operation: str) -> ClientError:
+    return ClientError({'Error': {'Code': code, 'Message': code}}, operation)
+
+def normalize(item: Dict[str, Any]) -> Dict[str, Any]:
+    """Round-trip through the DynamoDB type system: ints become Decimal, floats are rejected."""
+    return {key: _deserializer.deserialize(_serializer.serialize(value)) for key, value in item.items()}
+
+# --- expressions -----------------------------------------------------------
+
+_TOKEN = re.compile(r'\s*(<=|>=|<>|[=<>(),+\-]|[#:]?[A-Za-z_][\w.]*)')
+
+@lru_cache(maxsize=256)
+def _tokenize(expression: str) -> Tuple[str, ...]:
+    tokens = []
+    position = 0
+    expression = expression.strip()
+    while position < len(expression):
+        match = _TOKEN.match(expression, position)
+        if not match:
+            raise ValueError(f'Cannot parse expression at: {expression[position:]}')
+        tokens.append(match.group(1))
+        position = match.end()
+    return tuple(tokens)
+
+class _Expression:
+    """Recursive-descent evaluator for condition and update expressions."""
+
+    def __init__(self, expression: str, names: Optional[Dict[str, str]], values: Optional[Dict[str, Any]]):
+        self.tokens = _tokenize(expression)
+        self.position = 0
+        self.names = names or {}
+        self.values = values or {}
+
+    def peek(self) -> Optional[str]:
+        return self.tokens[self.position] if self.position < len(self.tokens) else None
+
+    def take(self, expected: Optional[str] = None) -> str:
+        token = self.peek()
+        if token is None or (expected is not None and token.upper() != expected):
+            raise ValueError(f'Expected {expected}, got {token}')
+        self.position += 1
+        return token
+
+    def name(self, token: str) -> str:
+        return self.names[token] if token.startswith('#') else token
+
+    # conditions
+
+    def condition(self, item: Dict[str, Any]) -> bool:
+        result = self.conjunction(item)
+        while (self.peek() or '').upper() == 'OR':
+            self.take()
+            right = self.conjunction(item)
+            result = result or right
+        return result
+
+    def conjunction(self, item: Dict[str, Any]) -> bool:
+        result = self.negation(item)
+        while (self.peek() or '').upper() == 'AND':
+            self.take()
+            right = self.negation(item)
+            result = result and right
+        return result
+
+    def negation(self, item: Dict[str, Any]) -> bool:
+        if (self.peek() or '').upper() == 'NOT':
+            self.take()
+            return not self.negation(item)
+        return self.comparison(item)
+
+    def comparison(self, item: Dict[str, Any]) -> bool:
+        token = self.peek()
+        if token == '(':
+            self.take()
+            result = self.condition(item)
+            self.take(')')
+            return result
+        if token in ('attribute_exists', 'attribute_not_exists', 'begins_with', 'contains'):
+            self.take()
+            self.take('(')
+            path = self.name(self.take())
+            argument = None
+            if token in ('begins_with', 'contains'):
+                self.take(',')
+                argument = self.operand(item)
+            self.take(')')
+            value = item.get(path)
+            if token == 'attribute_exists':
+                return path in item
+            if token == 'attribute_not_exists':
+                return path not in item
+            if value is None:
+                return False
+            return value.startswith(argument) if token == 'begins_with' else argument in value
+
+        left = self.operand(item)
+        operator = self.take().upper()
+        if operator == 'BETWEEN':
+            low = self.operand(item)
+            self.take('AND')
+            high = self.operand(item)
+            return left is not None and low <= left <= high
+        if operator == 'IN':
+            self.take('(')
+            options = [self.operand(item)]
+            while self.peek() == ',':
+                self.take()
+                options.append(self.operand(item))
+            self.take(')')
+            return left in options
+        right = self.operand(item)
+        if operator == '=':
+            return left == right
+        if operator == '<>':
+            return left != right
+        if left is None or right is None or type(left) is not type(right):
+            return False
+        return {'<': left < right, '<=': left <= right, '>': left > right, '>=': left >= right}[operator]
+
+    def operand(self, item: Dict[str, Any]) -> Any:
+        token = self.take()
+        if token.startswith(':'):
+            value = self.values[token]
+        elif token == 'if_not_exists':
+            self.take('(')
+            path = self.name(self.take())
+            self.take(',')
+            fallback = self.operand(item)
+            self.take(')')
+            value = item.get(path, fallback)
+        else:
+            value = item.get(self.name(token))
+        if self.peek() in ('+', '-'):
+            operator = self.take()
+            other = self.operand(item)
+            value = value + other if operator == '+' else value - other
+        return value
+
+    # updates
+
+    def update(self, item: Dict[str, Any]) -> Dict[str, Any]:
+        updated = dict(item)
+        while self.peek() is not None:
+            clause = self.take().upper()
+            while True:
+                path = self.name(self.take())
+                if clause == 'SET':
+                    self.take('=')
+                    updated[path] = self.operand(item)
+                elif clause == 'REMOVE':
+                    updated.pop(path, None)
+                elif clause == 'ADD':
+                    updated[path] = updated.get(path, 0) + self.operand(item)
+                else:
+                    raise ValueError(f'Unsupported update clause {clause}')
+                if self.peek() != ',':
+                    break
+                self.take()
+        return updated
+
+def _build(condition: Any, names: Dict[str, str], values: Dict[str, Any], key_condition: bool) -> str:
+    """Turn a boto3 condition object into an expression string, merging its placeholders."""
+    if not isinstance(condition, ConditionBase):
+        return condition
+    built = ConditionExpressionBuilder().build_expression(condition, is_key_condition=key_condition)
+    names.update(built.attribute_name_placeholders)
+    values.update(built.attribute_value_placeholders)
+    return built.condition_expression
+
+def _matches(expression: Any, item: Dict[str, Any], names: Dict[str, str], values: Dict[str, Any], key_condition: bool = False) -> bool:
+    if expression is None:
+        return True
+    parser = _Expression(_build(expression, names, values, key_condition), names, values)
+    result = parser.condition(item)
+    if parser.peek() is not None:
+        raise ValueError(f'Unparsed expression tail: {parser.tokens[parser.position:]}')
+    return result
+
+def _project(item: Dict[str, Any], projection: Optional[str], names: Dict[str, str]) -> Dict[str, Any]:
+    if not projection:
+        return dict(item)
+    fields = [names.get(field.strip(), field.strip()) for field in projection.split(',')]
+    return {field: item[field] for field in fields if field in item}
+
+# --- resource ---------------------------------------------------------------
+
+class FakeTable:
+    def __init__(self, name: str, resource: Optional['FakeDynamoDB'] = None):
+        self.name = name
+        self.resource = resource
+        self.partition_key, self.sort_key = TABLE_KEYS[name]
+        self.items: Dict[Tuple[Any, Any], Dict[str, Any]] = {}
+        # Insertion order and position of every key, scans page through it
+        self.order: List[Tuple[Any, Any]] = []
+        self.positions: Dict[Tuple[Any, Any], int] = {}
+        self.partitions: Dict[Any, Dict[Any, Dict[str, Any]]] = {}
+        self.sorted_partitions: Dict[Tuple[Any, Any], Any] = {}
+        self.calls: Dict[str, int] = {}
+        self.lock = threading.RLock()
+
+    def _count(self, operation: str) -> None:
+        with self.lock:
+            self.calls[operation] = self.calls.get(operation, 0) + 1
+
+    def _request(self, operation: str, params: Dict[str, Any]) -> None:
+        """Count a query/scan, wait out the request latency and cut the page at ``page_items``."""
+        self._count(operation)
+        if self.resource is None:
+            return
+        if self.resource.request_latency:
+            time.sleep(self.resource.request_latency)
+        page_items = self.resource.page_items
+        if page_items and not (params.get('Limit') and params['Limit'] <= page_items):
+            params['Limit'] = page_items
+
+    def _key(self, item: Dict[str, Any]) -> Tuple[Any, Any]:
+        return item[self.partition_key], item.get(self.sort_key) if self.sort_key else None
+
+    def _store(self, item: Dict[str, Any]) -> None:
+        key = self._key(item)
+        with self.lock:
+            # A deleted key that is written again keeps its old scan position
+            if key not in self.positions:
+                self.positions[key] = len(self.order)
+                self.order.append(key)
+            self.items[key] = item
+            if self.sorted_partitions:
+                self.sorted_partitions.clear()
+            self.partitions.setdefault(key[0], {})[key[1]] = item
+
+    def load(self, items: List[Dict[str, Any]]) -> None:
+        """Seed the table without going through the API."""
+        for item in items:
+            self._store(normalize(item))
+
+    def get_item(self, Key: Dict[str, Any], ProjectionExpression: Optional[str] = None,
+                 ExpressionAttributeNames: Optional[Dict[str, str]] = None, ConsistentRead: bool = False) -> Dict[str, Any]:
+        self._count('get_item')
+        item = self.items.get(self._key(normalize(Key)))
+        if item is None:
+            return {}
+        return {'Item': _project(item, ProjectionExpression, ExpressionAttributeNames or {})}
+
+    def _delete(self, key: Tuple[Any, Any]) -> None:
+        # Deleted keys stay in self.order, scans skip them
+        with self.lock:
+            self.items.pop(key, None)
+            self.sorted_partitions.clear()
+            self.partitions.get(key[0], {}).pop(key[1], None)
+
+    def put_item(self, Item: Dict[str, Any], ConditionExpression: Any = None,
+                 ExpressionAttributeNames: Optional[Dict[str, str]] = None,
+                 ExpressionAttributeValues: Optional[Dict[str, Any]] = None, ReturnValues: str = 'NONE') -> Dict[str, Any]:
+        self._count('put_item')
+        item = normalize(Item)
+        names, values = dict(ExpressionAttributeNames or {}), dict(ExpressionAttributeValues or {})
+        with self.lock:
+            existing = self.items.get(self._key(item), {})
+            if not _matches(ConditionExpression, existing, names, values):
+                raise _client_error('ConditionalCheckFailedException', 'PutItem')
+            self._store(item)
+        return {'Attributes': dict(existing)} if ReturnValues == 'ALL_OLD' and existing else {}
+
+    def delete_item(self, Key: Dict[str, Any]) -> Dict[str, Any]:
+        self._count('delete_item')
+        self._delete(self._key(normalize(Key)))
+        return {}
+
+    def update_item(self, Key: Dict[str, Any], UpdateExpression: str, ConditionExpression: Any = None,
+                    ExpressionAttributeNames: Optional[Dict[str, str]] = None,
+                    ExpressionAttributeValues: Optional[Dict[str, Any]] = None, ReturnValues: str = 'NONE',
+                    **kwargs: Any) -> Dict[str, Any]:
+        self._count('update_item')
+        key = normalize(Key)
+        names = dict(ExpressionAttributeNames or {})
+        values = normalize(ExpressionAttributeValues or {})
+        with self.lock:
+            existing = self.items.get(self._key(key), {})
+            if not _matches(ConditionExpression, existing, names, values):
+                raise _client_error('ConditionalCheckFailedException', 'UpdateItem')
+            updated = _Expression(UpdateExpression, names, values).update({**key, **existing})
+            self._store(normalize(updated))
+        if ReturnValues == 'ALL_OLD' and existing:
+            return {'Attributes': dict(existing)}
+        if ReturnValues in ('UPDATED_NEW', 'ALL_NEW'):
+            # UPDATED_NEW is served as the whole item, callers read the attributes they set
+            return {'Attributes': normalize(updated)}
+        return {}
+
+    def _page(self, candidates: List[Dict[str, Any]], params: Dict[str, Any],
+              names: Dict[str, str], values: Dict[str, Any], key_fields: List[str]) -> Dict[str, Any]:
+        """Items of ``candidates`` (already past ExclusiveStartKey) up to Limit, filtered and projected."""
+        limit = params.get('Limit')
+        evaluated = candidates[:limit] if limit else candidates
+        items = [
+            _project(item, params.get('ProjectionExpression'), names)
+            for item in evaluated
+            if _matches(params.get('FilterExpression'), item, names, values)
+        ]
+        response: Dict[str, Any] = {'Items': items, 'Count': len(items), 'ScannedCount': len(evaluated)}
+        if limit and len(candidates) > limit:
+            last = evaluated[-1]
+            response['LastEvaluatedKey'] = {field: last[field] for field in key_fields if field in last}
+        return response
+
+    def _sorted(self, index_name: Optional[str], partition_value: Any) -> Tuple[List[Dict[str, Any]], List[Any], Any]:
+        """Items of a partition in sort key order, their sort keys and the ordering function (cached until a write)."""
+        cached = self.sorted_partitions.get((index_name, partition_value))
+        if cached is not None:
+            return cached
+        with self.lock:
+            return self._sort_partition(index_name, partition_value)
+
+    def _sort_partition(self, index_name: Optional[str], partition_value: Any) -> Tuple[List[Dict[str, Any]], List[Any], Any]:
+        if index_name:
+            partition_key, sort_key = INDEX_KEYS[(self.name, index_name)]
+            items = [item for item in self.items.values() if item.get(partition_key) == partition_value and sort_key in item]
+
+            # Index keys are not unique, the table key breaks ties
+            def order(item):
+                return item[sort_key], item[self.partition_key], item[self.sort_key]
+        else:
+            items = list(self.partitions.get(partition_value, {}).values())
+            sort_key = self.sort_key
+
+            def order(item):
+                return item.get(sort_key) if sort_key else 0
+        items.sort(key=order)
+        cached = self.sorted_partitions[(index_name, partition_value)] = (items, [order(item) for item in items], order)
+        return cached
+
+    def query(self, KeyConditionExpression: Any, IndexName: Optional[str] = None, **params: Any) -> Dict[str, Any]:
+        self._request('query', params)
+        names = dict(params.get('ExpressionAttributeNames') or {})
+        values = normalize(params.get('ExpressionAttributeValues') or {})
+        expression = _build(KeyConditionExpression, names, values, True)
+
+        partition_key, sort_key = INDEX_KEYS[(self.name, IndexName)] if IndexName else (self.partition_key, self.sort_key)
+        # The partition value is the one compared with the partition key
+        parser = _Expression(expression, names, values)
+        partition_value = None
+        for index, token in enumerate(parser.tokens):
+            if parser.name(token) == partition_key and index + 2 < len(parser.tokens) and parser.tokens[index + 1] == '=':
+                partition_value = values[parser.tokens[index + 2]]
+                break
+        items, keys, order = self._sorted(IndexName, partition_value)
+
+        # Walk the partition from ExclusiveStartKey in the requested direction,
+        # stopping once the page (plus one item to detect more) is full
+        forward = params.get('ScanIndexForward', True)
+        start_key = params.get('ExclusiveStartKey')
+        if start_key:
+            start = order(normalize(start_key))
+            position = bisect.bisect_right(keys, start) if forward else bisect.bisect_left(keys, start) - 1
+        else:
+            position = 0 if forward else len(items) - 1
+        step = 1 if forward else -1
+        limit = params.get('Limit')
+        candidates = []
+        while 0 <= position < len(items) and not (limit and len(candidates) > limit):
+            if _matches(expression, items[position], names, values, True):
+                candidates.append(items[position])
+            position += step
+
+        key_fields = [self.partition_key, self.sort_key, partition_key, sort_key] if self.sort_key else [self.partition_key]
+        return self._page(candidates, params, names, values, list(dict.fromkeys(field for field in key_fields if field)))
+
+    def scan(self, **params: Any) -> Dict[str, Any]:
+        self._request('scan', params)
+        names = dict(params.get('ExpressionAttributeNames') or {})
+        values = normalize(params.get('ExpressionAttributeValues') or {})
+        if params.get('FilterExpression') is not None:
+            params['FilterExpression'] = _build(params['FilterExpression'], names, values, False)
+        start = 0
+        if params.get('ExclusiveStartKey'):
+            start = self.positions[self._key(normalize(params.pop('ExclusiveStartKey')))] + 1
+        limit = params.get('Limit') or len(self.order)
+        candidates = [self.items[key] for key in self.order[start:start + limit + 1] if key in self.items]
+        key_fields = [field for field in (self.partition_key, self.sort_key) if field]
+        return self._page(candidates, params, names, values, key_fields)
+
+    def batch_writer(self, overwrite_by_pkeys: Optional[List[str]] = None) -> Any:
+        table = self
+
+        class _Writer:
+            def __enter__(self):
+                return self
+
+            def __exit__(self, *exc_info):
+                return False
+
+            def put_item(self, Item):
+                table._count('batch_put')
+                table._store(normalize(Item))
+
+            def delete_item(self, Key):
+                table._delete(table._key(normalize(Key)))
+
+        return _Writer()
+
+class FakeDynamoDB:
+    """Stand-in for ``boto3.resource('dynamodb')``."""
+
+    def __init__(self):
+        self.tables: Dict[str, FakeTable] = {}
+        self.lock = threading.Lock()
+        # Items per query/scan page (None: unlimited) and seconds per query/scan request
+        self.page_items: Optional[int] = None
+        self.request_latency = 0.0
+
+    def Table(self, name: str) -> FakeTable:
+        if name not in self.tables:
+            with self.lock:
+                if name not in self.tables:
+                    self.tables[name] = FakeTable(name, self)
+        return self.tables[name]
+
+    def batch_write_item(self, RequestItems: Dict[str, List[Dict[str, Any]]]) -> Dict[str, Any]:
+        for name, requests in RequestItems.items():
+            table = self.Table(name)
+            table._count('batch_write_item')
+            for request in requests:
+                table._store(normalize(request['PutRequest']['Item']))
+        return {'UnprocessedItems': {}}
+
+class FakeDynamoDBClient:
+    """Stand-in for ``boto3.client('dynamodb')``, on top of the resource fake."""
+
+    def __init__(self, resource: FakeDynamoDB):
+        self.resource = resource
+
+    @staticmethod
+    def _typed(item: Dict[str, Any]) -> Dict[str, Any]:
+        return {key: _serializer.serialize(value) for key, value in item.items()}
+
+    @staticmethod
+    def _untyped(item: Dict[str, Any]) -> Dict[str, Any]:
+        return {key: _deserializer.deserialize(value) for key, value in item.items()}
+
+    def query(self, TableName: str, **params: Any) -> Dict[str, Any]:
+        if 'ExpressionAttributeValues' in params:
+            params['ExpressionAttributeValues'] = self._untyped(params['ExpressionAttributeValues'])
+        if 'ExclusiveStartKey' in params:
+            params['ExclusiveStartKey'] = self._untyped(params['ExclusiveStartKey'])
+        response = self.resource.Table(TableName).query(**params)
+        response['Items'] = [self._typed(item) for item in response['Items']]
+        if 'LastEvaluatedKey' in response:
+            response['LastEvaluatedKey'] = self._typed(response['LastEvaluatedKey'])
+        return response
+
+    def batch_get_item(self, RequestItems: Dict[str, Dict[str, Any]]) -> Dict[str, Any]:
+        responses = {}
+        for name, request in RequestItems.items():
+            table = self.resource.Table(name)
+            table._count('batch_get_item')
+            names = request.get('ExpressionAttributeNames') or {}
+            found = []
+            for key in request['Keys']:
+                item = table.items.get(table._key(self._untyped(key)))
+                if item is not None:
+                    found.append(self._typed(_project(item, request.get('ProjectionExpression'), names)))
+            responses[name] = found
+        return {'Responses': responses, 'UnprocessedKeys': {}}
+
+class FakeLambdaClient:
+    def __init__(self):
+        self.invocations: List[Dict[str, Any]] = []
+
+    def invoke(self, **params: Any) -> Dict[str, Any]:
+        self.invocations.append(params)
+        return {'StatusCode': 202}
+
+class FakeSQSClient:
+    """Stand-in for ``boto3.client('sqs')`` with one in-memory queue per URL."""
+
+    def __init__(self):
+        self.queues: Dict[str, List[Dict[str, Any]]] = {}
+        self.offset = 0.0
+        self.lock = threading.Lock()
+
+    def now(self) -> float:
+        return time.monotonic() + self.offset
+
+    def advance(self, seconds: float) -> None:
+        self.offset += seconds
+
+    def _find(self, QueueUrl: str, ReceiptHandle: str) -> Optional[Dict[str, Any]]:
+        for message in self.queues.get(QueueUrl, []):
+            if message['ReceiptHandle'] == ReceiptHandle:
+                return message
+        return None
+
+    def send_message(self, QueueUrl: str, MessageBody: str, DelaySeconds: int = 0, **kwargs: Any) -> Dict[str, Any]:
+        message = {'MessageId': str(uuid.uuid4()), 'Body': MessageBody, 'ReceiptHandle': None,
+                   'receive_count': 0, 'visible_at': self.now() + DelaySeconds}
+        with self.lock:
+            self.queues.setdefault(QueueUrl, []).append(message)
+        return {'MessageId': message['MessageId']}
+
+    def receive_message(self, QueueUrl: str, MaxNumberOfMessages: int = 1, VisibilityTimeout: int = 30, **kwargs: Any) -> Dict[str, Any]:
+        received = []
+        with self.lock:
+            now = self.now()
+            for message in self.queues.get(QueueUrl, []):
+                if len(received) == MaxNumberOfMessages:
+                    break
+                if message['visible_at'] <= now:
+                    message['receive_count'] += 1
+                    message['ReceiptHandle'] = str(uuid.uuid4())
+                    message['visible_at'] = now + VisibilityTimeout
+                    received.append({
+                        'MessageId': message['MessageId'],
+                        'ReceiptHandle': message['ReceiptHandle'],
+                        'Body': message['Body'],
+                        'Attributes': {'ApproximateReceiveCount': str(message['receive_count'])}
+                    })
+        return {'Messages': received} if received else {}
+
+    def delete_message(self, QueueUrl: str, ReceiptHandle: str) -> Dict[str, Any]:
+        with self.lock:
+            message = self._find(QueueUrl, ReceiptHandle)
+            if message is not None:
+                self.queues[QueueUrl].remove(message)
+        return {}
+
+    def change_message_visibility(self, QueueUrl: str, ReceiptHandle: str, VisibilityTimeout: int) -> Dict[str, Any]:
+        with self.lock:
+            message = self._find(QueueUrl, ReceiptHandle)
+            if message is None:
+                raise _client_error('ReceiptHandleIsInvalid', 'ChangeMessageVisibility')
+            message['visible_at'] = self.now() + VisibilityTimeout
+        return {}
+
+    def next_visible_in(self, QueueUrl: str) -> Optional[float]:
+        """Seconds until the next message becomes visible, None when the queue is empty."""
+        with self.lock:
+            messages = self.queues.get(QueueUrl, [])
+            return max(0.0, min(message['visible_at'] for message in messages) - self.now()) if messages else None
+
+    def lambda_event(self, QueueUrl: str, batch_size: int = 10, visibility_timeout: int = 900) -> Dict[str, Any]:
+        """Receive a batch shaped like the Lambda SQS event source delivers it."""
+        messages = self.receive_message(QueueUrl, batch_size, visibility_timeout).get('Messages', [])
+        return {'Records': [
+            {'messageId': message['MessageId'], 'receiptHandle': message['ReceiptHandle'], 'body': message['Body'],
+             'attributes': message['Attributes'], 'eventSource': 'aws:sqs'}
+            for message in messages
+        ]}
+
+    def complete(self, QueueUrl: str, event: Dict[str, Any], response: Dict[str, Any]) -> None:
+        """Delete the batch's messages except the reported ``batchItemFailures``, like the event source."""
+        failed = {failure['itemIdentifier'] for failure in (response or {}).get('batchItemFailures', [])}
+        for record in event['Records']:
+            if record['messageId'] not in failed:
+                self.delete_message(QueueUrl, record['receiptHandle'])
+
+# --- OpenAI ------------------------------------------------------------------
+
+CANNED_ANALYSIS = {
+    'score': 82,
+    'analysis': '깊은 수면 비율이 양호하고 중간에 깬 시간이 짧습니다. ' * 20,
+}
+
+class FakeRateLimitError(Exception):
+    status_code = 429
+
+class FakeOpenAI:
+    """Assistant runs finish with a canned ```json``` answer."""
+
+    def __init__(self, answer: Optional[Dict[str, Any]] = None, latency: float = 0.0, error_rate: float = 0.0, seed: int = 0):
+        import json
+        import random
+        rng = random.Random(seed)
+        text = f"분석 결과입니다.\n```json\n{json.dumps(answer or CANNED_ANALYSIS, ensure_ascii=False)}\n```"
+        message = SimpleNamespace(content=[SimpleNamespace(text=SimpleNamespace(value=text))])
+        run = SimpleNamespace(id='run_bench', status='completed', last_error=None)
+        self.prompts: List[int] = []
+
+        def create_message(thread_id, role, content):
+            # Prompt size in characters, the main driver of real latency and cost
+            if error_rate and rng.random() < error_rate:
+                raise FakeRateLimitError('Rate limit reached for requests')
+            self.prompts.append(len(content))
+            if latency:
+                time.sleep(latency)
+            return SimpleNamespace(id='msg_bench')
+
+        runs = SimpleNamespace(
+            create=lambda thread_id, assistant_id: run,
+            retrieve=lambda thread_id, run_id: run,
+        )
+        self.beta = SimpleNamespace(threads=SimpleNamespace(
+            create=lambda: SimpleNamespace(id='thread_bench'),
+            messages=SimpleNamespace(
+                create=create_message,
+                list=lambda thread_id: SimpleNamespace(data=[message]),
+            ),
+            runs=runs,
+        ))
+
+class FakeContext:
+    function_name = 'benchmark'
+    aws_request_id = 'benchmark'
+
+    def get_remaining_time_in_millis(self) -> int:
+        return 900000
+
+def install_fakes() -> SimpleNamespace:
+    """Replace the runtime's clients with fresh stand-ins and return them."""
+    dynamodb = FakeDynamoDB()
+    fakes = SimpleNamespace(
+        dynamodb=dynamodb,
+        dynamodb_client=FakeDynamoDBClient(dynamodb),
+        lambda_client=FakeLambdaClient(),
+        sqs=FakeSQSClient(),
+        openai=FakeOpenAI(),
+    )
+    runtime._tables.clear()
+    runtime._clients.clear()
+    # Worker threads create their own resource, the stand-in is shared (it locks its tables)
+    runtime._new_dynamodb = lambda: dynamodb
+    runtime._clients.update({
+        'dynamodb': fakes.dynamodb,
+        'client:dynamodb': fakes.dynamodb_client,
+        'client:lambda': fakes.lambda_client,
+        'client:sqs': fakes.sqs,
+        'openai': fakes.openai,
+    })
+    return fakes
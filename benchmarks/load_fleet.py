@@ -0,0 +1,401 @@
+"""Synthetic device fleet: generate, record, replay and load-test the upload handlers.
+
+Run from the repository root:
+
+    python benchmarks/load_fleet.py generate --devices 2000 --seed 7 --events 20000 --out fleet.jsonl
+    python benchmarks/load_fleet.py run --devices 2000 --concurrency 1,4,16,64 --requests 2000
+    python benchmarks/load_fleet.py run --replay fleet.jsonl --mode process
+    python benchmarks/load_fleet.py serve --port 8080 --record captured.jsonl
+    python benchmarks/load_fleet.py run --replay captured.jsonl --mode http --url http://127.0.0.1:8080
+
+A fleet is a deterministic function of ``--seed``. Each device sleeps one
+night starting within ``--bedtime-spread-minutes``, with a hypnogram built
+from ~90 minute cycles (more deep sleep early, more REM late, brief
+awakenings), and sends:
+
+- a ``receiveSensorData`` batch every ``--sensor-batch-seconds`` with
+  accelerometer and heart rate samples at ``--sensor-hz``
+- a ``recieve_sleep_data`` upload of its 30 s stage records every
+  ``--upload-minutes``, the last one with the ``end`` marker
+
+The devices' events are merged in send-time order, like production traffic.
+Event files are JSON lines of ``{"time", "handler", "event"}`` with API
+Gateway proxy events. ``generate`` writes them and ``serve --record``
+captures the requests it receives. ``run --replay`` plays a file back,
+starting over at its end.
+
+``run`` sends ``--requests`` consecutive events per concurrency level with
+that many callers in flight. The modes are:
+
+- ``thread`` (default) calls the handlers in-process against one shared set
+  of the ``benchmarks/fakes.py`` stand-ins
+- ``process`` gives every worker process its own stand-ins, so conditional
+  writes do not see the other workers' data
+- ``http`` posts to ``--url``, e.g. the ``serve`` stand-in, which runs every
+  handler on the stand-ins behind a local HTTP server
+
+Per level the tool reports throughput, p50/p99 latency, items written per
+second, and the write rate of the hottest partition key. DynamoDB serves
+about 1000 writes/s of items up to 1 KB per partition. The write counts come
+from the events themselves: one item per sensor sample under
+``sensor_data/<client>``, one per stage record under ``sleep_records/<session>``
+two index updates per session under ``client_sessions/<client>`` and one
+upload count per session under ``sleep_analysis_triggers/<session>``.
+Analysis Lambda invocations are only recorded by the stand-ins, not run.
+"""
+import argparse
+import base64
+import heapq
+import itertools
+import json
+import os
+import random
+import sys
+import threading
+import time
+import urllib.error
+import urllib.request
+import uuid
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Callable, Dict, Iterator, List, Tuple
+from urllib.parse import parse_qsl, urlencode, urlsplit
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from bench_handlers import load_handler, percentile  # noqa: E402
+from fakes import ROOT, FakeContext, install_fakes  # noqa: E402
+
+from sleep_common.body import BodyDecodeError, decode_body  # noqa: E402
+
+NIGHT_START = 1700000000
+EPOCH = 30
+
+# --- fleet ------------------------------------------------------------------------
+
+def hypnogram(rng: random.Random, epochs: int) -> List[int]:
+    """Stage of every 30 s epoch of one night."""
+    stages = [7] * rng.randint(10, 40)  # in bed, falling asleep
+    cycle = 0
+    while len(stages) < epochs:
+        # ~90 minute cycles, deep sleep shrinks and REM grows through the night
+        length = rng.randint(160, 200)
+        deep = int(length * max(0.05, 0.35 - 0.08 * cycle + rng.uniform(-0.05, 0.05)))
+        rem = int(length * min(0.45, 0.10 + 0.08 * cycle + rng.uniform(-0.03, 0.03)))
+        light = length - deep - rem
+        stages += [4] * (light // 2) + [5] * deep + [4] * (light - light // 2) + [6] * rem
+        if rng.random() < 0.3:
+            stages += [1] * rng.randint(1, 6)  # brief awakening
+        cycle += 1
+    stages = stages[:epochs]
+    awake = min(epochs, rng.randint(2, 10))  # woken up
+    stages[-awake:] = [1] * awake
+    return stages
+
+def sensor_sample(rng: random.Random, timestamp_ms: int, seq: int, stage: int) -> Dict[str, Any]:
+    movement = {1: 0.3, 7: 0.15, 4: 0.03, 6: 0.02, 5: 0.01}.get(stage, 0.05)
+    heart_rate = {1: 68, 7: 64, 4: 58, 6: 62, 5: 52}.get(stage, 60)
+    return {
+        'timestamp_ms': timestamp_ms,
+        'seq': seq,
+        'data': {
+            'x': round(rng.gauss(0.0, movement), 3),
+            'y': round(rng.gauss(0.0, movement), 3),
+            'z': round(0.98 + rng.gauss(0.0, movement), 3),
+            'heart_rate': int(heart_rate + rng.gauss(0.0, 2.0))
+        }
+    }
+
+def sensor_event(client_uuid: str, samples: List[Dict[str, Any]]) -> Dict[str, Any]:
+    return {
+        'httpMethod': 'POST',
+        'path': '/receiveSensorData',
+        'headers': {'Content-Type': 'application/json'},
+        'body': json.dumps({'client': client_uuid, 'samples': samples})
+    }
+
+def upload_event(client_uuid: str, records: List[Dict[str, Any]]) -> Dict[str, Any]:
+    return {
+        'httpMethod': 'POST',
+        'path': '/recieve_sleep_data',
+        'headers': {'Content-Type': 'application/json'},
+        'queryStringParameters': {'client_uuid': client_uuid},
+        'body': json.dumps({'sleep_data': records})
+    }
+
+def device_events(seed: int, device: int, args: argparse.Namespace) -> Iterator[Tuple[float, str, Dict[str, Any]]]:
+    """(send time, handler, event) of one device's night, in send-time order."""
+    rng = random.Random(f'{seed}:{device}')
+    client_uuid = str(uuid.UUID(int=rng.getrandbits(128), version=4))
+    session_uuid = str(uuid.UUID(int=rng.getrandbits(128), version=4))
+    bedtime = NIGHT_START + int(rng.uniform(0, args.bedtime_spread_minutes * 60))
+    epochs = max(1, int(rng.uniform(0.75, 1.0) * args.night_minutes * 60 / EPOCH))
+    stages = hypnogram(rng, epochs)
+    night_end = bedtime + epochs * EPOCH
+
+    # Sensor batches and stage uploads, merged by the time they are sent
+    batch_seconds = args.sensor_batch_seconds
+    upload_seconds = args.upload_minutes * 60
+    sample_ms = int(1000 / args.sensor_hz)
+    next_batch, next_upload, uploaded = bedtime + batch_seconds, bedtime + upload_seconds, 0
+    while uploaded < epochs:
+        if next_batch <= min(next_upload, night_end):
+            start_ms = (next_batch - batch_seconds) * 1000
+            samples = [
+                sensor_sample(rng, timestamp_ms, 0, stages[min(epochs - 1, (timestamp_ms // 1000 - bedtime) // EPOCH)])
+                for timestamp_ms in range(start_ms, next_batch * 1000, sample_ms)
+            ]
+            yield next_batch, 'receiveSensorData', sensor_event(client_uuid, samples)
+            next_batch += batch_seconds
+            continue
+        send_time = min(next_upload, night_end)
+        last = min(epochs, (send_time - bedtime) // EPOCH)
+        records = [
+            {'sessionId': session_uuid, 'startTime': bedtime + i * EPOCH, 'endTime': bedtime + (i + 1) * EPOCH, 'stage': stages[i]}
+            for i in range(uploaded, last)
+        ]
+        if records:
+            if last == epochs:
+                records[-1]['end'] = True
+            yield send_time, 'recieve_sleep_data', upload_event(client_uuid, records)
+        uploaded = last
+        next_upload += upload_seconds
+
+def fleet_events(args: argparse.Namespace) -> Iterator[Dict[str, Any]]:
+    devices = [device_events(args.seed, device, args) for device in range(args.devices)]
+    for send_time, handler, event in heapq.merge(*devices, key=lambda entry: entry[0]):
+        yield {'time': send_time, 'handler': handler, 'event': event}
+
+def replay_events(path: str) -> Iterator[Dict[str, Any]]:
+    with open(path, encoding='utf-8') as f:
+        records = [json.loads(line) for line in f if line.strip()]
+    if not records:
+        raise SystemExit(f'{path} has no events')
+    return itertools.cycle(records)
+
+def partition_writes(record: Dict[str, Any]) -> Dict[str, int]:
+    """Items written per partition key by one event."""
+    try:
+        body = decode_body(record['event']) if 'body' in record['event'] else record['event']
+    except BodyDecodeError:
+        return {}
+    if not isinstance(body, dict):
+        return {}
+    writes: Dict[str, int] = {}
+    if record['handler'] == 'receiveSensorData' and 'client' in body:
+        samples = body.get('samples')
+        writes[f'sensor_data/{body["client"]}'] = len(samples) if isinstance(samples, list) else 1
+    elif record['handler'] == 'recieve_sleep_data' and isinstance(body.get('sleep_data'), list):
+        client_uuid = (record['event'].get('queryStringParameters') or {}).get('client_uuid')
+        sessions = set()
+        for item in body['sleep_data']:
+            if isinstance(item, dict) and 'sessionId' in item:
+                key = f'sleep_records/{item["sessionId"]}'
+                writes[key] = writes.get(key, 0) + 1
+                sessions.add(item['sessionId'])
+        for session_uuid in sessions:
+            # The upload count (data version) of the session
+            writes[f'sleep_analysis_triggers/{session_uuid}'] = 1
+        if client_uuid and sessions:
+            writes[f'client_sessions/{client_uuid}'] = 2 * len(sessions)
+    return writes
+
+# --- drivers ------------------------------------------------------------------------
+
+CONTEXT = FakeContext()
+
+def call_handler(handlers: Dict[str, Any], record: Dict[str, Any]) -> Tuple[float, int]:
+    begin = time.perf_counter()
+    try:
+        response = handlers[record['handler']].lambda_handler(record['event'], CONTEXT)
+        status = response.get('statusCode', 200) if isinstance(response, dict) else 200
+    except Exception:
+        status = 500
+    return time.perf_counter() - begin, status
+
+def load_handlers(names: List[str]) -> Dict[str, Any]:
+    return {name: load_handler(name) for name in names}
+
+_worker_handlers: Dict[str, Any] = {}
+
+def _init_worker(names: List[str]) -> None:
+    install_fakes()
+    _worker_handlers.update(load_handlers(names))
+
+def _call_in_worker(record: Dict[str, Any]) -> Tuple[float, int]:
+    return call_handler(_worker_handlers, record)
+
+def _ready(_: int) -> bool:
+    return True
+
+def http_call(url: str, record: Dict[str, Any]) -> Tuple[float, int]:
+    event = record['event']
+    query = urlencode(event.get('queryStringParameters') or {})
+    target = f'{url.rstrip("/")}/{record["handler"]}' + (f'?{query}' if query else '')
+    body = event.get('body') or ''
+    data = base64.b64decode(body) if event.get('isBase64Encoded') else body.encode('utf-8')
+    headers = {
+        key: value for key, value in (event.get('headers') or {}).items()
+        if key.lower() not in ('host', 'content-length', 'connection')
+    }
+    request = urllib.request.Request(target, data=data, headers=headers, method=event.get('httpMethod') or 'POST')
+    begin = time.perf_counter()
+    try:
+        with urllib.request.urlopen(request, timeout=30) as response:
+            response.read()
+            status = response.status
+    except urllib.error.HTTPError as e:
+        status = e.code
+    except OSError:
+        status = 599
+    return time.perf_counter() - begin, status
+
+def run_level(mode: str, concurrency: int, records: List[Dict[str, Any]], call: Callable, names: List[str]) -> Tuple[float, List[Tuple[float, int]]]:
+    """Send ``records`` with ``concurrency`` callers in flight; (elapsed seconds, [(latency, status)])."""
+    if mode == 'process':
+        with ProcessPoolExecutor(concurrency, initializer=_init_worker, initargs=(names,)) as pool:
+            list(pool.map(_ready, range(concurrency)))  # start the workers outside the timing
+            started = time.perf_counter()
+            results = list(pool.map(_call_in_worker, records, chunksize=max(1, len(records) // (concurrency * 8))))
+            return time.perf_counter() - started, results
+    with ThreadPoolExecutor(concurrency) as pool:
+        started = time.perf_counter()
+        results = list(pool.map(call, records))
+        return time.perf_counter() - started, results
+
+def run(args: argparse.Namespace) -> None:
+    events = replay_events(args.replay) if args.replay else fleet_events(args)
+    levels = [int(level) for level in args.concurrency.split(',')]
+    batches = [list(itertools.islice(events, args.requests)) for _ in levels]
+    names = sorted({record['handler'] for batch in batches for record in batch})
+
+    if args.mode == 'http':
+        call = lambda record: http_call(args.url, record)  # noqa: E731
+    else:
+        install_fakes()
+        handlers = load_handlers(names) if args.mode == 'thread' else {}
+        call = lambda record: call_handler(handlers, record)  # noqa: E731
+
+    print(f'{"concurrency":>11}{"requests":>10}{"errors":>8}{"req/s":>10}{"items/s":>10}'
+          f'{"p50 ms":>9}{"p99 ms":>9}{"hot items/s":>13}  hottest partition')
+    for concurrency, batch in zip(levels, batches):
+        if not batch:
+            print(f'{concurrency:>11}  fleet exhausted, add --devices or lower --requests')
+            break
+        writes: Dict[str, int] = {}
+        for record in batch:
+            for key, count in partition_writes(record).items():
+                writes[key] = writes.get(key, 0) + count
+        elapsed, results = run_level(args.mode, concurrency, batch, call, names)
+        latencies = [latency for latency, _ in results]
+        errors = sum(1 for _, status in results if status >= 400)
+        hot_key = max(writes, key=writes.get) if writes else '-'
+        print(f'{concurrency:>11}{len(batch):>10}{errors:>8}{len(batch) / elapsed:>10.1f}'
+              f'{sum(writes.values()) / elapsed:>10.0f}{percentile(latencies, 0.50) * 1000:>9.2f}'
+              f'{percentile(latencies, 0.99) * 1000:>9.2f}{writes.get(hot_key, 0) / elapsed:>13.0f}  {hot_key}')
+
+# --- generate / serve ------------------------------------------------------------------
+
+def generate(args: argparse.Namespace) -> None:
+    with open(args.out, 'w', encoding='utf-8') as f:
+        for record in itertools.islice(fleet_events(args), args.events):
+            f.write(json.dumps(record) + '\n')
+
+def serve(args: argparse.Namespace) -> None:
+    install_fakes()
+    names = sorted(name for name in os.listdir(ROOT) if os.path.isfile(os.path.join(ROOT, name, 'lambda_function.py')))
+    handlers = load_handlers(names)
+    record_lock = threading.Lock()
+    capture = open(args.record, 'a', encoding='utf-8') if args.record else None
+
+    class Handler(BaseHTTPRequestHandler):
+        def handle_request(self):
+            url = urlsplit(self.path)
+            name = url.path.strip('/').split('/')[0]
+            if name not in handlers:
+                self.send_error(404, f'No handler {name}')
+                return
+            body = self.rfile.read(int(self.headers.get('Content-Length') or 0))
+            try:
+                text, is_base64 = body.decode('utf-8'), False
+            except UnicodeDecodeError:
+                text, is_base64 = base64.b64encode(body).decode('ascii'), True
+            event = {
+                'httpMethod': self.command,
+                'path': url.path,
+                'headers': dict(self.headers),
+                'queryStringParameters': dict(parse_qsl(url.query)) or None,
+                'body': text if body or self.command != 'GET' else None,
+                'isBase64Encoded': is_base64
+            }
+            if capture:
+                with record_lock:
+                    capture.write(json.dumps({'time': time.time(), 'handler': name, 'event': event}) + '\n')
+                    capture.flush()
+            try:
+                response = handlers[name].lambda_handler(event, CONTEXT)
+            except Exception as e:
+                self.send_error(500, str(e))
+                return
+            if not isinstance(response, dict) or 'statusCode' not in response:
+                response = {'statusCode': 200, 'body': json.dumps(response, default=str)}
+            payload = response.get('body') or ''
+            payload = base64.b64decode(payload) if response.get('isBase64Encoded') else payload.encode('utf-8')
+            self.send_response(response['statusCode'])
+            for key, value in (response.get('headers') or {}).items():
+                self.send_header(key, value)
+            self.send_header('Content-Length', str(len(payload)))
+            self.end_headers()
+            self.wfile.write(payload)
+
+        do_GET = do_POST = do_PUT = handle_request
+
+        def log_message(self, format, *args):
+            pass
+
+    server = ThreadingHTTPServer(('127.0.0.1', args.port), Handler)
+    print(f'Serving {", ".join(names)} on http://127.0.0.1:{args.port}/<handler>')
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        if capture:
+            capture.close()
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    fleet = argparse.ArgumentParser(add_help=False)
+    fleet.add_argument('--devices', type=int, default=1000, help='devices in the fleet')
+    fleet.add_argument('--seed', type=int, default=1, help='the same seed always gives the same fleet')
+    fleet.add_argument('--night-minutes', type=int, default=480, help='longest night, nights last 75-100%% of it')
+    fleet.add_argument('--bedtime-spread-minutes', type=int, default=120, help='window bedtimes are spread over')
+    fleet.add_argument('--upload-minutes', type=int, default=30, help='stage records per upload')
+    fleet.add_argument('--sensor-batch-seconds', type=int, default=60, help='sensor samples per batch')
+    fleet.add_argument('--sensor-hz', type=float, default=1.0, help='sensor samples per second')
+
+    command = commands.add_parser('generate', parents=[fleet], help='write a fleet as an event file')
+    command.add_argument('--events', type=int, default=10000, help='events to write')
+    command.add_argument('--out', required=True, help='event file (JSON lines)')
+    command.set_defaults(function=generate)
+
+    command = commands.add_parser('run', parents=[fleet], help='drive the handlers at rising concurrency')
+    command.add_argument('--replay', help='event file to replay instead of a generated fleet')
+    command.add_argument('--mode', choices=['thread', 'process', 'http'], default='thread')
+    command.add_argument('--url', default='http://127.0.0.1:8080', help='base URL in http mode')
+    command.add_argument('--concurrency', default='1,4,16,64', help='comma-separated callers in flight per level')
+    command.add_argument('--requests', type=int, default=2000, help='events sent per level')
+    command.set_defaults(function=run)
+
+    command = commands.add_parser('serve', help='serve every handler on the stand-ins over local HTTP')
+    command.add_argument('--port', type=int, default=8080)
+    command.add_argument('--record', help='append every received request to this event file')
+    command.set_defaults(function=serve)
+
+    args = parser.parse_args()
+    args.function(args)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1 @@
+"""Shared code for the sleep Lambda functions, deployed as a Lambda layer."""
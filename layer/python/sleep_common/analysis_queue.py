@@ -0,0 +1,76 @@
+"""SQS queue between finished uploads and the analysis worker.
+
+With ``ANALYSIS_TRIGGER_MODE=queue``, ``recieve_sleep_data`` sends one
+message per claimed session (``enqueue_analysis``) to ``ANALYSIS_QUEUE_URL``
+instead of invoking ``sleep_data_analysis``. The ``queue_handler`` entry point
+of ``sleep_data_analysis`` consumes those messages in batches:
+
+- a retryable failure is retried later by raising the message's visibility
+  timeout (``retry_later``) and reporting it in ``batchItemFailures``; the
+  delay doubles per receive, from ``ANALYSIS_RETRY_BASE_SECONDS`` up to
+  ``ANALYSIS_RETRY_MAX_SECONDS``, with jitter
+- a permanent failure, or the ``ANALYSIS_MAX_ATTEMPTS``-th failed receive,
+  is written to ``sleep_analysis_dead_letters`` (key: ``session_uuid``) with
+  ``dead_letter`` and removed from the queue
+"""
+import json
+import os
+import random
+import time
+from typing import Any, Dict, Optional
+
+from sleep_common.runtime import dumps, get_client, get_table
+
+ANALYSIS_QUEUE_URL = os.environ.get('ANALYSIS_QUEUE_URL', '')
+DEAD_LETTER_TABLE_NAME = 'sleep_analysis_dead_letters'
+
+MAX_ATTEMPTS = int(os.environ.get('ANALYSIS_MAX_ATTEMPTS', '5'))
+RETRY_BASE_SECONDS = int(os.environ.get('ANALYSIS_RETRY_BASE_SECONDS', '30'))
+# SQS caps the visibility timeout at 12 hours
+RETRY_MAX_SECONDS = min(int(os.environ.get('ANALYSIS_RETRY_MAX_SECONDS', '900')), 43200)
+
+def enqueue_analysis(session_uuid: str, data_version: Any) -> None:
+    get_client('sqs').send_message(
+        QueueUrl=ANALYSIS_QUEUE_URL,
+        MessageBody=dumps({'session_uuid': session_uuid, 'data_version': data_version})
+    )
+
+def parse_message(record: Dict[str, Any]) -> Dict[str, Any]:
+    """The message of an SQS event record; ValueError when it is not one of ours."""
+    try:
+        message = json.loads(record['body'])
+    except (KeyError, TypeError, ValueError) as e:
+        raise ValueError(f'Invalid message body: {str(e)}')
+    if not isinstance(message, dict) or not message.get('session_uuid'):
+        raise ValueError('Message has no session_uuid')
+    return message
+
+def receive_count(record: Dict[str, Any]) -> int:
+    return int((record.get('attributes') or {}).get('ApproximateReceiveCount', 1))
+
+def retry_delay(attempt: int) -> int:
+    delay = min(RETRY_MAX_SECONDS, RETRY_BASE_SECONDS * 2 ** max(0, attempt - 1))
+    return int(random.uniform(delay / 2, delay))
+
+def retry_later(record: Dict[str, Any], attempt: int) -> int:
+    """Hide the message for the attempt's backoff delay; returns the delay."""
+    delay = retry_delay(attempt)
+    get_client('sqs').change_message_visibility(
+        QueueUrl=ANALYSIS_QUEUE_URL,
+        ReceiptHandle=record['receiptHandle'],
+        VisibilityTimeout=delay
+    )
+    return delay
+
+def dead_letter(session_uuid: str, data_version: Optional[Any], attempts: int, error: str, body: Optional[str] = None) -> None:
+    item = {
+        'session_uuid': session_uuid,
+        'attempts': attempts,
+        'error': error[:1000],
+        'failed_at': int(time.time())
+    }
+    if data_version is not None:
+        item['data_version'] = data_version
+    if body is not None:
+        item['body'] = body[:1000]
+    get_table(DEAD_LETTER_TABLE_NAME).put_item(Item=item)
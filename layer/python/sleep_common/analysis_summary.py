@@ -0,0 +1,95 @@
+"""Compact per-session summaries of stored analyses.
+
+``sleep_analysis_summary`` holds one small item per analyzed session, keyed
+so a listing page is a single query instead of a scan of ``sleep_analysis``:
+
+- partition key ``month``: UTC month of the session start (``YYYY-MM``)
+- sort key ``sort_key``: ``<ISO date>#<session_uuid>``, newest last
+
+Items carry the session, client, date, score and a short excerpt of the
+analysis text. ``sleep_data_analysis`` writes them whenever it stores a
+result, so the table stays current without any batch job. The key moves when
+a re-analysis sees an earlier session start; ``remove_moved_summary`` deletes
+the item under the old key. ``scripts/backfill_summaries.py`` fills the table
+for analyses stored before it existed.
+"""
+import time
+from datetime import datetime, timezone
+from typing import Any, Dict, List, Optional, Tuple
+
+from boto3.dynamodb.conditions import Key
+
+from sleep_common.query import fetch_page
+from sleep_common.runtime import get_table
+
+SUMMARY_TABLE_NAME = 'sleep_analysis_summary'
+EXCERPT_CHARS = 160
+
+def _started(start_time: Any) -> datetime:
+    return datetime.fromtimestamp(int(start_time), tz=timezone.utc)
+
+def session_date(start_time: Any) -> str:
+    return _started(start_time).strftime('%Y-%m-%d')
+
+def summary_key(session_uuid: str, start_time: Any) -> Dict[str, str]:
+    started = _started(start_time)
+    return {
+        'month': started.strftime('%Y-%m'),
+        'sort_key': f"{started.strftime('%Y-%m-%dT%H:%M:%SZ')}#{session_uuid}"
+    }
+
+def excerpt(analysis: Optional[str], max_chars: int = EXCERPT_CHARS) -> str:
+    text = ' '.join((analysis or '').split())
+    if len(text) <= max_chars:
+        return text
+    return text[:max_chars - 1].rstrip() + '…'
+
+def put_summary(session_uuid: str, client_uuid: Optional[str], start_time: Any, score: Any,
+                score_source: str, analysis: Optional[str]) -> None:
+    get_table(SUMMARY_TABLE_NAME).put_item(Item={
+        **summary_key(session_uuid, start_time),
+        'session_uuid': session_uuid,
+        'client_uuid': client_uuid,
+        'date': session_date(start_time),
+        'start_time': int(start_time),
+        'score': score,
+        'score_source': score_source,
+        'excerpt': excerpt(analysis),
+        'updated_at': int(time.time())
+    })
+
+def update_summary_score(session_uuid: str, client_uuid: Optional[str], start_time: Any, score: Any, score_source: str) -> None:
+    """Set the score of an existing summary, leaving its excerpt alone."""
+    get_table(SUMMARY_TABLE_NAME).update_item(
+        Key=summary_key(session_uuid, start_time),
+        UpdateExpression='SET session_uuid = :session, client_uuid = :client, #date = :date, start_time = :start, '
+                         'score = :score, score_source = :source, updated_at = :now',
+        ExpressionAttributeNames={'#date': 'date'},
+        ExpressionAttributeValues={
+            ':session': session_uuid,
+            ':client': client_uuid,
+            ':date': session_date(start_time),
+            ':start': int(start_time),
+            ':score': score,
+            ':source': score_source,
+            ':now': int(time.time())
+        }
+    )
+
+def remove_moved_summary(session_uuid: str, previous_start_time: Any, start_time: Any) -> None:
+    """Delete the summary keyed by the session's previous start time, if the key changed."""
+    if previous_start_time is None:
+        return
+    previous_key = summary_key(session_uuid, previous_start_time)
+    if previous_key != summary_key(session_uuid, start_time):
+        get_table(SUMMARY_TABLE_NAME).delete_item(Key=previous_key)
+
+def fetch_month(month: str, limit: int, start_key: Optional[Dict[str, Any]] = None) -> Tuple[List[Dict[str, Any]], Optional[Dict[str, Any]]]:
+    """One page of a month's summaries, newest first."""
+    return fetch_page(
+        get_table(SUMMARY_TABLE_NAME),
+        limit,
+        start_key,
+        key_condition=Key('month').eq(month),
+        ScanIndexForward=False
+    )
@@ -0,0 +1,153 @@
+"""Coalesced, idempotent triggering of sleep_data_analysis.
+
+Each session has one claim item in ``sleep_analysis_triggers``. Its data
+version counts the uploads that stored records for the session, so records
+that arrive late count as new data even when they are earlier in time:
+
+- ``record_upload`` bumps the version after an upload's records are written
+  and returns it.
+- ``claim_analysis`` succeeds only when the version is newer than the last
+  requested one, so repeated triggers of the same upload do not start
+  another analysis. A claim is a lease: once it is
+  ``ANALYSIS_CLAIM_TIMEOUT_SECONDS`` old and its version still is not
+  analyzed (the run failed), the next trigger can claim the version again.
+- ``get_data_version`` is read by the analysis before it reads the records, and
+  ``analysis_is_current`` lets it skip duplicate deliveries of a run whose
+  data was already analyzed.
+- ``mark_analyzed`` records the version a finished analysis covered.
+
+The attributes are ``upload_version``, ``requested_upload`` and
+``analyzed_upload``; versions are plain counters starting at 1.
+
+The same item also holds an assistant run that outlived its invocation
+(``save_pending_run``), so a follow-up invocation can resume it.
+"""
+import os
+import time
+from typing import Any, Dict, Optional
+
+from botocore.exceptions import ClientError
+
+from sleep_common.runtime import get_table
+
+TRIGGER_TABLE_NAME = 'sleep_analysis_triggers'
+# Longer than one analysis invocation may take (the Lambda maximum is 900 s)
+CLAIM_TIMEOUT_SECONDS = int(os.environ.get('ANALYSIS_CLAIM_TIMEOUT_SECONDS', '900'))
+
+def _is_conditional_failure(error: ClientError) -> bool:
+    return error.response['Error']['Code'] == 'ConditionalCheckFailedException'
+
+def record_upload(session_uuid: str) -> int:
+    """Count an upload that stored records for the session; returns the new data version."""
+    response = get_table(TRIGGER_TABLE_NAME).update_item(
+        Key={'session_uuid': session_uuid},
+        UpdateExpression='ADD upload_version :one',
+        ExpressionAttributeValues={':one': 1},
+        ReturnValues='UPDATED_NEW'
+    )
+    return int(response['Attributes']['upload_version'])
+
+def get_data_version(session_uuid: str) -> Optional[int]:
+    """The session's current data version, None before its first counted upload."""
+    response = get_table(TRIGGER_TABLE_NAME).get_item(
+        Key={'session_uuid': session_uuid},
+        ProjectionExpression='upload_version',
+        ConsistentRead=True
+    )
+    version = response.get('Item', {}).get('upload_version')
+    return None if version is None else int(version)
+
+def claim_analysis(session_uuid: str, data_version: Any) -> bool:
+    """Claim the analysis of ``data_version``; False if it is already claimed."""
+    now = int(time.time())
+    try:
+        get_table(TRIGGER_TABLE_NAME).update_item(
+            Key={'session_uuid': session_uuid},
+            UpdateExpression='SET requested_upload = :version, requested_at = :now',
+            ConditionExpression=(
+                'attribute_not_exists(requested_upload) OR requested_upload < :version'
+                # An expired claim whose run never recorded the version
+                ' OR (requested_at < :expired'
+                ' AND (attribute_not_exists(analyzed_upload) OR analyzed_upload < :version))'
+            ),
+            ExpressionAttributeValues={
+                ':version': data_version,
+                ':now': now,
+                ':expired': now - CLAIM_TIMEOUT_SECONDS
+            }
+        )
+        return True
+    except ClientError as e:
+        if _is_conditional_failure(e):
+            return False
+        raise
+
+def release_claim(session_uuid: str, data_version: Any) -> None:
+    """Drop a claim whose trigger could not be delivered, so a retry can claim it again."""
+    try:
+        get_table(TRIGGER_TABLE_NAME).update_item(
+            Key={'session_uuid': session_uuid},
+            UpdateExpression='REMOVE requested_upload, requested_at',
+            ConditionExpression='requested_upload = :version',
+            ExpressionAttributeValues={':version': data_version}
+        )
+    except ClientError as e:
+        if not _is_conditional_failure(e):
+            raise
+
+def analysis_is_current(session_uuid: str, data_version: Optional[Any] = None) -> bool:
+    """True if a previous run already analyzed ``data_version`` (default: the current one) or newer data."""
+    response = get_table(TRIGGER_TABLE_NAME).get_item(
+        Key={'session_uuid': session_uuid},
+        ProjectionExpression='analyzed_upload, upload_version',
+        ConsistentRead=True
+    )
+    item = response.get('Item', {})
+    if data_version is None:
+        data_version = item.get('upload_version')
+    analyzed_version = item.get('analyzed_upload')
+    return data_version is not None and analyzed_version is not None and analyzed_version >= data_version
+
+def mark_analyzed(session_uuid: str, data_version: Any) -> None:
+    try:
+        get_table(TRIGGER_TABLE_NAME).update_item(
+            Key={'session_uuid': session_uuid},
+            UpdateExpression='SET analyzed_upload = :version, analyzed_at = :now',
+            ConditionExpression='attribute_not_exists(analyzed_upload) OR analyzed_upload < :version',
+            ExpressionAttributeValues={
+                ':version': data_version,
+                ':now': int(time.time())
+            }
+        )
+    except ClientError as e:
+        if not _is_conditional_failure(e):
+            raise
+
+def save_pending_run(session_uuid: str, data_version: Any, thread_id: str, run_id: str, attempt: int) -> None:
+    get_table(TRIGGER_TABLE_NAME).update_item(
+        Key={'session_uuid': session_uuid},
+        UpdateExpression='SET pending_run = :run',
+        ExpressionAttributeValues={
+            ':run': {
+                'data_version': data_version,
+                'thread_id': thread_id,
+                'run_id': run_id,
+                'attempt': attempt,
+                'saved_at': int(time.time())
+            }
+        }
+    )
+
+def get_pending_run(session_uuid: str) -> Optional[Dict[str, Any]]:
+    response = get_table(TRIGGER_TABLE_NAME).get_item(
+        Key={'session_uuid': session_uuid},
+        ProjectionExpression='pending_run',
+        ConsistentRead=True
+    )
+    return response.get('Item', {}).get('pending_run')
+
+def clear_pending_run(session_uuid: str) -> None:
+    get_table(TRIGGER_TABLE_NAME).update_item(
+        Key={'session_uuid': session_uuid},
+        UpdateExpression='REMOVE pending_run'
+    )
@@ -0,0 +1,123 @@
+"""Request body decoding for the ingest endpoints.
+
+Bodies may arrive as plain JSON (string or already-parsed dict), or as
+base64-encoded binary through API Gateway's ``isBase64Encoded`` flag. Binary
+bodies can be gzip-compressed (``Content-Encoding: gzip``) and encoded as
+JSON, MessagePack or CBOR depending on ``Content-Type``. Decompression and
+decoding are streamed, so the inflated body is never held twice in memory.
+
+MessagePack and CBOR support needs the optional ``msgpack`` / ``cbor2``
+packages in the layer; without them such requests are rejected with 415.
+"""
+import base64
+import binascii
+import gzip
+import io
+import json
+import os
+import zlib
+from typing import Any, Dict, Optional
+
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
+try:
+    import cbor2
+except ImportError:
+    cbor2 = None
+
+# Upper bound on the decompressed body, protects against gzip bombs
+MAX_DECODED_BYTES = int(os.environ.get('MAX_DECODED_BODY_BYTES', str(32 * 1024 * 1024)))
+
+MSGPACK_TYPES = ('application/msgpack', 'application/x-msgpack', 'application/vnd.msgpack')
+CBOR_TYPES = ('application/cbor',)
+
+class BodyDecodeError(ValueError):
+    def __init__(self, message: str, status_code: int = 400):
+        super().__init__(message)
+        self.status_code = status_code
+
+class _LimitedReader(io.RawIOBase):
+    """Read-only stream that fails once more than ``limit`` bytes were read."""
+
+    def __init__(self, stream: Any, limit: int):
+        self._stream = stream
+        self._remaining = limit
+
+    def readable(self) -> bool:
+        return True
+
+    def readinto(self, buffer: Any) -> int:
+        data = self._stream.read(len(buffer))
+        self._remaining -= len(data)
+        if self._remaining < 0:
+            raise BodyDecodeError('Request body too large', 413)
+        buffer[:len(data)] = data
+        return len(data)
+
+def get_header(event: Dict[str, Any], name: str) -> Optional[str]:
+    headers = event.get('headers') or {}
+    name = name.lower()
+    for key, value in headers.items():
+        if key.lower() == name:
+            return value
+    return None
+
+def decode_body(event: Dict[str, Any]) -> Any:
+    """Return the decoded request body of an API Gateway event.
+
+    Raises BodyDecodeError with an HTTP status code when the body is missing,
+    malformed or uses an unsupported encoding.
+    """
+    body = event.get('body')
+    if isinstance(body, dict):
+        return body
+    if not isinstance(body, str):
+        raise BodyDecodeError('Invalid request body format')
+
+    content_type = (get_header(event, 'Content-Type') or 'application/json').split(';')[0].strip().lower()
+    content_encoding = (get_header(event, 'Content-Encoding') or '').strip().lower()
+
+    # Fast path: plain JSON text
+    if not event.get('isBase64Encoded') and not content_encoding and content_type not in MSGPACK_TYPES + CBOR_TYPES:
+        try:
+            return json.loads(body)
+        except json.JSONDecodeError:
+            raise BodyDecodeError('Invalid JSON format')
+
+    if event.get('isBase64Encoded'):
+        try:
+            raw = base64.b64decode(body, validate=True)
+        except (binascii.Error, ValueError):
+            raise BodyDecodeError('Invalid base64 body')
+    else:
+        raw = body.encode('utf-8')
+
+    stream: Any = io.BytesIO(raw)
+    if content_encoding in ('gzip', 'x-gzip'):
+        stream = gzip.GzipFile(fileobj=stream, mode='rb')
+    elif content_encoding not in ('', 'identity'):
+        raise BodyDecodeError(f'Unsupported Content-Encoding: {content_encoding}', 415)
+    stream = io.BufferedReader(_LimitedReader(stream, MAX_DECODED_BYTES))
+
+    try:
+        if content_type in MSGPACK_TYPES:
+            if msgpack is None:
+                raise BodyDecodeError('MessagePack bodies are not supported', 415)
+            unpacker = msgpack.Unpacker(stream, raw=False)
+            return next(unpacker)
+        if content_type in CBOR_TYPES:
+            if cbor2 is None:
+                raise BodyDecodeError('CBOR bodies are not supported', 415)
+            return cbor2.load(stream)
+        return json.load(stream)
+    except BodyDecodeError:
+        raise
+    except json.JSONDecodeError:
+        raise BodyDecodeError('Invalid JSON format')
+    except (OSError, EOFError, zlib.error):
+        raise BodyDecodeError('Invalid compressed body')
+    except Exception:
+        raise BodyDecodeError(f'Invalid {content_type} body')
@@ -0,0 +1,99 @@
+"""Bounded in-process LRU cache with per-entry TTL.
+
+A warm Lambda container keeps module state between invocations, so lookups
+cached here skip DynamoDB until they expire. ``session_cache`` is shared by
+the session read paths:
+
+- finished-session data is cached for ``SESSION_CACHE_TTL`` seconds
+- "not found" results are cached for ``SESSION_CACHE_NEGATIVE_TTL`` seconds,
+  short enough that a session uploaded right after a miss shows up quickly
+- at most ``SESSION_CACHE_ENTRIES`` entries are kept, least recently used
+  entries are evicted first
+
+``stats()`` returns hit/miss counters for the container's lifetime and
+``log_cache_stats`` logs them as one structured line.
+"""
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Hashable, Optional, Tuple
+
+from sleep_common.logs import log_fields
+
+MISSING = object()
+
+class TTLCache:
+    def __init__(self, max_entries: int, ttl: float, negative_ttl: float):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.negative_ttl = negative_ttl
+        self._entries: 'OrderedDict[Hashable, Tuple[float, Any]]' = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.negative_hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key: Hashable) -> Any:
+        """Cached value (None for a cached "not found"), or MISSING."""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry[0] <= time.monotonic():
+                if entry is not None:
+                    del self._entries[key]
+                self.misses += 1
+                return MISSING
+            self._entries.move_to_end(key)
+            if entry[1] is None:
+                self.negative_hits += 1
+            else:
+                self.hits += 1
+            return entry[1]
+
+    def set(self, key: Hashable, value: Any, ttl: Optional[float] = None) -> None:
+        """Cache ``value``; None caches a "not found" with the negative TTL."""
+        if ttl is None:
+            ttl = self.negative_ttl if value is None else self.ttl
+        if ttl <= 0 or self.max_entries <= 0:
+            return
+        with self._lock:
+            self._entries[key] = (time.monotonic() + ttl, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def get_or_load(self, key: Hashable, loader: Callable[[], Any], cacheable: Callable[[Any], bool]) -> Any:
+        """Return the cached value or call ``loader``, caching its result if ``cacheable``."""
+        value = self.get(key)
+        if value is not MISSING:
+            return value
+        value = loader()
+        if value is None or cacheable(value):
+            self.set(key, value)
+        return value
+
+    def invalidate(self, key: Hashable) -> None:
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {
+                'hits': self.hits,
+                'negative_hits': self.negative_hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'entries': len(self._entries)
+            }
+
+session_cache = TTLCache(
+    max_entries=int(os.environ.get('SESSION_CACHE_ENTRIES', '512')),
+    ttl=float(os.environ.get('SESSION_CACHE_TTL', '300')),
+    negative_ttl=float(os.environ.get('SESSION_CACHE_NEGATIVE_TTL', '10'))
+)
+
+def log_cache_stats(logger: logging.Logger, cache: TTLCache = session_cache) -> None:
+    log_fields(logger, logging.INFO, 'Session cache', **cache.stats())
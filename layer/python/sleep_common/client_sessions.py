@@ -0,0 +1,90 @@
+"""Per-client session index.
+
+``client_sessions`` lists the sessions of every client, so a client's
+history is one query instead of a scan of ``sleep_records``:
+
+- partition key ``client_uuid``, sort key ``session_uuid``
+- local secondary index ``start_time-index`` (sort key ``start_time``,
+  projection ALL) orders a client's sessions by start time
+
+``recieve_sleep_data`` keeps each session's time range current with
+``record_session``, ``sleep_data_analysis`` adds the score with
+``record_score``. The range is widened with conditional updates, so uploads
+arriving out of order never shrink it.
+"""
+import time
+from typing import Any, Dict, List, Optional, Tuple
+
+from boto3.dynamodb.conditions import Key
+from botocore.exceptions import ClientError
+
+from sleep_common.query import fetch_page
+from sleep_common.runtime import get_table
+
+CLIENT_SESSIONS_TABLE_NAME = 'client_sessions'
+START_TIME_INDEX = 'start_time-index'
+HISTORY_FIELDS = ['session_uuid', 'start_time', 'end_time', 'score', 'score_source']
+
+def _update_if(key: Dict[str, str], update_expression: str, condition: str, values: Dict[str, Any]) -> None:
+    try:
+        get_table(CLIENT_SESSIONS_TABLE_NAME).update_item(
+            Key=key,
+            UpdateExpression=update_expression,
+            ConditionExpression=condition,
+            ExpressionAttributeValues=values
+        )
+    except ClientError as e:
+        if e.response['Error']['Code'] != 'ConditionalCheckFailedException':
+            raise
+
+def record_session(client_uuid: str, session_uuid: str, start_time: int, end_time: int) -> None:
+    """Widen the session's [start_time, end_time] to cover an upload."""
+    key = {'client_uuid': client_uuid, 'session_uuid': session_uuid}
+    _update_if(
+        key,
+        'SET start_time = :start',
+        'attribute_not_exists(start_time) OR start_time > :start',
+        {':start': start_time}
+    )
+    _update_if(
+        key,
+        'SET end_time = :end, updated_at = :now',
+        'attribute_not_exists(end_time) OR end_time < :end',
+        {':end': end_time, ':now': int(time.time())}
+    )
+
+def record_score(client_uuid: Optional[str], session_uuid: str, start_time: Any, score: Any, score_source: str) -> None:
+    if not client_uuid:
+        return
+    get_table(CLIENT_SESSIONS_TABLE_NAME).update_item(
+        Key={'client_uuid': client_uuid, 'session_uuid': session_uuid},
+        # start_time keeps the item in the index even if the upload path missed it
+        UpdateExpression='SET score = :score, score_source = :source, analyzed_at = :now, '
+                         'start_time = if_not_exists(start_time, :start)',
+        ExpressionAttributeValues={
+            ':score': score,
+            ':source': score_source,
+            ':now': int(time.time()),
+            ':start': start_time
+        }
+    )
+
+def fetch_history(client_uuid: str, limit: int, start_key: Optional[Dict[str, Any]] = None,
+                  since: Optional[int] = None, until: Optional[int] = None) -> Tuple[List[Dict[str, Any]], Optional[Dict[str, Any]]]:
+    """One page of a client's sessions started in [since, until], newest first."""
+    key_condition = Key('client_uuid').eq(client_uuid)
+    if since is not None and until is not None:
+        key_condition = key_condition & Key('start_time').between(since, until)
+    elif since is not None:
+        key_condition = key_condition & Key('start_time').gte(since)
+    elif until is not None:
+        key_condition = key_condition & Key('start_time').lte(until)
+    return fetch_page(
+        get_table(CLIENT_SESSIONS_TABLE_NAME),
+        limit,
+        start_key,
+        key_condition=key_condition,
+        projection=HISTORY_FIELDS,
+        IndexName=START_TIME_INDEX,
+        ScanIndexForward=False
+    )
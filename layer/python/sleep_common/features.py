@@ -0,0 +1,172 @@
+"""Compact sensor features for the analysis prompt.
+
+The raw sensor series of a night is reduced to per-epoch summaries with
+NumPy before it is sent to the assistant:
+
+- mean and standard deviation of every numeric sensor field
+- movement counts from the accelerometer magnitude, when x/y/z fields exist
+- heart-rate variability (RMSSD, SDNN) from the heart-rate field
+
+Epochs are EPOCH_SECONDS long, but grow in multiples of EPOCH_SECONDS so a
+night never has more than MAX_EPOCHS of them. That keeps the prompt size,
+and with it latency and token cost, bounded regardless of night length.
+"""
+import math
+import os
+from typing import Any, Dict, Iterable, List, Optional
+
+import numpy as np
+
+EPOCH_SECONDS = 30
+MAX_EPOCHS = int(os.environ.get('FEATURE_MAX_EPOCHS', '240'))
+
+# Change in accelerometer magnitude between samples that counts as movement
+MOVEMENT_THRESHOLD = float(os.environ.get('FEATURE_MOVEMENT_THRESHOLD', '0.1'))
+
+ACCELEROMETER_FIELDS = [('x', 'y', 'z'), ('acc_x', 'acc_y', 'acc_z'), ('accel_x', 'accel_y', 'accel_z')]
+HEART_RATE_FIELDS = ['heart_rate', 'heartRate', 'hr', 'bpm']
+
+# Item attributes that are not sensor readings
+NON_SENSOR_FIELDS = {'client_uuid', 'time'}
+
+def rows_to_columns(items: Iterable[Dict[str, Any]]) -> Dict[str, np.ndarray]:
+    """Stream sensor_data items into float64 columns (NaN where a value is missing).
+
+    Items are consumed one at a time and only their numeric values are kept,
+    so a paginated query can be fed in without materializing every item.
+    """
+    times: List[float] = []
+    fields: Dict[str, List[float]] = {}
+    for item in items:
+        if item.get('time') is None:
+            continue
+        row = len(times)
+        times.append(float(item['time']))
+        for key, value in item.items():
+            if key in NON_SENSOR_FIELDS or value is None or isinstance(value, (str, bool, dict, list, set)):
+                continue
+            try:
+                number = float(value)
+            except (TypeError, ValueError):
+                continue
+            column = fields.get(key)
+            if column is None:
+                column = fields[key] = [math.nan] * row
+            column.extend([math.nan] * (row - len(column)))
+            column.append(number)
+
+    columns = {'time': np.array(times, dtype=np.float64)}
+    for field, values in fields.items():
+        values.extend([math.nan] * (len(times) - len(values)))
+        columns[field] = np.array(values, dtype=np.float64)
+
+    order = np.argsort(columns['time'], kind='stable')
+    return {field: values[order] for field, values in columns.items()}
+
+def concat_columns(parts: List[Dict[str, np.ndarray]]) -> Dict[str, np.ndarray]:
+    """Join column sets of consecutive time ranges (NaN where a part lacks a field)."""
+    if not parts:
+        return rows_to_columns([])
+    fields = dict.fromkeys(field for part in parts for field in part)
+    return {
+        field: np.concatenate([part.get(field, np.full(len(part['time']), np.nan)) for part in parts])
+        for field in fields
+    }
+
+def epoch_length(start_time: float, end_time: float) -> int:
+    duration = max(float(end_time) - float(start_time), 0.0)
+    multiple = max(1, math.ceil(duration / (MAX_EPOCHS * EPOCH_SECONDS)))
+    return EPOCH_SECONDS * multiple
+
+def _round(values: np.ndarray, digits: int = 2) -> List[Optional[float]]:
+    rounded = np.round(values, digits)
+    return [None if math.isnan(value) else value for value in rounded.tolist()]
+
+def _epoch_mean_std(epoch: np.ndarray, values: np.ndarray, epochs: int) -> Dict[str, List[Optional[float]]]:
+    valid = ~np.isnan(values)
+    counts = np.bincount(epoch[valid], minlength=epochs).astype(np.float64)
+    sums = np.bincount(epoch[valid], weights=values[valid], minlength=epochs)
+    squares = np.bincount(epoch[valid], weights=values[valid] ** 2, minlength=epochs)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        mean = sums / counts
+        std = np.sqrt(np.maximum(squares / counts - mean ** 2, 0.0))
+    return {'mean': _round(mean), 'std': _round(std)}
+
+def _movement_counts(epoch: np.ndarray, columns: Dict[str, np.ndarray], epochs: int) -> Optional[List[int]]:
+    for fields in ACCELEROMETER_FIELDS:
+        if all(field in columns for field in fields):
+            magnitude = np.sqrt(sum(columns[field] ** 2 for field in fields))
+            moved = np.abs(np.diff(magnitude)) > MOVEMENT_THRESHOLD
+            return np.bincount(epoch[1:][moved], minlength=epochs).tolist()
+    return None
+
+def _heart_rate_variability(epoch: np.ndarray, columns: Dict[str, np.ndarray], epochs: int) -> Optional[Dict[str, Any]]:
+    field = next((field for field in HEART_RATE_FIELDS if field in columns), None)
+    if field is None:
+        return None
+
+    heart_rate = columns[field]
+    valid = heart_rate > 0
+    if valid.sum() < 2:
+        return None
+
+    # Approximate RR intervals (ms) from the heart rate samples
+    rr = 60000.0 / heart_rate[valid]
+    rr_epoch = epoch[valid]
+    successive = np.diff(rr)
+    same_epoch = rr_epoch[1:] == rr_epoch[:-1]
+
+    counts = np.bincount(rr_epoch[1:][same_epoch], minlength=epochs).astype(np.float64)
+    squares = np.bincount(rr_epoch[1:][same_epoch], weights=successive[same_epoch] ** 2, minlength=epochs)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        rmssd = np.sqrt(squares / counts)
+
+    return {
+        'field': field,
+        'rmssd': _round(rmssd, 1),
+        'night_rmssd': round(float(np.sqrt(np.mean(successive ** 2))), 1),
+        'night_sdnn': round(float(np.std(rr)), 1)
+    }
+
+def summarize_sensor_data(columns: Dict[str, Any], start_time: float, end_time: float) -> Dict[str, Any]:
+    """Reduce time-ordered sensor columns to per-epoch summaries."""
+    step = epoch_length(start_time, end_time)
+    epochs = max(1, math.ceil((float(end_time) - float(start_time)) / step))
+    columns = {field: np.asarray(values, dtype=np.float64) for field, values in (columns or {}).items()}
+    if 'time' not in columns:
+        columns = {'time': np.empty(0)}
+
+    times = columns['time']
+    in_range = (times >= float(start_time)) & (times < float(start_time) + epochs * step)
+    columns = {field: values[in_range] for field, values in columns.items()}
+    epoch = ((columns['time'] - float(start_time)) // step).astype(np.int64)
+
+    summary: Dict[str, Any] = {
+        'start_time': float(start_time),
+        'epoch_seconds': step,
+        'epochs': epochs,
+        'samples': int(len(epoch)),
+        'samples_per_epoch': np.bincount(epoch, minlength=epochs).tolist(),
+        'fields': {
+            field: _epoch_mean_std(epoch, values, epochs)
+            for field, values in columns.items() if field != 'time'
+        }
+    }
+
+    movement = _movement_counts(epoch, columns, epochs)
+    if movement is not None:
+        summary['movement_counts'] = movement
+
+    hrv = _heart_rate_variability(epoch, columns, epochs)
+    if hrv is not None:
+        summary['hrv'] = hrv
+
+    return summary
+
+def compact_stages(session_data: Iterable[Dict[str, Any]]) -> List[List[int]]:
+    """Sleep stage intervals as time-ordered [start_time, end_time, stage] rows."""
+    return sorted(
+        [int(record['start_time']), int(record['end_time']), int(record['stage'])]
+        for record in session_data
+        if record.get('start_time') is not None and record.get('end_time') is not None and record.get('stage') is not None
+    )
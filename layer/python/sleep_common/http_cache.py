@@ -0,0 +1,60 @@
+"""ETag / conditional GET support for the session read endpoints.
+
+``cached_response`` serializes a payload once, derives a strong ETag from
+the exact body bytes and answers ``If-None-Match`` with 304 when the client
+already has them. Even a finished session (an analysis was stored for it)
+can still change: newer records trigger a re-analysis and a failed run
+rewrites the score. So finished sessions are only ``private`` (the app, no
+shared caches) for a short ``SESSION_CACHE_MAX_AGE``; anything else is
+``no-cache``, i.e. revalidated with the ETag on every request.
+
+Invocations without request headers (direct invokes, non-proxy integrations)
+keep getting the bare payload.
+"""
+import hashlib
+import os
+from typing import Any, Dict, Optional
+
+from sleep_common.body import get_header
+from sleep_common.runtime import dumps
+
+SESSION_CACHE_MAX_AGE = int(os.environ.get('SESSION_CACHE_MAX_AGE', '60'))
+
+def etag_for(body: str) -> str:
+    return '"' + hashlib.sha256(body.encode('utf-8')).hexdigest()[:32] + '"'
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    """If-None-Match uses weak comparison, so W/ prefixes are ignored."""
+    if not if_none_match:
+        return False
+    candidates = [candidate.strip() for candidate in if_none_match.split(',')]
+    return any(candidate == '*' or candidate.replace('W/', '', 1) == etag for candidate in candidates)
+
+def cache_control(finished: bool) -> str:
+    if finished and SESSION_CACHE_MAX_AGE > 0:
+        return f'private, max-age={SESSION_CACHE_MAX_AGE}'
+    return 'no-cache'
+
+def cached_response(event: Dict[str, Any], payload: Any, finished: bool) -> Any:
+    """200 with ETag and Cache-Control, or 304 if the client's copy is current."""
+    if not isinstance(event, dict) or not event.get('headers'):
+        return payload
+
+    body = dumps(payload)
+    headers = {
+        'ETag': etag_for(body),
+        'Cache-Control': cache_control(finished)
+    }
+    if etag_matches(get_header(event, 'If-None-Match'), headers['ETag']):
+        return {
+            'statusCode': 304,
+            'headers': headers
+        }
+    return {
+        'statusCode': 200,
+        'headers': {
+            'Content-Type': 'application/json',
+            **headers
+        },
+        'body': body
+    }
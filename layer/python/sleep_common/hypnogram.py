@@ -0,0 +1,61 @@
+"""Run-length-encoded hypnograms.
+
+A night of ``{start_time, end_time, stage}`` records becomes three small
+integer columns:
+
+    {"format": "rle-v1", "base_time": 1700000000,
+     "durations": [600, 1800, 90], "stages": [1, 4, 5]}
+
+Run ``i`` starts at ``base_time + sum(durations[:i])`` and lasts
+``durations[i]`` seconds. Records are sorted by time, overlaps clipped,
+adjacent runs of the same stage merged, and gaps between records emitted as
+stage 0 (unknown), so the runs are contiguous.
+"""
+from typing import Any, Dict, Iterable, List, Optional
+
+RLE_FORMAT = 'rle-v1'
+UNKNOWN_STAGE = 0
+
+def sorted_intervals(records: Iterable[Dict[str, Any]], window_start: Optional[int] = None,
+                     window_end: Optional[int] = None) -> List[List[int]]:
+    """Time-ordered, non-overlapping [start, end, stage] rows clipped to the window."""
+    rows = sorted(
+        [int(record['start_time']), int(record['end_time']), int(record['stage'])]
+        for record in records
+        if record.get('start_time') is not None and record.get('end_time') is not None and record.get('stage') is not None
+    )
+    intervals: List[List[int]] = []
+    for start, end, stage in rows:
+        if window_start is not None:
+            start = max(start, window_start)
+        if window_end is not None:
+            end = min(end, window_end)
+        if intervals:
+            # Clip overlaps so no second is counted twice
+            start = max(start, intervals[-1][1])
+        if end > start:
+            intervals.append([start, end, stage])
+    return intervals
+
+def encode_hypnogram(records: Iterable[Dict[str, Any]], window_start: Optional[int] = None,
+                     window_end: Optional[int] = None) -> Dict[str, Any]:
+    intervals = sorted_intervals(records, window_start, window_end)
+    durations: List[int] = []
+    stages: List[int] = []
+    previous_end = intervals[0][0] if intervals else None
+    for start, end, stage in intervals:
+        if start > previous_end:
+            durations.append(start - previous_end)
+            stages.append(UNKNOWN_STAGE)
+        if stages and stages[-1] == stage:
+            durations[-1] += end - start
+        else:
+            durations.append(end - start)
+            stages.append(stage)
+        previous_end = end
+    return {
+        'format': RLE_FORMAT,
+        'base_time': intervals[0][0] if intervals else None,
+        'durations': durations,
+        'stages': stages
+    }
@@ -0,0 +1,95 @@
+"""Structured, sampled and size-bounded logging.
+
+Handlers log one JSON line per event with a few cheap fields (method, path,
+query parameters, body size) instead of dumping the whole event. Full
+payloads are only logged when the payload level is enabled and the call is
+sampled, and are trimmed to a byte budget before being encoded, so a large
+upload is never serialized in full just to be logged.
+
+Configuration:
+
+- ``LOG_PAYLOAD_LEVEL``: level payloads are logged at (default ``DEBUG``)
+- ``LOG_PAYLOAD_SAMPLE_RATE``: fraction of calls that log payloads (default 1.0)
+- ``LOG_PAYLOAD_MAX_BYTES``: byte budget per logged payload (default 2048)
+"""
+import logging
+import os
+import random
+from typing import Any, Dict, List
+
+from sleep_common.runtime import dumps
+
+PAYLOAD_LEVEL = logging.getLevelName(os.environ.get('LOG_PAYLOAD_LEVEL', 'DEBUG'))
+PAYLOAD_SAMPLE_RATE = float(os.environ.get('LOG_PAYLOAD_SAMPLE_RATE', '1.0'))
+PAYLOAD_MAX_BYTES = int(os.environ.get('LOG_PAYLOAD_MAX_BYTES', '2048'))
+
+def _shrink(payload: Any, remaining: List[int]) -> Any:
+    # remaining[0] is a rough count of the bytes still left in the budget.
+    # Once it runs out, the rest of every container is replaced by a marker,
+    # so only about a budget's worth of the payload is ever visited.
+    if isinstance(payload, str):
+        text = payload[:max(remaining[0], 0)]
+        remaining[0] -= len(text) + 3
+        return text
+    if isinstance(payload, dict):
+        shrunk = {}
+        for key, value in payload.items():
+            if remaining[0] <= 0:
+                shrunk['...'] = 'truncated'
+                break
+            remaining[0] -= len(str(key)) + 4
+            shrunk[key] = _shrink(value, remaining)
+        return shrunk
+    if isinstance(payload, (list, tuple)):
+        shrunk = []
+        for value in payload:
+            if remaining[0] <= 0:
+                shrunk.append('...truncated')
+                break
+            shrunk.append(_shrink(value, remaining))
+        return shrunk
+    remaining[0] -= 8
+    return payload
+
+def truncated_json(payload: Any, max_bytes: int = PAYLOAD_MAX_BYTES) -> str:
+    """Encode ``payload`` as JSON, cut off at ``max_bytes``.
+
+    Oversized strings and containers are trimmed before encoding, so the cost
+    depends on the budget rather than on the size of the payload.
+    """
+    encoded = dumps(_shrink(payload, [max_bytes])).encode('utf-8')
+    if len(encoded) <= max_bytes:
+        return encoded.decode('utf-8')
+    return encoded[:max_bytes].decode('utf-8', 'ignore') + '...<truncated>'
+
+def log_fields(logger: logging.Logger, level: int, message: str, **fields: Any) -> None:
+    if logger.isEnabledFor(level):
+        logger.log(level, dumps({'message': message, **fields}))
+
+def log_payload(logger: logging.Logger, message: str, payload: Any, **fields: Any) -> None:
+    """Log ``payload`` if the payload level is enabled and this call is sampled."""
+    if not logger.isEnabledFor(PAYLOAD_LEVEL):
+        return
+    if PAYLOAD_SAMPLE_RATE < 1.0 and random.random() >= PAYLOAD_SAMPLE_RATE:
+        return
+    logger.log(PAYLOAD_LEVEL, dumps({'message': message, **fields, 'payload': truncated_json(payload)}))
+
+def event_summary(event: Dict[str, Any]) -> Dict[str, Any]:
+    body = event.get('body')
+    request_context = event.get('requestContext') or {}
+    return {
+        'method': event.get('httpMethod'),
+        'path': event.get('path'),
+        'request_id': request_context.get('requestId'),
+        'query': event.get('queryStringParameters'),
+        'body_bytes': len(body) if isinstance(body, str) else None,
+        'base64': event.get('isBase64Encoded'),
+    }
+
+def log_event(logger: logging.Logger, event: Dict[str, Any], **fields: Any) -> None:
+    """Log a one-line summary of an incoming event, plus the sampled raw event."""
+    if isinstance(event, dict) and ('httpMethod' in event or 'body' in event):
+        log_fields(logger, logging.INFO, 'Received event', **event_summary(event), **fields)
+    else:
+        log_fields(logger, logging.INFO, 'Received event', keys=sorted(event) if isinstance(event, dict) else None, **fields)
+    log_payload(logger, 'Raw event', event)
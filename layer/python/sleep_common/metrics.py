@@ -0,0 +1,150 @@
+"""Per-phase timing and DynamoDB consumed capacity as CloudWatch embedded metrics.
+
+Enabled with ``METRICS_ENABLED=1``. Then:
+
+- ``@instrumented('<handler>')`` on a ``lambda_handler`` times the whole
+  invocation (phase ``total``) and, when it returns, prints one Embedded
+  Metric Format line per phase (``Duration`` values in ms, ``Calls`` and
+  ``ConsumedCapacity``) with ``Handler`` and ``Phase`` dimensions under the
+  ``METRICS_NAMESPACE`` namespace
+- ``with phase('<name>'):`` times a block, e.g. parsing, validation or the
+  OpenAI run
+- every DynamoDB call made through the runtime's clients is timed as phase
+  ``dynamodb.<Operation>`` and requests ``ReturnConsumedCapacity``; the
+  consumed capacity is added to that phase and to the enclosing one
+
+When disabled, ``instrumented`` returns the handler unchanged, ``phase``
+returns a shared no-op context manager and no client hooks are registered.
+"""
+import contextlib
+import functools
+import json
+import os
+import threading
+import time
+from typing import Any, Callable, Dict, List, Optional
+
+METRICS_ENABLED = os.environ.get('METRICS_ENABLED', '0').lower() in ('1', 'true', 'yes')
+METRICS_NAMESPACE = os.environ.get('METRICS_NAMESPACE', 'SleepLambda')
+
+_NOOP = contextlib.nullcontext()
+_lock = threading.Lock()
+# Phase stack per thread, so capacity is attributed to the phase that made the call
+_local = threading.local()
+# Invocation state: handler name, request id and {phase: {'Duration': [...], 'Calls': n, 'ConsumedCapacity': x}}
+_invocation: Dict[str, Any] = {}
+
+def _stack() -> List[str]:
+    stack = getattr(_local, 'stack', None)
+    if stack is None:
+        stack = _local.stack = []
+    return stack
+
+def _record(name: str, duration_ms: Optional[float] = None, capacity: float = 0.0) -> None:
+    with _lock:
+        phases = _invocation.setdefault('phases', {})
+        metrics = phases.setdefault(name, {'Duration': [], 'Calls': 0, 'ConsumedCapacity': 0.0})
+        if duration_ms is not None:
+            metrics['Duration'].append(round(duration_ms, 3))
+            metrics['Calls'] += 1
+        metrics['ConsumedCapacity'] += capacity
+
+@contextlib.contextmanager
+def _timed_phase(name: str):
+    stack = _stack()
+    stack.append(name)
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        _record(name, (time.perf_counter() - start) * 1000)
+        stack.pop()
+
+def phase(name: str) -> Any:
+    """Context manager timing the block as phase ``name`` (a no-op when disabled)."""
+    if not METRICS_ENABLED:
+        return _NOOP
+    return _timed_phase(name)
+
+def emf_lines(handler: str, phases: Dict[str, Dict[str, Any]], request_id: Optional[str] = None) -> List[str]:
+    timestamp = int(time.time() * 1000)
+    lines = []
+    for name, metrics in phases.items():
+        document = {
+            '_aws': {
+                'Timestamp': timestamp,
+                'CloudWatchMetrics': [{
+                    'Namespace': METRICS_NAMESPACE,
+                    'Dimensions': [['Handler', 'Phase']],
+                    'Metrics': [
+                        {'Name': 'Duration', 'Unit': 'Milliseconds'},
+                        {'Name': 'Calls', 'Unit': 'Count'},
+                        {'Name': 'ConsumedCapacity', 'Unit': 'Count'}
+                    ]
+                }]
+            },
+            'Handler': handler,
+            'Phase': name,
+            'Duration': metrics['Duration'],
+            'Calls': metrics['Calls'],
+            'ConsumedCapacity': metrics['ConsumedCapacity']
+        }
+        if request_id:
+            document['RequestId'] = request_id
+        lines.append(json.dumps(document, separators=(',', ':')))
+    return lines
+
+def flush() -> None:
+    """Print the invocation's metrics as EMF lines and reset them."""
+    with _lock:
+        handler = _invocation.get('handler', 'unknown')
+        request_id = _invocation.get('request_id')
+        phases = _invocation.pop('phases', {})
+    # Lambda forwards stdout lines verbatim, which EMF needs (no log prefix)
+    for line in emf_lines(handler, phases, request_id):
+        print(line, flush=True)
+
+def instrumented(handler: str) -> Callable:
+    """Decorate a ``lambda_handler``: time it and flush its metrics on return."""
+    def decorate(function: Callable) -> Callable:
+        if not METRICS_ENABLED:
+            return function
+
+        @functools.wraps(function)
+        def wrapper(event: Any, context: Any) -> Any:
+            with _lock:
+                _invocation.clear()
+                _invocation['handler'] = handler
+                _invocation['request_id'] = getattr(context, 'aws_request_id', None)
+            try:
+                with _timed_phase('total'):
+                    return function(event, context)
+            finally:
+                flush()
+        return wrapper
+    return decorate
+
+def _capacity_units(consumed: Any) -> float:
+    entries = consumed if isinstance(consumed, list) else [consumed]
+    return sum(float(entry.get('CapacityUnits', 0.0)) for entry in entries if isinstance(entry, dict))
+
+def _before_call(params: Dict[str, Any], context: Dict[str, Any], **kwargs: Any) -> None:
+    params.setdefault('ReturnConsumedCapacity', 'TOTAL')
+    context['metrics_start'] = time.perf_counter()
+
+def _after_call(parsed: Dict[str, Any], model: Any, context: Dict[str, Any], **kwargs: Any) -> None:
+    start = context.get('metrics_start')
+    capacity = _capacity_units(parsed.get('ConsumedCapacity')) if isinstance(parsed, dict) else 0.0
+    _record(f'dynamodb.{model.name}', (time.perf_counter() - start) * 1000 if start else None, capacity)
+    stack = _stack()
+    if stack and capacity:
+        _record(stack[-1], capacity=capacity)
+
+def instrument_client(client: Any) -> Any:
+    """Register the timing/capacity hooks on a low-level DynamoDB client."""
+    events = getattr(getattr(client, 'meta', None), 'events', None)
+    if not METRICS_ENABLED or events is None:
+        return client
+    events.register('provide-client-params.dynamodb.*', _before_call)
+    events.register('after-call.dynamodb.*', _after_call)
+    return client
@@ -0,0 +1,120 @@
+"""Generator-based DynamoDB reads.
+
+A single ``query``/``scan`` call returns at most 1 MB and reports the rest
+through ``LastEvaluatedKey``. These helpers follow that key lazily, one page
+at a time, so callers get complete results and can stream items into
+aggregations without holding every page in memory.
+
+``projection`` limits the attributes read to the given names (placeholders
+are generated, so reserved words such as ``time`` are fine). ``page_size``
+sets ``Limit`` per request and ``max_items`` stops after that many items.
+
+``fetch_page`` serves one page of a paginated listing; ``encode_cursor`` and
+``decode_cursor`` turn its ``LastEvaluatedKey`` into an opaque URL-safe token.
+A filtered page makes at most ``max_requests`` requests, so it can come back
+short with a key to continue from.
+"""
+import base64
+import binascii
+import json
+from decimal import Decimal
+from typing import Any, Dict, Iterator, List, Optional, Sequence, Tuple
+
+# Requests one page may make before returning short (a filter can match rarely)
+MAX_PAGE_REQUESTS = 5
+
+def _apply_projection(params: Dict[str, Any], projection: Optional[Sequence[str]]) -> None:
+    if not projection:
+        return
+    names = {f'#p{index}': name for index, name in enumerate(projection)}
+    params['ProjectionExpression'] = ', '.join(names)
+    params['ExpressionAttributeNames'] = {**params.get('ExpressionAttributeNames', {}), **names}
+
+def _paginate(operation: Any, params: Dict[str, Any], page_size: Optional[int], max_items: Optional[int]) -> Iterator[Dict[str, Any]]:
+    yielded = 0
+    while True:
+        if page_size or max_items:
+            params['Limit'] = min(limit for limit in (page_size, max_items and max_items - yielded) if limit)
+        response = operation(**params)
+        for item in response.get('Items', []):
+            yield item
+            yielded += 1
+            if max_items and yielded >= max_items:
+                return
+        last_key = response.get('LastEvaluatedKey')
+        if not last_key:
+            return
+        params['ExclusiveStartKey'] = last_key
+
+def iter_query(table: Any, key_condition: Any, projection: Optional[Sequence[str]] = None,
+               page_size: Optional[int] = None, max_items: Optional[int] = None, **kwargs: Any) -> Iterator[Dict[str, Any]]:
+    """Yield every item matching ``key_condition``, page by page."""
+    params = {'KeyConditionExpression': key_condition, **kwargs}
+    _apply_projection(params, projection)
+    return _paginate(table.query, params, page_size, max_items)
+
+def iter_scan(table: Any, projection: Optional[Sequence[str]] = None,
+              page_size: Optional[int] = None, max_items: Optional[int] = None, **kwargs: Any) -> Iterator[Dict[str, Any]]:
+    """Yield every item of a scan, page by page."""
+    params = dict(kwargs)
+    _apply_projection(params, projection)
+    return _paginate(table.scan, params, page_size, max_items)
+
+def fetch_page(table: Any, limit: int, start_key: Optional[Dict[str, Any]] = None, key_condition: Any = None,
+               projection: Optional[Sequence[str]] = None, max_requests: int = MAX_PAGE_REQUESTS,
+               **kwargs: Any) -> Tuple[List[Dict[str, Any]], Optional[Dict[str, Any]]]:
+    """Return up to ``limit`` items and the key to continue from (None at the end).
+
+    Queries when ``key_condition`` is given, scans otherwise. A filter can
+    leave a request short of ``limit``, so requests continue until the page
+    is full, the table is exhausted or ``max_requests`` were made; a short
+    page still returns its key, so the caller's next page picks up there.
+    """
+    params = dict(kwargs)
+    if key_condition is not None:
+        params['KeyConditionExpression'] = key_condition
+    _apply_projection(params, projection)
+    operation = table.query if key_condition is not None else table.scan
+    items: List[Dict[str, Any]] = []
+    last_key = start_key
+    for _ in range(max(1, max_requests)):
+        if last_key:
+            params['ExclusiveStartKey'] = last_key
+        # Limit caps the items evaluated, so the page never overshoots
+        params['Limit'] = limit - len(items)
+        response = operation(**params)
+        items.extend(response.get('Items', []))
+        last_key = response.get('LastEvaluatedKey')
+        if not last_key or len(items) >= limit:
+            break
+    return items, last_key
+
+def _encode_number(value: Any) -> Dict[str, str]:
+    if isinstance(value, Decimal):
+        # Tagged string, a float would round fractional sensor keys
+        return {'N': str(value)}
+    raise TypeError(f'Object of type {type(value).__name__} is not JSON serializable')
+
+def _decode_number(value: Dict[str, Any]) -> Any:
+    if len(value) == 1 and 'N' in value:
+        return Decimal(value['N'])
+    return value
+
+def encode_cursor(last_key: Optional[Dict[str, Any]]) -> Optional[str]:
+    if not last_key:
+        return None
+    raw = json.dumps(last_key, default=_encode_number, separators=(',', ':'))
+    return base64.urlsafe_b64encode(raw.encode('utf-8')).decode('ascii').rstrip('=')
+
+def decode_cursor(cursor: Optional[str]) -> Optional[Dict[str, Any]]:
+    """Inverse of ``encode_cursor``; raises ValueError for a malformed cursor."""
+    if not cursor:
+        return None
+    try:
+        raw = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4))
+        key = json.loads(raw, object_hook=_decode_number)
+    except (binascii.Error, UnicodeDecodeError, ValueError, ArithmeticError) as e:
+        raise ValueError(f'Invalid cursor: {e}') from e
+    if not isinstance(key, dict):
+        raise ValueError('Invalid cursor')
+    return key
@@ -0,0 +1,47 @@
+"""Token bucket for the OpenAI token-rate budget.
+
+``TokenBucket(rate, capacity)`` refills ``rate`` tokens per second up to
+``capacity``. ``acquire(n, timeout)`` blocks until ``n`` tokens are available
+and returns False instead when that would take longer than ``timeout``
+seconds. The bucket is per container, so split the budget between the
+containers that can run at the same time.
+
+``estimate_tokens`` approximates a prompt's cost before it is sent.
+"""
+import threading
+import time
+from typing import Callable, Optional
+
+# Rough characters per token of the JSON/Korean prompt, errs on the high side
+CHARS_PER_TOKEN = 3
+
+def estimate_tokens(text: str, response_tokens: int = 0) -> int:
+    return len(text) // CHARS_PER_TOKEN + response_tokens
+
+class TokenBucket:
+    def __init__(self, rate: float, capacity: float,
+                 clock: Callable[[], float] = time.monotonic, sleep: Callable[[float], None] = time.sleep):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self._clock = clock
+        self._sleep = sleep
+        self._updated = clock()
+        self._lock = threading.Lock()
+
+    def acquire(self, tokens: float, timeout: Optional[float] = None) -> bool:
+        # A request larger than the bucket would never fit, let it drain the bucket instead
+        tokens = min(tokens, self.capacity)
+        deadline = None if timeout is None else self._clock() + timeout
+        while True:
+            with self._lock:
+                now = self._clock()
+                self.tokens = min(self.capacity, self.tokens + (now - self._updated) * self.rate)
+                self._updated = now
+                if self.tokens >= tokens:
+                    self.tokens -= tokens
+                    return True
+                wait = (tokens - self.tokens) / self.rate
+            if deadline is not None and now + wait > deadline:
+                return False
+            self._sleep(wait)
@@ -0,0 +1,134 @@
+"""Runtime helpers shared by every handler.
+
+- AWS and OpenAI clients are created on first use instead of at import time,
+  so cold starts only pay for the clients a code path actually touches.
+- boto3 resources are not thread-safe: ``get_dynamodb`` / ``get_table`` give
+  every worker thread its own resource (on its own session), the main thread
+  keeps the shared one. Low-level clients are shared by all threads.
+- ``dumps`` is the single JSON encoder. It handles Decimal values returned by
+  DynamoDB and uses orjson when it is installed in the layer.
+- DynamoDB clients get the ``metrics`` timing/capacity hooks when
+  ``METRICS_ENABLED`` is set.
+- ``create_response`` / ``html_response`` build API Gateway responses;
+  ``gzip_response`` compresses large bodies for clients that accept gzip,
+  when ``GZIP_RESPONSES`` is set (see the README for the API Gateway setup).
+"""
+import base64
+import gzip
+import json
+import logging
+import os
+import threading
+from decimal import Decimal
+from typing import Any, Dict, Optional
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+# Off by default: a REST API only decodes the base64 body with binaryMediaTypes
+GZIP_RESPONSES = os.environ.get('GZIP_RESPONSES', '0').lower() in ('1', 'true', 'yes')
+# Bodies smaller than this are sent uncompressed
+GZIP_MIN_BYTES = int(os.environ.get('GZIP_MIN_BYTES', '4096'))
+
+_lock = threading.Lock()
+_clients: Dict[str, Any] = {}
+_tables: Dict[str, Any] = {}
+
+def get_logger() -> logging.Logger:
+    logger = logging.getLogger()
+    logger.setLevel(os.environ.get('LOG_LEVEL', 'INFO'))
+    return logger
+
+def _get_or_create(key: str, factory: Any) -> Any:
+    client = _clients.get(key)
+    if client is None:
+        with _lock:
+            client = _clients.get(key)
+            if client is None:
+                client = _clients[key] = factory()
+    return client
+
+def _thread_key(key: str) -> str:
+    if threading.current_thread() is threading.main_thread():
+        return key
+    return f'{key}@{threading.get_ident()}'
+
+def _new_dynamodb() -> Any:
+    import boto3
+    from sleep_common.metrics import instrument_client
+    resource = boto3.session.Session().resource('dynamodb')
+    instrument_client(resource.meta.client)
+    return resource
+
+def get_dynamodb() -> Any:
+    """The DynamoDB resource of the calling thread."""
+    return _get_or_create(_thread_key('dynamodb'), _new_dynamodb)
+
+def get_table(name: str) -> Any:
+    key = _thread_key(name)
+    table = _tables.get(key)
+    if table is None:
+        table = _tables[key] = get_dynamodb().Table(name)
+    return table
+
+def get_client(service: str) -> Any:
+    def factory():
+        import boto3
+        from sleep_common.metrics import instrument_client
+        client = boto3.client(service)
+        return instrument_client(client) if service == 'dynamodb' else client
+    return _get_or_create(f'client:{service}', factory)
+
+def get_openai_client() -> Any:
+    def factory():
+        # openai is heavy to import, only load it on paths that call the API
+        from openai import OpenAI
+        return OpenAI(api_key=os.environ['OPENAI_API_KEY'])
+    return _get_or_create('openai', factory)
+
+def decimal_default(obj: Any) -> Any:
+    if isinstance(obj, Decimal):
+        return float(obj)
+    raise TypeError(f'Object of type {type(obj).__name__} is not JSON serializable')
+
+def dumps(obj: Any) -> str:
+    if orjson is not None:
+        try:
+            return orjson.dumps(obj, default=decimal_default, option=orjson.OPT_NON_STR_KEYS).decode('utf-8')
+        except orjson.JSONEncodeError:
+            pass  # e.g. integers beyond 64 bits, let the stdlib encoder handle them
+    return json.dumps(obj, default=decimal_default, ensure_ascii=False)
+
+def create_response(status_code: int, body: Any, headers: Optional[Dict[str, str]] = None) -> Dict[str, Any]:
+    response: Dict[str, Any] = {
+        'statusCode': status_code,
+        'body': dumps(body)
+    }
+    if headers:
+        response['headers'] = headers
+    return response
+
+def html_response(status_code: int, body: str, headers: Optional[Dict[str, str]] = None) -> Dict[str, Any]:
+    return {
+        'statusCode': status_code,
+        'headers': {
+            'Content-Type': 'text/html; charset=UTF-8',
+            **(headers or {})
+        },
+        'body': body
+    }
+
+def gzip_response(response: Dict[str, Any], accept_encoding: Optional[str], min_bytes: int = GZIP_MIN_BYTES) -> Dict[str, Any]:
+    """Gzip the body of ``response`` when the client accepts it and it is large enough."""
+    body = response.get('body')
+    if not GZIP_RESPONSES or not isinstance(body, str) or 'gzip' not in (accept_encoding or '').lower():
+        return response
+    encoded = body.encode('utf-8')
+    if len(encoded) < min_bytes:
+        return response
+    response['body'] = base64.b64encode(gzip.compress(encoded, compresslevel=6)).decode('ascii')
+    response['isBase64Encoded'] = True
+    response['headers'] = {**response.get('headers', {}), 'Content-Encoding': 'gzip', 'Vary': 'Accept-Encoding'}
+    return response
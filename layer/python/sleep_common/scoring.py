@@ -0,0 +1,142 @@
+"""Local, deterministic sleep scoring from sleep stage intervals.
+
+Stage codes follow Android Health Connect's SleepSessionRecord:
+
+    0 unknown, 1 awake, 2 sleeping, 3 out of bed, 4 light, 5 deep, 6 REM,
+    7 awake in bed
+
+``sleep_metrics`` computes standard sleep metrics with vectorized interval
+arithmetic. ``score_sleep`` turns them into a 0-100 score: a weighted sum of
+how close each metric is to commonly cited healthy-adult targets. It runs
+in well under a millisecond for a night of records, so it can serve a score
+right after upload and act as a fallback when the assistant is unavailable.
+"""
+from typing import Any, Dict, Iterable
+
+import numpy as np
+
+STAGE_NAMES = {
+    0: 'unknown',
+    1: 'awake',
+    2: 'sleeping',
+    3: 'out_of_bed',
+    4: 'light',
+    5: 'deep',
+    6: 'rem',
+    7: 'awake_in_bed',
+}
+AWAKE_STAGES = [1, 3, 7]
+SLEEP_STAGES = [2, 4, 5, 6]
+
+# Component weights of the score, they sum to 1
+SCORE_WEIGHTS = {
+    'duration': 0.30,
+    'efficiency': 0.25,
+    'latency': 0.10,
+    'waso': 0.15,
+    'deep': 0.10,
+    'rem': 0.10,
+}
+
+def _intervals(records: Iterable[Dict[str, Any]]) -> np.ndarray:
+    rows = [
+        (float(record['start_time']), float(record['end_time']), int(record['stage']))
+        for record in records
+        if record.get('start_time') is not None and record.get('end_time') is not None and record.get('stage') is not None
+    ]
+    # Uploads accept any integer stage, count codes outside Health Connect's as unknown
+    rows = [(start, end, stage if stage in STAGE_NAMES else 0) for start, end, stage in rows]
+    intervals = np.array(rows, dtype=np.float64).reshape(-1, 3)
+    intervals = intervals[np.argsort(intervals[:, 0], kind='stable')]
+    if len(intervals):
+        # Clip overlaps so no second is counted twice
+        next_start = np.append(intervals[1:, 0], np.inf)
+        intervals[:, 1] = np.minimum(intervals[:, 1], next_start)
+        intervals = intervals[intervals[:, 1] > intervals[:, 0]]
+    return intervals
+
+def sleep_metrics(records: Iterable[Dict[str, Any]]) -> Dict[str, Any]:
+    """Compute sleep metrics (durations in minutes) from stage interval records."""
+    intervals = _intervals(records)
+    if not len(intervals):
+        return {}
+
+    starts, ends, stages = intervals[:, 0], intervals[:, 1], intervals[:, 2].astype(np.int64)
+    durations = ends - starts
+    asleep = np.isin(stages, SLEEP_STAGES)
+    awake = np.isin(stages, AWAKE_STAGES)
+
+    in_bed_start, in_bed_end = starts[0], ends[-1]
+    time_in_bed = in_bed_end - in_bed_start
+    total_sleep = durations[asleep].sum()
+
+    if asleep.any():
+        onset = starts[asleep][0]
+        final_wake = ends[asleep][-1]
+        latency = onset - in_bed_start
+        after_onset = awake & (starts >= onset) & (ends <= final_wake)
+        waso = durations[after_onset].sum()
+    else:
+        latency = time_in_bed
+        waso = 0.0
+
+    # Transitions between distinct consecutive stages
+    transitions = int(np.count_nonzero(np.diff(stages)))
+
+    stage_minutes = np.bincount(stages, weights=durations, minlength=len(STAGE_NAMES)) / 60.0
+    proportions = {
+        STAGE_NAMES[stage]: round(float(stage_minutes[stage] * 60.0 / total_sleep), 4) if total_sleep else 0.0
+        for stage in SLEEP_STAGES
+    }
+
+    return {
+        'time_in_bed_minutes': round(float(time_in_bed) / 60.0, 1),
+        'total_sleep_minutes': round(float(total_sleep) / 60.0, 1),
+        'sleep_efficiency': round(float(total_sleep / time_in_bed), 4) if time_in_bed else 0.0,
+        'sleep_onset_latency_minutes': round(float(latency) / 60.0, 1),
+        'waso_minutes': round(float(waso) / 60.0, 1),
+        'stage_minutes': {
+            name: round(float(stage_minutes[stage]), 1) for stage, name in STAGE_NAMES.items() if stage_minutes[stage]
+        },
+        'stage_proportions': proportions,
+        'stage_transitions': transitions,
+    }
+
+def _ramp(value: float, zero_at: float, full_at: float) -> float:
+    """Linear 0..1 ramp from zero_at to full_at (either direction)."""
+    return float(np.clip((value - zero_at) / (full_at - zero_at), 0.0, 1.0))
+
+def score_sleep(records: Iterable[Dict[str, Any]]) -> Dict[str, Any]:
+    """Return ``{'score': 0-100 or None, 'metrics': {...}}`` for the stage records.
+
+    The score is None when no record has a known stage and 0 when none is
+    asleep; the components (e.g. no WASO) would otherwise still add up.
+    """
+    metrics = sleep_metrics(records)
+    if not metrics or set(metrics['stage_minutes']) <= {'unknown'}:
+        return {'score': None, 'metrics': metrics}
+    if not metrics['total_sleep_minutes']:
+        return {'score': 0, 'metrics': metrics}
+
+    hours = metrics['total_sleep_minutes'] / 60.0
+    duration = _ramp(hours, 4.0, 7.0) if hours < 7.0 else _ramp(hours, 12.0, 9.0)
+    components = {
+        'duration': duration,
+        'efficiency': _ramp(metrics['sleep_efficiency'], 0.65, 0.90),
+        'latency': _ramp(metrics['sleep_onset_latency_minutes'], 60.0, 15.0),
+        'waso': _ramp(metrics['waso_minutes'], 90.0, 20.0),
+        'deep': _ramp(metrics['stage_proportions']['deep'], 0.0, 0.13),
+        'rem': _ramp(metrics['stage_proportions']['rem'], 0.0, 0.20),
+    }
+
+    weights = dict(SCORE_WEIGHTS)
+    if not metrics['stage_proportions']['deep'] and not metrics['stage_proportions']['rem'] \
+            and not metrics['stage_proportions']['light']:
+        # Devices that only report asleep/awake carry no architecture
+        # information, spread those weights over the other components
+        extra = weights.pop('deep') + weights.pop('rem')
+        total = sum(weights.values())
+        weights = {name: weight + extra * weight / total for name, weight in weights.items()}
+
+    score = sum(weights[name] * components[name] for name in weights)
+    return {'score': int(round(score * 100)), 'metrics': metrics}
@@ -0,0 +1,233 @@
+"""Compact chunked storage format for sensor samples.
+
+Instead of one ``sensor_data`` item per sample, the samples of one client are
+packed into ``sensor_data_chunks`` items that each cover at most
+CHUNK_SECONDS. Every sensor field becomes one compressed binary column:
+
+- integer columns are delta-encoded as int64
+- float columns are XOR-ed with the bit pattern of the previous value
+  (lossless; slowly changing signals turn into mostly zero bytes)
+
+Both are zlib-compressed. A chunk's sort key ``time`` is the time of its first
+sample, so a range query only has to widen its lower bound by CHUNK_SECONDS.
+
+Samples uploaded one at a time stay one ``sensor_data`` item each (a
+one-sample chunk would pack nothing), and reads merge them into the chunk
+columns.
+"""
+import sys
+import zlib
+from array import array
+from decimal import Decimal
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+try:
+    import numpy as np
+except ImportError:  # numpy is optional, decoding falls back to the array module
+    np = None
+
+CHUNK_TABLE_NAME = 'sensor_data_chunks'
+CHUNK_SECONDS = 60
+
+INT_COLUMN = b'i'
+FLOAT_COLUMN = b'f'
+
+def _to_bytes(values: array) -> bytes:
+    # Columns are always stored little-endian
+    if sys.byteorder == 'big':
+        values = array(values.typecode, values)
+        values.byteswap()
+    return values.tobytes()
+
+def _from_bytes(typecode: str, raw: bytes) -> array:
+    values = array(typecode)
+    values.frombytes(raw)
+    if sys.byteorder == 'big':
+        values.byteswap()
+    return values
+
+def _is_int(value: Any) -> bool:
+    return isinstance(value, int) and not isinstance(value, bool)
+
+def encode_column(values: List[Any]) -> bytes:
+    """Encode a list of numbers (None for missing) into a compressed column.
+
+    Integers whose deltas do not fit int64 are stored as a float column.
+    """
+    if all(_is_int(value) for value in values):
+        deltas = array('q')
+        previous = 0
+        try:
+            for value in values:
+                deltas.append(value - previous)
+                previous = value
+            return INT_COLUMN + zlib.compress(_to_bytes(deltas))
+        except OverflowError:
+            pass
+
+    floats = array('d', (float('nan') if value is None else float(value) for value in values))
+    bits = _from_bytes('Q', _to_bytes(floats))
+    encoded = array('Q')
+    previous = 0
+    for word in bits:
+        encoded.append(word ^ previous)
+        previous = word
+    return FLOAT_COLUMN + zlib.compress(_to_bytes(encoded))
+
+def decode_column(blob: Any) -> Any:
+    """Decode a column into float64 values (a NumPy array when available)."""
+    blob = bytes(getattr(blob, 'value', blob))  # boto3 returns Binary wrappers
+    kind, raw = blob[:1], zlib.decompress(blob[1:])
+
+    if np is not None:
+        if kind == INT_COLUMN:
+            return np.cumsum(np.frombuffer(raw, dtype='<i8')).astype(np.float64)
+        return np.bitwise_xor.accumulate(np.frombuffer(raw, dtype='<u8')).view('<f8').astype(np.float64)
+
+    if kind == INT_COLUMN:
+        values = array('d')
+        total = 0
+        for delta in _from_bytes('q', raw):
+            total += delta
+            values.append(float(total))
+        return values
+
+    words = array('Q')
+    previous = 0
+    for word in _from_bytes('Q', raw):
+        previous ^= word
+        words.append(previous)
+    return _from_bytes('d', _to_bytes(words))
+
+def fits_column(data: Dict[str, Any]) -> bool:
+    """False when an integer value of the sample is beyond float64's range."""
+    for value in data.values():
+        if isinstance(value, Decimal) and value.is_finite() and value == value.to_integral_value():
+            value = int(value)
+        if _is_int(value):
+            try:
+                float(value)
+            except OverflowError:
+                return False
+    return True
+
+def _to_millis(value: Any) -> int:
+    return int((Decimal(str(value)) * 1000).to_integral_value())
+
+def encode_chunks(client_uuid: str, samples: Iterable[Tuple[Any, Dict[str, Any]]]) -> List[Dict[str, Any]]:
+    """Pack (time_in_seconds, data) samples into chunk items.
+
+    Only numeric fields are stored; other values are dropped. Samples must
+    pass ``fits_column``.
+    """
+    buckets: Dict[int, List[Tuple[int, Dict[str, Any]]]] = {}
+    for sample_time, data in samples:
+        millis = _to_millis(sample_time)
+        buckets.setdefault(millis // (CHUNK_SECONDS * 1000), []).append((millis, data))
+
+    items = []
+    for bucket in sorted(buckets):
+        rows = sorted(buckets[bucket], key=lambda row: row[0])
+        first = rows[0][0]
+
+        fields: Dict[str, None] = {}
+        for _, data in rows:
+            for key, value in data.items():
+                if isinstance(value, (int, float, Decimal)) and not isinstance(value, bool):
+                    fields[key] = None
+
+        columns = {}
+        for field in fields:
+            values = []
+            for _, data in rows:
+                value = data.get(field)
+                if isinstance(value, Decimal):
+                    value = int(value) if value == value.to_integral_value() else float(value)
+                values.append(value if isinstance(value, (int, float)) and not isinstance(value, bool) else None)
+            columns[field] = encode_column(values)
+
+        items.append({
+            'client_uuid': client_uuid,
+            'time': Decimal(first) / 1000,
+            'count': len(rows),
+            'offsets': encode_column([millis - first for millis, _ in rows]),
+            'columns': columns
+        })
+    return items
+
+def decode_chunk(item: Dict[str, Any]) -> Dict[str, Any]:
+    """Decode one chunk item into {'time': seconds, field: values} columns."""
+    base = float(item['time'])
+    offsets = decode_column(item['offsets'])
+    if np is not None:
+        times = base + offsets / 1000.0
+    else:
+        times = array('d', (base + offset / 1000.0 for offset in offsets))
+
+    columns = {'time': times}
+    for field, blob in item.get('columns', {}).items():
+        columns[field] = decode_column(blob)
+    return columns
+
+def decode_chunks(items: Iterable[Dict[str, Any]], start: Optional[float] = None, end: Optional[float] = None,
+                  samples: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+    """Decode and merge chunk items into time-ordered columns.
+
+    Chunks written by overlapping or retried requests can cover the same
+    minute, so the merged samples are sorted by time and a millisecond that
+    appears more than once keeps its first sample (the same key is the same
+    sample). Fields missing from a chunk are filled with NaN. Samples outside
+    [start, end] are dropped.
+
+    ``samples`` are columns of samples stored outside the chunks (single
+    uploads in ``sensor_data``); they are merged like one more chunk.
+    """
+    chunks = [decode_chunk(item) for item in sorted(items, key=lambda item: item['time'])]
+    if samples is not None and len(samples['time']):
+        chunks.append(samples)
+
+    fields: Dict[str, None] = {'time': None}
+    for chunk in chunks:
+        for field in chunk:
+            fields[field] = None
+
+    if np is not None:
+        merged = {
+            field: np.concatenate([
+                chunk.get(field, np.full(len(chunk['time']), np.nan)) for chunk in chunks
+            ]) if chunks else np.empty(0)
+            for field in fields
+        }
+        mask = np.ones(len(merged['time']), dtype=bool)
+        if start is not None:
+            mask &= merged['time'] >= float(start)
+        if end is not None:
+            mask &= merged['time'] <= float(end)
+        merged = {field: values[mask] for field, values in merged.items()}
+
+        millis = np.round(merged['time'] * 1000)
+        order = np.argsort(millis, kind='stable')
+        keep = np.ones(len(order), dtype=bool)
+        keep[1:] = millis[order][1:] != millis[order][:-1]
+        return {field: values[order[keep]] for field, values in merged.items()}
+
+    rows = []
+    for chunk in chunks:
+        for index, sample_time in enumerate(chunk['time']):
+            if start is not None and sample_time < float(start):
+                continue
+            if end is not None and sample_time > float(end):
+                continue
+            rows.append((round(sample_time * 1000), chunk, index))
+    rows.sort(key=lambda row: row[0])
+
+    merged = {field: array('d') for field in fields}
+    previous = None
+    for millis, chunk, index in rows:
+        if millis == previous:
+            continue
+        previous = millis
+        for field in fields:
+            column = chunk.get(field)
+            merged[field].append(column[index] if column is not None else float('nan'))
+    return merged
@@ -0,0 +1,62 @@
+"""Sort keys for high-rate sensor samples.
+
+The ``time`` sort key of ``sensor_data`` stays a number in epoch seconds so
+existing range queries keep working, but carries the device timestamp at
+millisecond resolution plus a per-millisecond sequence number in its
+fractional digits::
+
+    time = timestamp_ms / 10**3 + seq / 10**9
+
+The same (timestamp_ms, seq) always maps to the same key, which makes
+re-sent samples overwrite themselves instead of piling up as new data.
+
+``time_slices`` splits a time range into contiguous key ranges that can be
+queried concurrently with ``BETWEEN``.
+"""
+from decimal import Decimal
+from typing import Any, Dict, List, Tuple
+
+MAX_SEQUENCE = 10 ** 6
+
+_MILLIS = Decimal(10 ** 3)
+_SEQUENCE_SCALE = Decimal(10 ** 9)
+_LAST_KEY_IN_SECOND = Decimal(1) - 1 / _SEQUENCE_SCALE
+
+def sensor_time_key(timestamp_ms: int, seq: int = 0) -> Decimal:
+    if not 0 <= seq < MAX_SEQUENCE:
+        raise ValueError(f'seq must be in [0, {MAX_SEQUENCE})')
+    return Decimal(timestamp_ms) / _MILLIS + Decimal(seq) / _SEQUENCE_SCALE
+
+def sample_time_key(sample: Dict[str, Any]) -> Decimal:
+    """Build the sort key of a sample.
+
+    Samples carry ``timestamp_ms`` and an optional ``seq``; older clients
+    send ``time`` in whole epoch seconds.
+    """
+    if 'timestamp_ms' in sample:
+        timestamp_ms = sample['timestamp_ms']
+        seq = sample.get('seq', 0)
+        if isinstance(timestamp_ms, bool) or isinstance(seq, bool):
+            raise ValueError('timestamp_ms and seq must be integers')
+        if int(timestamp_ms) != timestamp_ms or int(seq) != seq:
+            raise ValueError('timestamp_ms and seq must be integers')
+        return sensor_time_key(int(timestamp_ms), int(seq))
+    return Decimal(int(sample['time']))
+
+def range_end_key(end_time: Any) -> Decimal:
+    """Inclusive upper bound that covers every sample within second ``end_time``."""
+    return Decimal(int(end_time)) + _LAST_KEY_IN_SECOND
+
+def time_slices(start_time: Any, end_time: Any, slices: int) -> List[Tuple[Decimal, Decimal]]:
+    """Split seconds [start_time, end_time] into up to ``slices`` inclusive key ranges.
+
+    Slices meet at whole seconds and never overlap, so every sample key in
+    the range falls into exactly one of them.
+    """
+    start, end = int(start_time), int(end_time)
+    seconds = max(end - start + 1, 1)
+    slices = max(1, min(slices, seconds))
+    bounds = [start + seconds * index // slices for index in range(slices + 1)]
+    lows = [Decimal(str(start_time))] + [Decimal(bound) for bound in bounds[1:-1]]
+    highs = [range_end_key(bound - 1) for bound in bounds[1:-1]] + [range_end_key(end_time)]
+    return list(zip(lows, highs))
@@ -0,0 +1,165 @@
+"""Batched, concurrent reads of everything stored for a set of sessions.
+
+``read_sessions`` looks up the ``sleep_analysis`` items of up to
+MAX_SESSIONS sessions with ``BatchGetItem`` while the ``sleep_records`` of
+each session are queried in parallel threads. Only the attributes behind
+the requested fields are projected.
+
+The work runs on the low-level DynamoDB client, which unlike boto3
+resources is safe to share between threads.
+
+Fields:
+
+- ``score``: stored score and its source, or a local score computed from the
+  stage records while no analysis is stored
+- ``analysis``: stored analysis text
+- ``stages``: ``[{start_time, end_time, stage}]`` records
+
+With ``score`` or ``analysis``, each result also says whether a completed
+analysis is stored (``analyzed``), i.e. whether the values are final. Final
+results and unknown sessions are kept in ``session_cache`` and served from
+there while the container is warm.
+"""
+import os
+import random
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, Iterable, List, Optional, Set
+
+from boto3.dynamodb.types import TypeDeserializer
+
+from sleep_common.cache import MISSING, session_cache
+from sleep_common.query import iter_query
+from sleep_common.runtime import get_client
+
+ANALYSIS_TABLE_NAME = 'sleep_analysis'
+SLEEP_RECORDS_TABLE_NAME = 'sleep_records'
+
+SESSION_FIELDS = ('score', 'analysis', 'stages')
+# BatchGetItem reads at most 100 keys per request
+MAX_SESSIONS = 100
+READ_WORKERS = int(os.environ.get('SESSION_READ_WORKERS', '8'))
+
+MAX_RETRIES = 5
+BASE_BACKOFF_SECONDS = 0.05
+MAX_BACKOFF_SECONDS = 1.0
+
+# Stored analysis attributes needed for each field
+ANALYSIS_ATTRIBUTES = {
+    'score': ['score', 'score_source'],
+    'analysis': ['analysis'],
+}
+STAGE_ATTRIBUTES = ['start_time', 'end_time', 'stage']
+
+_deserializer = TypeDeserializer()
+
+def _deserialize(item: Dict[str, Any]) -> Dict[str, Any]:
+    return {key: _deserializer.deserialize(value) for key, value in item.items()}
+
+def batch_get_analyses(session_uuids: List[str], attributes: Iterable[str]) -> Dict[str, Dict[str, Any]]:
+    """``sleep_analysis`` items by session, retrying unprocessed keys with backoff."""
+    names = {f'#a{index}': name for index, name in enumerate(['session_uuid', *attributes])}
+    request = {
+        'Keys': [{'session_uuid': {'S': session_uuid}} for session_uuid in session_uuids],
+        'ProjectionExpression': ', '.join(names),
+        'ExpressionAttributeNames': names
+    }
+    analyses: Dict[str, Dict[str, Any]] = {}
+    attempt = 0
+    while request['Keys']:
+        response = get_client('dynamodb').batch_get_item(RequestItems={ANALYSIS_TABLE_NAME: request})
+        for item in response.get('Responses', {}).get(ANALYSIS_TABLE_NAME, []):
+            item = _deserialize(item)
+            analyses[item['session_uuid']] = item
+        request['Keys'] = response.get('UnprocessedKeys', {}).get(ANALYSIS_TABLE_NAME, {}).get('Keys', [])
+        if not request['Keys']:
+            break
+        if attempt >= MAX_RETRIES:
+            raise RuntimeError(f"{len(request['Keys'])} sessions left unprocessed by BatchGetItem")
+        time.sleep(random.uniform(0, min(MAX_BACKOFF_SECONDS, BASE_BACKOFF_SECONDS * (2 ** attempt))))
+        attempt += 1
+    return analyses
+
+def query_stages(session_uuid: str) -> List[Dict[str, Any]]:
+    names = {'#session': 'session_uuid'}
+    items = iter_query(
+        get_client('dynamodb'),
+        '#session = :session',
+        projection=STAGE_ATTRIBUTES,
+        TableName=SLEEP_RECORDS_TABLE_NAME,
+        ExpressionAttributeNames=names,
+        ExpressionAttributeValues={':session': {'S': session_uuid}}
+    )
+    return [_deserialize(item) for item in items]
+
+def _session_result(analysis: Optional[Dict[str, Any]], stages: Optional[List[Dict[str, Any]]],
+                    fields: Iterable[str]) -> Optional[Dict[str, Any]]:
+    result: Dict[str, Any] = {}
+    if 'score' in fields:
+        if analysis and analysis.get('score') is not None:
+            result['score'] = analysis['score']
+            result['source'] = analysis.get('score_source', 'gpt')
+        elif stages:
+            # numpy is only needed when a session has no stored score yet
+            from sleep_common.scoring import score_sleep
+            result['score'] = score_sleep(stages)['score']
+            result['source'] = 'local'
+        else:
+            result['score'] = None
+    if 'analysis' in fields:
+        result['analysis'] = analysis.get('analysis') if analysis else None
+    if 'stages' in fields:
+        result['stages'] = stages or []
+    if 'score' in fields or 'analysis' in fields:
+        result['analyzed'] = bool(analysis and analysis.get('input_hash'))
+    if not analysis and not stages:
+        return None
+    return result
+
+def _fetch_sessions(session_uuids: List[str], fields: Set[str]) -> Dict[str, Optional[Dict[str, Any]]]:
+    attributes = [name for field in fields for name in ANALYSIS_ATTRIBUTES.get(field, [])]
+    if attributes:
+        attributes.append('input_hash')
+    stage_sessions = session_uuids if 'stages' in fields else []
+
+    with ThreadPoolExecutor(max_workers=max(1, min(READ_WORKERS, len(session_uuids) + 1))) as executor:
+        analyses_future = executor.submit(batch_get_analyses, session_uuids, attributes) if attributes else None
+        stage_futures = {session_uuid: executor.submit(query_stages, session_uuid) for session_uuid in stage_sessions}
+        analyses = analyses_future.result() if analyses_future else {}
+
+        if 'score' in fields and 'stages' not in fields:
+            # Stages for the local score fallback, only of sessions without a stored score
+            stage_futures.update({
+                session_uuid: executor.submit(query_stages, session_uuid)
+                for session_uuid in session_uuids
+                if analyses.get(session_uuid, {}).get('score') is None
+            })
+        stages = {session_uuid: future.result() for session_uuid, future in stage_futures.items()}
+
+    return {
+        session_uuid: _session_result(analyses.get(session_uuid), stages.get(session_uuid), fields)
+        for session_uuid in session_uuids
+    }
+
+def read_sessions(session_uuids: List[str], fields: Iterable[str]) -> Dict[str, Optional[Dict[str, Any]]]:
+    """Requested fields per session; None for sessions without any stored data."""
+    fields = set(fields)
+    session_uuids = list(dict.fromkeys(session_uuids))
+    if len(session_uuids) > MAX_SESSIONS:
+        raise ValueError(f'At most {MAX_SESSIONS} sessions per request')
+
+    field_key = tuple(sorted(fields))
+    results = {}
+    for session_uuid in session_uuids:
+        cached = session_cache.get(('session', session_uuid, field_key))
+        if cached is not MISSING:
+            results[session_uuid] = cached
+    pending = [session_uuid for session_uuid in session_uuids if session_uuid not in results]
+
+    if pending:
+        for session_uuid, result in _fetch_sessions(pending, fields).items():
+            results[session_uuid] = result
+            if result is None or result.get('analyzed'):
+                session_cache.set(('session', session_uuid, field_key), result)
+
+    return {session_uuid: results[session_uuid] for session_uuid in session_uuids}
@@ -1,39 +1,172 @@
-import json
-import boto3
-from datetime import datetime
+import os
+import time
+import random
 from decimal import Decimal
+from botocore.exceptions import ClientError
+from sleep_common.body import BodyDecodeError, decode_body
+from sleep_common.logs import log_event
+from sleep_common.metrics import instrumented, phase
+from sleep_common.runtime import dumps, get_dynamodb, get_logger, get_table
+from sleep_common.sensor_chunks import CHUNK_TABLE_NAME, encode_chunks, fits_column
+from sleep_common.sensor_keys import sample_time_key, sensor_time_key
 
-dynamodb = boto3.resource('dynamodb')
-table = dynamodb.Table('sensor_data')
+TABLE_NAME = 'sensor_data'
 
-def lambda_handler(event, context):
-    # 로그 출력
-    print("Received event: " + json.dumps(event))
-    
-    # 데이터 추출
-    client_uuid = event['client']
-    data = event['data']
-    
-    # 현재 시간 (ISO 8601 형식)
-    received_time = int(datetime.utcnow().timestamp())
-    
+# 'items': 샘플당 한 항목, 'chunked': 클라이언트별 분 단위 압축 청크
+STORAGE_MODE = os.environ.get('SENSOR_STORAGE_MODE', 'items')
+
+# BatchWriteItem은 요청당 최대 25개 항목
+BATCH_SIZE = 25
+MAX_RETRIES = 5
+BASE_BACKOFF_SECONDS = 0.05
+MAX_BACKOFF_SECONDS = 2.0
+
+logger = get_logger()
+
+def build_item(client_uuid, sample_time, data):
     # 아이템 생성
-    item={
-            'client_uuid': client_uuid,
-            'time': received_time
-        }
-    
+    item = {
+        'client_uuid': client_uuid,
+        'time': sample_time
+    }
+
     # 데이터의 모든 키-값 쌍을 처리하여 아이템에 추가
     for key, value in data.items():
         if isinstance(value, (int, float, Decimal)):
             item[key] = Decimal(str(value))
         else:
             item[key] = value
-    
-    # DynamoDB에 데이터 저장
-    table.put_item(Item=item)
-    
+    return item
+
+def batch_write_items(table_name, items):
+    """25개 단위로 BatchWriteItem을 호출하고 처리되지 않은 항목은 백오프 후 재시도한다.
+
+    끝내 저장하지 못한 항목 목록을 반환한다.
+    """
+    failed = []
+    for start in range(0, len(items), BATCH_SIZE):
+        requests = [{'PutRequest': {'Item': item}} for item in items[start:start + BATCH_SIZE]]
+        attempt = 0
+        while requests:
+            try:
+                response = get_dynamodb().batch_write_item(RequestItems={table_name: requests})
+            except ClientError as e:
+                logger.error(f"Batch write error: {str(e)}")
+                failed.extend(request['PutRequest']['Item'] for request in requests)
+                break
+
+            requests = response.get('UnprocessedItems', {}).get(table_name, [])
+            if not requests:
+                break
+            if attempt >= MAX_RETRIES:
+                failed.extend(request['PutRequest']['Item'] for request in requests)
+                break
+
+            # 지수 백오프 (full jitter)
+            time.sleep(random.uniform(0, min(MAX_BACKOFF_SECONDS, BASE_BACKOFF_SECONDS * (2 ** attempt))))
+            attempt += 1
+    return failed
+
+def error_response(status_code, message):
+    return {
+        'statusCode': status_code,
+        'body': dumps(message)
+    }
+
+def handle_batch(client_uuid, samples):
+    samples_by_time = {}
+    rejected = 0
+
+    with phase('validate'):
+        for sample in samples:
+            if not isinstance(sample, dict) or not isinstance(sample.get('data'), dict):
+                rejected += 1
+                continue
+            try:
+                # 기기 타임스탬프(ms) + 시퀀스 번호로 키 생성
+                sample_time = sample_time_key(sample)
+            except (KeyError, TypeError, ValueError):
+                rejected += 1
+                continue
+            # 청크 열은 float64 범위를 넘는 정수를 담을 수 없다
+            if STORAGE_MODE == 'chunked' and not fits_column(sample['data']):
+                rejected += 1
+                continue
+
+            # 같은 요청 안에서 키가 겹치면 BatchWriteItem 전체가 실패하므로 마지막 샘플만 남긴다
+            # (같은 키는 같은 샘플이므로 재전송된 샘플도 새 데이터로 쌓이지 않는다)
+            if sample_time in samples_by_time:
+                rejected += 1
+            samples_by_time[sample_time] = sample['data']
+
+    with phase('write'):
+        if STORAGE_MODE == 'chunked':
+            chunks = encode_chunks(client_uuid, sorted(samples_by_time.items()))
+            failed = sum(int(chunk['count']) for chunk in batch_write_items(CHUNK_TABLE_NAME, chunks))
+        else:
+            items = [build_item(client_uuid, sample_time, data) for sample_time, data in samples_by_time.items()]
+            failed = len(batch_write_items(TABLE_NAME, items))
+
+    return {
+        'statusCode': 200,
+        'body': dumps({
+            'accepted': len(samples_by_time) - failed,
+            'rejected': rejected + failed
+        })
+    }
+
+@instrumented('receiveSensorData')
+def lambda_handler(event, context):
+    # 로그 출력
+    log_event(logger, event)
+
+    # API Gateway 요청이면 본문(JSON, gzip/MessagePack/CBOR)을 디코딩
+    if 'body' in event:
+        try:
+            with phase('parse'):
+                event = decode_body(event)
+        except BodyDecodeError as e:
+            return error_response(e.status_code, str(e))
+        if not isinstance(event, dict):
+            return error_response(400, 'Invalid request body')
+
+    # 데이터 추출 (빠진 필드는 KeyError로 502가 되지 않도록 400으로 응답)
+    client_uuid = event.get('client')
+    if not isinstance(client_uuid, str) or not client_uuid:
+        return error_response(400, 'client is required')
+
+    # 배치 모드: 타임스탬프가 포함된 샘플 배열
+    if 'samples' in event:
+        if not isinstance(event['samples'], list):
+            return error_response(400, 'samples must be a list')
+        return handle_batch(client_uuid, event['samples'])
+
+    data = event.get('data')
+    if not isinstance(data, dict):
+        return error_response(400, 'data must be an object')
+
+    # 기기 타임스탬프가 없으면 수신 시각(ms)을 사용
+    try:
+        if 'timestamp_ms' in event:
+            received_time = sample_time_key(event)
+        else:
+            received_time = sensor_time_key(int(time.time() * 1000))
+    except (TypeError, ValueError) as e:
+        return error_response(400, f'Invalid timestamp: {str(e)}')
+
+    # 단일 샘플은 청크 모드에서도 sensor_data에 저장한다 (한 샘플짜리 청크는 압축 효과가 없고,
+    # 분석이 읽을 때 청크와 합친다)
+    item = build_item(client_uuid, received_time, data)
+
+    # DynamoDB에 데이터 저장 (이미 저장된 키면 재시도로 보고 덮어쓰지 않음)
+    try:
+        get_table(TABLE_NAME).put_item(Item=item, ConditionExpression='attribute_not_exists(client_uuid)')
+    except ClientError as e:
+        if e.response['Error']['Code'] != 'ConditionalCheckFailedException':
+            raise
+        logger.info(f"Duplicate sample ignored: {client_uuid} {received_time}")
+
     return {
         'statusCode': 200,
-        'body': json.dumps('Data stored successfully!')
-    }
\ No newline at end of file
+        'body': dumps('Data stored successfully!')
+    }
@@ -1,41 +1,119 @@
-import json
-import boto3
 import logging
-from typing import Dict, Any
+import os
+from typing import Dict, Any, List, Optional, Tuple
 from botocore.exceptions import ClientError
+from sleep_common.analysis_queue import enqueue_analysis
+from sleep_common.analysis_trigger import claim_analysis, record_upload, release_claim
+from sleep_common.body import BodyDecodeError, decode_body
+from sleep_common.client_sessions import record_session
+from sleep_common.logs import log_event, log_fields, log_payload
+from sleep_common.metrics import instrumented, phase
+from sleep_common.runtime import create_response, dumps, get_client, get_logger, get_table
 
-logger = logging.getLogger()
-logger.setLevel(logging.INFO)
+logger = get_logger()
 
-dynamodb = boto3.resource('dynamodb')
-table = dynamodb.Table('sleep_records')
-lambda_client = boto3.client('lambda')
+SLEEP_RECORDS_TABLE = 'sleep_records'
 
-def create_response(status_code: int, body: Dict[str, Any]) -> Dict[str, Any]:
-    return {
-        'statusCode': status_code,
-        'body': json.dumps(body)
-    }
+# 'invoke': one async sleep_data_analysis invocation per finished session,
+# 'queue': send it to ANALYSIS_QUEUE_URL for the rate-limited worker
+ANALYSIS_TRIGGER_MODE = os.environ.get('ANALYSIS_TRIGGER_MODE', 'invoke')
 
 def invoke_analysis_lambda(session_uuid: str) -> Dict[str, Any]:
     try:
-        response = lambda_client.invoke(
+        response = get_client('lambda').invoke(
             FunctionName='sleep_data_analysis',
             InvocationType='Event',  # Use 'RequestResponse' for synchronous invocation
-            Payload=json.dumps({
+            Payload=dumps({
                 'session_uuid': session_uuid
             })
         )
-        logger.info(f"Invoked analysis Lambda function with response: {response}")
+        log_fields(logger, logging.INFO, 'Invoked analysis Lambda function', session_uuid=session_uuid, status_code=response.get('StatusCode'))
         return response
     except ClientError as e:
         logger.error(f"Error invoking analysis Lambda function: {str(e)}")
         raise
 
+REQUIRED_FIELDS = ['sessionId', 'startTime', 'endTime', 'stage']
+
+def build_items(client_uuid: str, records: List[Any]) -> Tuple[List[Dict[str, Any]], List[str], Optional[str]]:
+    """Validate every record and build de-duplicated DynamoDB items.
+
+    Returns (items, finished_sessions, error), where finished_sessions lists
+    the sessions with an end marker in this request. Nothing should be
+    written when error is set.
+    """
+    items: Dict[Tuple[str, int], Dict[str, Any]] = {}
+    finished_sessions: Dict[str, None] = {}
+
+    for index, record in enumerate(records):
+        if not isinstance(record, dict):
+            return [], [], f'Record {index} is not an object'
+
+        missing_fields = [field for field in REQUIRED_FIELDS if field not in record]
+        if missing_fields:
+            return [], [], f'Missing required fields in one of the records: {", ".join(missing_fields)}'
+
+        try:
+            item = {
+                'client_uuid': str(client_uuid),  # Ensure client_uuid is a string
+                'session_uuid': str(record['sessionId']),  # Ensure session_uuid is a string
+                'start_time': int(record['startTime']),
+                'end_time': int(record['endTime']),
+                'stage': int(record['stage'])
+            }
+        except (TypeError, ValueError):
+            return [], [], f'Invalid numeric value in record {index}'
+
+        # Later duplicates of the same (sessionId, startTime) win
+        items[(item['session_uuid'], item['start_time'])] = item
+
+        if record.get('end', False):
+            finished_sessions[item['session_uuid']] = None
+
+    return list(items.values()), list(finished_sessions), None
+
+def trigger_analysis(session_uuid: str, data_version: int) -> bool:
+    """Invoke or enqueue the analysis unless this data version was already claimed."""
+    if not claim_analysis(session_uuid, data_version):
+        log_fields(logger, logging.INFO, 'Analysis already requested', session_uuid=session_uuid, data_version=data_version)
+        return False
+    try:
+        if ANALYSIS_TRIGGER_MODE == 'queue':
+            enqueue_analysis(session_uuid, data_version)
+            log_fields(logger, logging.INFO, 'Enqueued analysis', session_uuid=session_uuid, data_version=data_version)
+        else:
+            invoke_analysis_lambda(session_uuid)
+    except ClientError:
+        release_claim(session_uuid, data_version)
+        raise
+    return True
+
+def index_session(client_uuid: str, session_uuid: str, start_time: int, end_time: int) -> None:
+    # The index only feeds client history, never fail an upload whose records are stored
+    try:
+        record_session(client_uuid, session_uuid, start_time, end_time)
+    except ClientError as e:
+        logger.warning(f"Error updating client session index: {str(e)}")
+
+def session_ranges(items: List[Dict[str, Any]]) -> Dict[str, Tuple[int, int]]:
+    """(earliest start_time, latest end_time) of every session in the items."""
+    ranges: Dict[str, Tuple[int, int]] = {}
+    for item in items:
+        start_time, end_time = ranges.get(item['session_uuid'], (item['start_time'], item['end_time']))
+        ranges[item['session_uuid']] = (min(start_time, item['start_time']), max(end_time, item['end_time']))
+    return ranges
+
+def write_items(items: List[Dict[str, Any]]) -> None:
+    # batch_writer buffers puts into BatchWriteItem calls and resends unprocessed items
+    with get_table(SLEEP_RECORDS_TABLE).batch_writer() as batch:
+        for item in items:
+            batch.put_item(Item=item)
+
+@instrumented('recieve_sleep_data')
 def lambda_handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
     try:
-        # Log full event for debugging
-        logger.info(f"Raw event: {json.dumps(event)}")
+        # Log event summary (full event only when payload logging is sampled)
+        log_event(logger, event)
         
         # Handle CORS preflight
         if event.get('httpMethod') == 'OPTIONS':
@@ -43,7 +121,6 @@ def lambda_handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
 
         # Get query parameters from event
         query_params = event.get('queryStringParameters')
-        logger.info(f"Query parameters: {query_params}")
         
         # Get client_uuid - handle both cases
         client_uuid = None
@@ -60,27 +137,18 @@ def lambda_handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
                 'success': False
             })
         
-        # Parse request body - handle different API Gateway payload formats
-        body = None
-        if isinstance(event.get('body'), str):
-            try:
-                body = json.loads(event.get('body'))
-            except json.JSONDecodeError as e:
-                logger.error(f"JSON parse error: {str(e)}")
-                return create_response(400, {
-                    'error': 'Invalid JSON format',
-                    'success': False
-                })
-        elif isinstance(event.get('body'), dict):
-            body = event.get('body')
-        else:
-            logger.error(f"Unexpected body format: {type(event.get('body'))}")
-            return create_response(400, {
-                'error': 'Invalid request body format',
+        # Parse request body - JSON, or base64 gzip/MessagePack/CBOR via isBase64Encoded
+        try:
+            with phase('parse'):
+                body = decode_body(event)
+        except BodyDecodeError as e:
+            logger.error(f"Body decode error: {str(e)}")
+            return create_response(e.status_code, {
+                'error': str(e),
                 'success': False
             })
 
-        logger.info(f"Parsed body: {json.dumps(body)}")
+        log_payload(logger, 'Parsed body', body)
 
         # Validate body
         if not body or not isinstance(body, dict):
@@ -96,35 +164,39 @@ def lambda_handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
                 'success': False
             })
 
-        # Process each sleep record
-        for record in body['sleep_data']:
-            required_fields = ['sessionId', 'startTime', 'endTime', 'stage']
-            missing_fields = [field for field in required_fields if field not in record]
-            if missing_fields:
-                return create_response(400, {
-                    'error': f'Missing required fields in one of the records: {", ".join(missing_fields)}',
-                    'success': False
-                })
-
-            # Create DynamoDB item
-            item = {
-                'client_uuid': str(client_uuid),  # Ensure client_uuid is a string
-                'session_uuid': str(record['sessionId']),  # Ensure session_uuid is a string
-                'start_time': int(record['startTime']),
-                'end_time': int(record['endTime']),
-                'stage': int(record['stage'])
-            }
+        # Validate the whole payload before writing anything
+        with phase('validate'):
+            items, finished_sessions, error = build_items(client_uuid, body['sleep_data'])
+        if error:
+            return create_response(400, {
+                'error': error,
+                'success': False
+            })
+
+        # Store all records in one bulk pass
+        with phase('write'):
+            write_items(items)
+
+        # Count the upload on every session it stored records for, after the write:
+        # the count is the data version analyses are claimed for and compared against
+        ranges = session_ranges(items)
+        with phase('version'):
+            data_versions = {session_uuid: record_upload(session_uuid) for session_uuid in ranges}
+
+        # Keep the client's session index current for history lookups
+        with phase('index'):
+            for session_uuid, (start_time, end_time) in ranges.items():
+                index_session(str(client_uuid), session_uuid, start_time, end_time)
+
+        # Invoke the analysis Lambda function at most once per finished session,
+        # and only when it has data newer than the last requested analysis
+        with phase('trigger'):
+            for session_uuid in finished_sessions:
+                trigger_analysis(session_uuid, data_versions[session_uuid])
 
-            # Store in DynamoDB
-            table.put_item(Item=item)
-            
-            # Check if 'end' field is true
-            if record.get('end', False):
-                # Invoke the analysis Lambda function with sessionId
-                invoke_analysis_lambda(record['sessionId'])
-        
         return create_response(200, {
             'message': 'Sleep data stored successfully',
+            'stored': len(items),
             'success': True
         })
 
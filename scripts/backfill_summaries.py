@@ -0,0 +1,90 @@
+"""One-off backfill of sleep_analysis_summary from sleep_analysis and sleep_records.
+
+Run from the repository root with AWS credentials for the target account:
+
+    python scripts/backfill_summaries.py [--dry-run]
+
+Analyses stored before ``sleep_analysis_summary`` existed are missing from
+``sleep_analysis_view`` until they are re-analyzed. For every ``sleep_analysis``
+item, the script reads the session's ``sleep_records`` for its client and
+earliest ``start_time``. It writes the summary (score, source, excerpt) with
+``put_summary`` and stores ``start_time`` on the analysis item, so later
+re-analyses can move the summary when the start changes. Summary items of a
+session under any other key, left behind by earlier start times, are
+deleted. Sessions without records are skipped and counted.
+
+The script is idempotent: running it again rewrites the same items.
+``--dry-run`` reads everything and only reports what it would write.
+"""
+import argparse
+import os
+import sys
+from typing import Any, Dict, List, Optional, Tuple
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'layer', 'python'))
+
+from boto3.dynamodb.conditions import Key  # noqa: E402
+
+from sleep_common.analysis_summary import SUMMARY_TABLE_NAME, put_summary, summary_key  # noqa: E402
+from sleep_common.query import iter_query, iter_scan  # noqa: E402
+from sleep_common.runtime import get_table  # noqa: E402
+
+ANALYSIS_TABLE = 'sleep_analysis'
+SLEEP_RECORDS_TABLE = 'sleep_records'
+
+def session_start(session_uuid: str) -> Optional[Tuple[Optional[str], Any]]:
+    """(client_uuid, earliest start_time) of the session's records, None without records."""
+    client_uuid, start_time = None, None
+    for record in iter_query(get_table(SLEEP_RECORDS_TABLE), Key('session_uuid').eq(session_uuid),
+                             projection=['client_uuid', 'start_time']):
+        client_uuid = client_uuid or record.get('client_uuid')
+        if record.get('start_time') is not None and (start_time is None or record['start_time'] < start_time):
+            start_time = record['start_time']
+    if start_time is None:
+        return None
+    return client_uuid, start_time
+
+def existing_summary_keys() -> Dict[str, List[Dict[str, Any]]]:
+    keys: Dict[str, List[Dict[str, Any]]] = {}
+    for item in iter_scan(get_table(SUMMARY_TABLE_NAME), projection=['month', 'sort_key', 'session_uuid']):
+        keys.setdefault(str(item.get('session_uuid')), []).append({'month': item['month'], 'sort_key': item['sort_key']})
+    return keys
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--dry-run', action='store_true', help='report without writing')
+    args = parser.parse_args()
+
+    summary_keys = existing_summary_keys()
+    written = stale = without_records = 0
+    for analysis in iter_scan(get_table(ANALYSIS_TABLE),
+                              projection=['session_uuid', 'score', 'score_source', 'analysis']):
+        session_uuid = str(analysis['session_uuid'])
+        start = session_start(session_uuid)
+        if start is None:
+            without_records += 1
+            continue
+        client_uuid, start_time = start
+        key = summary_key(session_uuid, start_time)
+        stale_keys = [old_key for old_key in summary_keys.get(session_uuid, []) if old_key != key]
+        written += 1
+        stale += len(stale_keys)
+        if args.dry_run:
+            continue
+        put_summary(session_uuid, client_uuid, start_time, analysis.get('score'),
+                    analysis.get('score_source', 'gpt'), analysis.get('analysis'))
+        get_table(ANALYSIS_TABLE).update_item(
+            Key={'session_uuid': session_uuid},
+            UpdateExpression='SET start_time = :start',
+            ExpressionAttributeValues={':start': start_time}
+        )
+        for old_key in stale_keys:
+            get_table(SUMMARY_TABLE_NAME).delete_item(Key=old_key)
+
+    action = 'would write' if args.dry_run else 'written'
+    print(f'summaries {action}    {written}')
+    print(f'stale keys {"to delete" if args.dry_run else "deleted"}  {stale}')
+    print(f'sessions without records  {without_records}')
+
+if __name__ == '__main__':
+    main()
@@ -1,45 +1,36 @@
-import json
-import boto3
-import logging
 from typing import Dict, Any
 from botocore.exceptions import ClientError
-from decimal import Decimal
+from sleep_common.cache import log_cache_stats, session_cache
+from sleep_common.http_cache import cached_response
+from sleep_common.logs import log_event
+from sleep_common.metrics import instrumented
+from sleep_common.runtime import create_response, get_logger, get_table
 
-logger = logging.getLogger()
-logger.setLevel(logging.INFO)
+logger = get_logger()
 
-dynamodb = boto3.resource('dynamodb')
-analysis_table = dynamodb.Table('sleep_analysis')
-
-def create_response(status_code: int, body: Dict[str, Any]) -> Dict[str, Any]:
-    return {
-        'statusCode': status_code,
-        'body': json.dumps(body, default=decimal_default)
-    }
-
-def decimal_default(obj):
-    if isinstance(obj, Decimal):
-        return float(obj)
-    raise TypeError
+ANALYSIS_TABLE = 'sleep_analysis'
 
 def fetch_analysis_data(session_uuid: str) -> Dict[str, Any]:
     try:
-        response = analysis_table.get_item(
-            Key={'session_uuid': session_uuid}
+        # Completed analyses (input_hash set) no longer change, keep them warm
+        item = session_cache.get_or_load(
+            ('analysis', session_uuid),
+            lambda: get_table(ANALYSIS_TABLE).get_item(Key={'session_uuid': session_uuid}).get('Item'),
+            cacheable=lambda item: bool(item.get('input_hash'))
         )
-        return response.get('Item', {})
+        return item or {}
     except ClientError as e:
         logger.error(f"Error fetching analysis data: {str(e)}")
         raise
 
+@instrumented('send_sleep_analysis')
 def lambda_handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
     try:
-        # Log full event for debugging
-        logger.info(f"Raw event: {json.dumps(event)}")
+        # Log event summary (full event only when payload logging is sampled)
+        log_event(logger, event)
         
         # Get query parameters from event
         query_params = event.get('queryStringParameters')
-        logger.info(f"Query parameters: {query_params}")
         
         # Get session_uuid
         session_uuid = None
@@ -54,6 +45,7 @@ def lambda_handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
         
         # Fetch analysis data
         analysis_data = fetch_analysis_data(session_uuid)
+        log_cache_stats(logger)
         
         if not analysis_data:
             return create_response(404, {
@@ -64,9 +56,10 @@ def lambda_handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
         # Return the analysis
         analysis = analysis_data.get('analysis')
         
-        return {
+        # Stored by a completed analysis (input_hash set) the text is final
+        return cached_response(event, {
             'analysis': analysis
-        }
+        }, finished=bool(analysis_data.get('input_hash')))
 
     except ClientError as e:
         logger.error(f"DynamoDB error: {str(e)}")
@@ -0,0 +1,73 @@
+from typing import Dict, Any, Optional
+from botocore.exceptions import ClientError
+from sleep_common.client_sessions import HISTORY_FIELDS, fetch_history
+from sleep_common.logs import log_event
+from sleep_common.metrics import instrumented
+from sleep_common.query import decode_cursor, encode_cursor
+from sleep_common.runtime import create_response, get_logger
+
+logger = get_logger()
+
+DEFAULT_PAGE_SIZE = 30
+MAX_PAGE_SIZE = 100
+
+def parse_int(value: Optional[str]) -> Optional[int]:
+    return int(value) if value not in (None, '') else None
+
+@instrumented('send_sleep_history')
+def lambda_handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
+    try:
+        # Log event summary (full event only when payload logging is sampled)
+        log_event(logger, event)
+
+        query_params = event.get('queryStringParameters') or {}
+        client_uuid = query_params.get('client_uuid')
+
+        if not client_uuid:
+            return create_response(400, {
+                'error': 'client_uuid is required as query parameter',
+                'success': False
+            })
+
+        # since/until bound the session start time (epoch seconds)
+        try:
+            limit = min(parse_int(query_params.get('limit')) or DEFAULT_PAGE_SIZE, MAX_PAGE_SIZE)
+            since = parse_int(query_params.get('since'))
+            until = parse_int(query_params.get('until'))
+            cursor = decode_cursor(query_params.get('cursor'))
+        except ValueError as e:
+            return create_response(400, {
+                'error': f'Invalid query parameter: {str(e)}',
+                'success': False
+            })
+        if limit < 1:
+            return create_response(400, {
+                'error': 'limit must be positive',
+                'success': False
+            })
+
+        # One query on the client's start_time index, newest first
+        sessions, last_key = fetch_history(client_uuid, limit, cursor, since, until)
+
+        return {
+            'sessions': [
+                {field: session.get(field) for field in HISTORY_FIELDS}
+                for session in sessions
+            ],
+            'cursor': encode_cursor(last_key)
+        }
+
+    except ClientError as e:
+        logger.error(f"DynamoDB error: {str(e)}")
+        return create_response(500, {
+            'error': f"DynamoDB error: {str(e)}",
+            'success': False
+        })
+    except Exception as e:
+        logger.error(f"Unexpected error: {str(e)}")
+        import traceback
+        logger.error(traceback.format_exc())
+        return create_response(500, {
+            'error': str(e),
+            'success': False
+        })
@@ -1,45 +1,51 @@
-import json
-import boto3
-import logging
 from typing import Dict, Any
 from botocore.exceptions import ClientError
-from decimal import Decimal
+from sleep_common.cache import log_cache_stats, session_cache
+from sleep_common.http_cache import cached_response
+from sleep_common.logs import log_event
+from sleep_common.metrics import instrumented
+from sleep_common.query import iter_query
+from sleep_common.runtime import create_response, get_logger, get_table
 
-logger = logging.getLogger()
-logger.setLevel(logging.INFO)
+logger = get_logger()
 
-dynamodb = boto3.resource('dynamodb')
-analysis_table = dynamodb.Table('sleep_analysis')
-
-def create_response(status_code: int, body: Dict[str, Any]) -> Dict[str, Any]:
-    return {
-        'statusCode': status_code,
-        'body': json.dumps(body, default=decimal_default)
-    }
-
-def decimal_default(obj):
-    if isinstance(obj, Decimal):
-        return float(obj)
-    raise TypeError
+ANALYSIS_TABLE = 'sleep_analysis'
+SLEEP_RECORDS_TABLE = 'sleep_records'
 
 def fetch_analysis_data(session_uuid: str) -> Dict[str, Any]:
     try:
-        response = analysis_table.get_item(
-            Key={'session_uuid': session_uuid}
+        # Completed analyses (input_hash set) no longer change, keep them warm
+        item = session_cache.get_or_load(
+            ('analysis', session_uuid),
+            lambda: get_table(ANALYSIS_TABLE).get_item(Key={'session_uuid': session_uuid}).get('Item'),
+            cacheable=lambda item: bool(item.get('input_hash'))
         )
-        return response.get('Item', {})
+        return item or {}
     except ClientError as e:
         logger.error(f"Error fetching analysis data: {str(e)}")
         raise
 
+def fetch_sleep_records(session_uuid: str) -> list:
+    # Only the local score fallback reads records, keep boto3 out of the cold import
+    from boto3.dynamodb.conditions import Key
+    try:
+        return list(iter_query(
+            get_table(SLEEP_RECORDS_TABLE),
+            Key('session_uuid').eq(session_uuid),
+            projection=['start_time', 'end_time', 'stage']
+        ))
+    except ClientError as e:
+        logger.error(f"Error fetching sleep records: {str(e)}")
+        raise
+
+@instrumented('send_sleep_score')
 def lambda_handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
     try:
-        # Log full event for debugging
-        logger.info(f"Raw event: {json.dumps(event)}")
+        # Log event summary (full event only when payload logging is sampled)
+        log_event(logger, event)
         
         # Get query parameters from event
         query_params = event.get('queryStringParameters')
-        logger.info(f"Query parameters: {query_params}")
         
         # Get session_uuid
         session_uuid = None
@@ -54,7 +60,20 @@ def lambda_handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
         
         # Fetch analysis data
         analysis_data = fetch_analysis_data(session_uuid)
+        log_cache_stats(logger)
         
+        if not analysis_data or analysis_data.get('score') is None:
+            # No stored analysis yet: score the uploaded stages locally
+            # (numpy is only imported on this path)
+            from sleep_common.scoring import score_sleep
+            local_score = score_sleep(fetch_sleep_records(session_uuid))['score']
+            if local_score is not None:
+                # Changes as records arrive, clients must revalidate
+                return cached_response(event, {
+                    'score': local_score,
+                    'source': 'local'
+                }, finished=False)
+
         if not analysis_data:
             return create_response(404, {
                 'error': 'Analysis data not found',
@@ -64,9 +83,10 @@ def lambda_handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
         # Return the score
         score = analysis_data.get('score')
         
-        return{
+        # Stored by a completed analysis (input_hash set) the score is final
+        return cached_response(event, {
             'score': score
-        }
+        }, finished=bool(analysis_data.get('input_hash')))
 
     except ClientError as e:
         logger.error(f"DynamoDB error: {str(e)}")
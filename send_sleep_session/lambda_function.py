@@ -0,0 +1,80 @@
+from typing import Dict, Any, List
+from botocore.exceptions import ClientError
+from sleep_common.cache import log_cache_stats
+from sleep_common.http_cache import cached_response
+from sleep_common.logs import log_event
+from sleep_common.metrics import instrumented
+from sleep_common.runtime import create_response, get_logger
+from sleep_common.sessions import MAX_SESSIONS, SESSION_FIELDS, read_sessions
+
+logger = get_logger()
+
+def split_param(value: Any) -> List[str]:
+    values = value if isinstance(value, list) else [value or '']
+    return [part.strip() for item in values for part in item.split(',') if part.strip()]
+
+@instrumented('send_sleep_session')
+def lambda_handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
+    try:
+        # Log event summary (full event only when payload logging is sampled)
+        log_event(logger, event)
+
+        # session_uuid may repeat or hold a comma-separated list
+        query_params = event.get('queryStringParameters') or {}
+        multi_params = event.get('multiValueQueryStringParameters') or {}
+        session_uuids = split_param(multi_params.get('session_uuid') or query_params.get('session_uuid'))
+        fields = split_param(query_params.get('fields')) or list(SESSION_FIELDS)
+
+        if not session_uuids:
+            return create_response(400, {
+                'error': 'session_uuid is required as query parameter',
+                'success': False
+            })
+
+        unknown_fields = sorted(set(fields) - set(SESSION_FIELDS))
+        if unknown_fields:
+            return create_response(400, {
+                'error': f"Unknown fields: {', '.join(unknown_fields)} (allowed: {', '.join(SESSION_FIELDS)})",
+                'success': False
+            })
+
+        if len(set(session_uuids)) > MAX_SESSIONS:
+            return create_response(400, {
+                'error': f'At most {MAX_SESSIONS} session_uuids per request',
+                'success': False
+            })
+
+        # Analyses (BatchGetItem) and stage records are read concurrently
+        results = read_sessions(session_uuids, fields)
+        log_cache_stats(logger)
+
+        sessions = {session_uuid: result for session_uuid, result in results.items() if result is not None}
+        missing = [session_uuid for session_uuid, result in results.items() if result is None]
+
+        if not sessions:
+            return create_response(404, {
+                'error': 'No data found for the given session_uuid',
+                'success': False
+            })
+
+        # Cacheable once every requested session has a completed analysis
+        finished = not missing and all(result.get('analyzed') for result in sessions.values())
+        return cached_response(event, {
+            'sessions': sessions,
+            'missing': missing
+        }, finished=finished)
+
+    except ClientError as e:
+        logger.error(f"DynamoDB error: {str(e)}")
+        return create_response(500, {
+            'error': f"DynamoDB error: {str(e)}",
+            'success': False
+        })
+    except Exception as e:
+        logger.error(f"Unexpected error: {str(e)}")
+        import traceback
+        logger.error(traceback.format_exc())
+        return create_response(500, {
+            'error': str(e),
+            'success': False
+        })
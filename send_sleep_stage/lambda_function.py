@@ -1,45 +1,61 @@
-import json
-import boto3
-import logging
 from typing import Dict, Any
+from boto3.dynamodb.conditions import Key
 from botocore.exceptions import ClientError
-from decimal import Decimal
+from sleep_common.analysis_trigger import analysis_is_current
+from sleep_common.cache import MISSING, log_cache_stats, session_cache
+from sleep_common.http_cache import cached_response
+from sleep_common.hypnogram import encode_hypnogram
+from sleep_common.logs import log_event
+from sleep_common.metrics import instrumented
+from sleep_common.query import iter_query
+from sleep_common.runtime import create_response, get_logger, get_table
 
-logger = logging.getLogger()
-logger.setLevel(logging.INFO)
+logger = get_logger()
 
-dynamodb = boto3.resource('dynamodb')
-sleep_records_table = dynamodb.Table('sleep_records')
-
-def create_response(status_code: int, body: Dict[str, Any]) -> Dict[str, Any]:
-    return {
-        'statusCode': status_code,
-        'body': json.dumps(body, default=decimal_default)
-    }
-
-def decimal_default(obj):
-    if isinstance(obj, Decimal):
-        return float(obj)
-    raise TypeError
+SLEEP_RECORDS_TABLE = 'sleep_records'
+RESPONSE_FORMATS = ('records', 'rle')
 
 def fetch_sleep_records(session_uuid: str) -> list:
     try:
-        response = sleep_records_table.query(
-            KeyConditionExpression=boto3.dynamodb.conditions.Key('session_uuid').eq(session_uuid)
-        )
-        return response.get('Items', [])
+        return list(iter_query(
+            get_table(SLEEP_RECORDS_TABLE),
+            Key('session_uuid').eq(session_uuid),
+            projection=['start_time', 'end_time', 'stage']
+        ))
     except ClientError as e:
         logger.error(f"Error fetching sleep records: {str(e)}")
         raise
 
+def is_finished(session_uuid: str) -> bool:
+    # Records are final once an analysis covered the latest upload
+    try:
+        return analysis_is_current(session_uuid)
+    except ClientError as e:
+        logger.warning(f"Error reading analysis state: {str(e)}")
+        return False
+
+def load_sleep_records(session_uuid: str) -> tuple:
+    """(records, finished), served from the warm cache for finished and unknown sessions."""
+    cached = session_cache.get(('stages', session_uuid))
+    if cached is not MISSING:
+        return cached or [], cached is not None
+    sleep_records = fetch_sleep_records(session_uuid)
+    finished = bool(sleep_records) and is_finished(session_uuid)
+    if finished or not sleep_records:
+        session_cache.set(('stages', session_uuid), sleep_records or None)
+    return sleep_records, finished
+
+def parse_time(value: Any) -> Any:
+    return int(value) if value not in (None, '') else None
+
+@instrumented('send_sleep_stage')
 def lambda_handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
     try:
-        # Log full event for debugging
-        logger.info(f"Raw event: {json.dumps(event)}")
+        # Log event summary (full event only when payload logging is sampled)
+        log_event(logger, event)
         
         # Get query parameters from event
         query_params = event.get('queryStringParameters')
-        logger.info(f"Query parameters: {query_params}")
         
         # Get session_uuid
         session_uuid = None
@@ -52,8 +68,25 @@ def lambda_handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
                 'success': False
             })
         
+        # Optional compact format and [start, end) time window
+        response_format = query_params.get('format') or 'records'
+        if response_format not in RESPONSE_FORMATS:
+            return create_response(400, {
+                'error': f"format must be one of: {', '.join(RESPONSE_FORMATS)}",
+                'success': False
+            })
+        try:
+            window_start = parse_time(query_params.get('start'))
+            window_end = parse_time(query_params.get('end'))
+        except ValueError:
+            return create_response(400, {
+                'error': 'start and end must be epoch seconds',
+                'success': False
+            })
+        
         # Fetch sleep records
-        sleep_records = fetch_sleep_records(session_uuid)
+        sleep_records, finished = load_sleep_records(session_uuid)
+        log_cache_stats(logger)
         
         if not sleep_records:
             return create_response(404, {
@@ -61,19 +94,27 @@ def lambda_handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
                 'success': False
             })
         
-        # Extract relevant data
-        records = [
-            {
-                'start_time': record['start_time'],
-                'end_time': record['end_time'],
-                'stage': record['stage']
-            }
-            for record in sleep_records
-        ]
+        if response_format == 'rle':
+            return cached_response(event, encode_hypnogram(sleep_records, window_start, window_end), finished=finished)
+        
+        # Extract relevant data, records overlapping the window in time order
+        records = sorted(
+            (
+                {
+                    'start_time': record['start_time'],
+                    'end_time': record['end_time'],
+                    'stage': record['stage']
+                }
+                for record in sleep_records
+                if (window_start is None or record['end_time'] > window_start)
+                and (window_end is None or record['start_time'] < window_end)
+            ),
+            key=lambda record: record['start_time']
+        )
         
-        return {
+        return cached_response(event, {
             'records': records
-        }
+        }, finished=finished)
 
     except ClientError as e:
         logger.error(f"DynamoDB error: {str(e)}")
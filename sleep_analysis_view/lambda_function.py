@@ -1,115 +1,150 @@
-import json
-import boto3
-import logging
-from typing import Dict, Any
+from typing import Dict, Any, Iterable, Optional
+from datetime import datetime, timezone
+from html import escape
+from urllib.parse import urlencode
 from botocore.exceptions import ClientError
-from decimal import Decimal
+from sleep_common.analysis_summary import fetch_month
+from sleep_common.logs import log_event
+from sleep_common.metrics import instrumented
+from sleep_common.query import decode_cursor, encode_cursor
+from sleep_common.runtime import get_logger, get_table, html_response
 
-logger = logging.getLogger()
-logger.setLevel(logging.INFO)
+logger = get_logger()
 
-dynamodb = boto3.resource('dynamodb')
-analysis_table = dynamodb.Table('sleep_analysis')
+ANALYSIS_TABLE = 'sleep_analysis'
 
-def decimal_default(obj):
-    if isinstance(obj, Decimal):
-        return float(obj)
-    raise TypeError
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 500
 
-def fetch_all_analysis_data() -> list:
+def fetch_analysis_data(session_uuid: str) -> Dict[str, Any]:
     try:
-        response = analysis_table.scan()
-        return response.get('Items', [])
+        response = get_table(ANALYSIS_TABLE).get_item(
+            Key={'session_uuid': session_uuid},
+            ProjectionExpression='session_uuid, score, analysis'
+        )
+        return response.get('Item', {})
     except ClientError as e:
         logger.error(f"Error fetching analysis data: {str(e)}")
         raise
 
-def generate_html_table(records: list) -> str:
-    html = """
+def page_url(path: str, **params: Optional[str]) -> str:
+    return f"{path}?{urlencode({name: value for name, value in params.items() if value})}"
+
+def previous_month(month: str) -> str:
+    year, number = (int(part) for part in month.split('-'))
+    return f"{year - 1}-12" if number == 1 else f"{year}-{number - 1:02d}"
+
+def generate_html_table(month: str, records: Iterable[Dict[str, Any]], path: str, next_url: Optional[str] = None) -> str:
+    parts = [f"""
     <html>
     <head>
         <meta charset="UTF-8">
         <title>Analysis Data</title>
     </head>
     <body>
-        <h1>Analysis Data</h1>
+        <h1>Analysis Data {escape(month)}</h1>
         <table border="1">
             <tr>
+                <th>Date</th>
                 <th>Session UUID</th>
                 <th>Score</th>
                 <th>Analysis</th>
             </tr>
-    """
+    """]
     for record in records:
-        html += f"""
+        detail_url = page_url(path, session_uuid=record['session_uuid'])
+        parts.append(f"""
             <tr>
-                <td>{record['session_uuid']}</td>
-                <td>{record['score']}</td>
-                <td>{record['analysis']}</td>
+                <td>{escape(str(record.get('date', '')))}</td>
+                <td><a href="{escape(detail_url)}">{escape(str(record['session_uuid']))}</a></td>
+                <td>{escape(str(record.get('score')))}</td>
+                <td>{escape(record.get('excerpt', ''))}</td>
             </tr>
-        """
-    html += """
+        """)
+    parts.append("""
         </table>
+    """)
+    if next_url:
+        parts.append(f"""
+        <p><a href="{escape(next_url)}">Next page</a></p>
+    """)
+    parts.append(f"""
+        <p><a href="{escape(page_url(path, month=previous_month(month)))}">Previous month</a></p>
+    </body>
+    </html>
+    """)
+    return ''.join(parts)
+
+def generate_html_detail(record: Dict[str, Any], path: str) -> str:
+    return f"""
+    <html>
+    <head>
+        <meta charset="UTF-8">
+        <title>Analysis {escape(str(record['session_uuid']))}</title>
+    </head>
+    <body>
+        <h1>Session {escape(str(record['session_uuid']))}</h1>
+        <p>Score: {escape(str(record.get('score')))}</p>
+        <p style="white-space: pre-wrap">{escape(record.get('analysis') or '')}</p>
+        <p><a href="{escape(path)}">All analyses</a></p>
     </body>
     </html>
     """
-    return html
 
+def parse_limit(value: Optional[str]) -> int:
+    if not value:
+        return DEFAULT_PAGE_SIZE
+    limit = int(value)
+    if limit < 1:
+        raise ValueError('limit must be positive')
+    return min(limit, MAX_PAGE_SIZE)
+
+def parse_month(value: Optional[str]) -> str:
+    if not value:
+        return datetime.now(timezone.utc).strftime('%Y-%m')
+    return datetime.strptime(value, '%Y-%m').strftime('%Y-%m')
+
+@instrumented('sleep_analysis_view')
 def lambda_handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
     try:
-        # Log full event for debugging
-        logger.info(f"Raw event: {json.dumps(event)}")
-        
-        # Fetch all analysis data
-        analysis_data = fetch_all_analysis_data()
-        
-        if not analysis_data:
-            return {
-                'statusCode': 404,
-                'headers': {
-                    'Content-Type': 'text/html'
-                },
-                'body': '<html><body><h1>No analysis data found</h1></body></html>'
-            }
-        
-        # Extract relevant data
-        records = [
-            {
-                'session_uuid': record['session_uuid'],
-                'score': record['score'],
-                'analysis': record['analysis']
-            }
-            for record in analysis_data
-        ]
-        
+        # Log event summary (full event only when payload logging is sampled)
+        log_event(logger, event)
+
+        query_params = event.get('queryStringParameters') or {}
+        path = event.get('path') or ''
+
+        # Full analysis of one session
+        session_uuid = query_params.get('session_uuid')
+        if session_uuid:
+            record = fetch_analysis_data(session_uuid)
+            if not record:
+                return html_response(404, '<html><body><h1>No analysis data found</h1></body></html>')
+            return html_response(200, generate_html_detail(record, path))
+
+        try:
+            month = parse_month(query_params.get('month'))
+            limit = parse_limit(query_params.get('limit'))
+            cursor = decode_cursor(query_params.get('cursor'))
+        except ValueError as e:
+            return html_response(400, f'<html><body><h1>Bad request: {escape(str(e))}</h1></body></html>')
+
+        # One query against the month's summaries instead of a table scan
+        records, last_key = fetch_month(month, limit, cursor)
+
+        next_url = None
+        if last_key:
+            next_url = page_url(path, month=month, limit=str(limit), cursor=encode_cursor(last_key))
+
         # Generate HTML table
-        html_content = generate_html_table(records)
-        
-        return {
-            'statusCode': 200,
-            'headers': {
-                'Content-Type': 'text/html'
-            },
-            'body': html_content
-        }
+        html_content = generate_html_table(month, records, path, next_url)
+
+        return html_response(200, html_content)
 
     except ClientError as e:
         logger.error(f"DynamoDB error: {str(e)}")
-        return {
-            'statusCode': 500,
-            'headers': {
-                'Content-Type': 'text/html'
-            },
-            'body': f'<html><body><h1>DynamoDB error: {str(e)}</h1></body></html>'
-        }
+        return html_response(500, f'<html><body><h1>DynamoDB error: {escape(str(e))}</h1></body></html>')
     except Exception as e:
         logger.error(f"Unexpected error: {str(e)}")
         import traceback
         logger.error(traceback.format_exc())
-        return {
-            'statusCode': 500,
-            'headers': {
-                'Content-Type': 'text/html'
-            },
-            'body': f'<html><body><h1>Unexpected error: {str(e)}</h1></body></html>'
-        }
\ No newline at end of file
+        return html_response(500, f'<html><body><h1>Unexpected error: {escape(str(e))}</h1></body></html>')
@@ -1,109 +1,305 @@
+import hashlib
 import json
 import logging
-import boto3
+import math
 import os
+import random
 import re
+import time
+from concurrent.futures import ThreadPoolExecutor
 from decimal import Decimal
-from openai import OpenAI
-from typing import Dict, Any
+from typing import Dict, Any, Optional
+from boto3.dynamodb.conditions import Key
 from botocore.exceptions import ClientError
+from sleep_common.analysis_queue import (
+    MAX_ATTEMPTS, dead_letter, parse_message, receive_count, retry_later
+)
+from sleep_common.analysis_summary import put_summary, remove_moved_summary, summary_key, update_summary_score
+from sleep_common.analysis_trigger import (
+    analysis_is_current, clear_pending_run, get_data_version, get_pending_run, mark_analyzed, save_pending_run
+)
+from sleep_common.client_sessions import record_score
+from sleep_common.features import compact_stages, concat_columns, rows_to_columns, summarize_sensor_data
+from sleep_common.logs import log_event, log_fields, log_payload
+from sleep_common.metrics import instrumented, phase
+from sleep_common.query import iter_query
+from sleep_common.rate_limit import TokenBucket, estimate_tokens
+from sleep_common.runtime import create_response, decimal_default, dumps, get_client, get_logger, get_openai_client, get_table
+from sleep_common.scoring import score_sleep
+from sleep_common.sensor_chunks import CHUNK_SECONDS, CHUNK_TABLE_NAME, decode_chunks
+from sleep_common.sensor_keys import range_end_key, time_slices
 
-logger = logging.getLogger()
-logger.setLevel(logging.INFO)
+logger = get_logger()
 
-dynamodb = boto3.resource('dynamodb')
-analysis_table = dynamodb.Table('sleep_analysis')
-sleep_records_table = dynamodb.Table('sleep_records')
+ANALYSIS_TABLE = 'sleep_analysis'
+SLEEP_RECORDS_TABLE = 'sleep_records'
+SENSOR_TABLE = 'sensor_data'
 
-def create_response(status_code: int, body: Dict[str, Any]) -> Dict[str, Any]:
-    return {
-        'statusCode': status_code,
-        'body': json.dumps(body)
-    }
+# 'items': one sensor_data item per sample, 'chunked': compressed per-minute chunks
+SENSOR_STORAGE_MODE = os.environ.get('SENSOR_STORAGE_MODE', 'items')
+
+# 'gpt': store the assistant's score (local score as fallback), 'local': always the local score
+SCORE_SOURCE = os.environ.get('SCORE_SOURCE', 'gpt')
+
+SESSION_FIELDS = ['client_uuid', 'start_time', 'end_time', 'stage']
+
+# Sensor attributes to read (all when unset), optional page size and item cap
+SENSOR_FIELDS = [field for field in os.environ.get('SENSOR_FIELDS', '').split(',') if field]
+SENSOR_PAGE_SIZE = int(os.environ.get('SENSOR_PAGE_SIZE', '0')) or None
+SENSOR_MAX_ITEMS = int(os.environ.get('SENSOR_MAX_ITEMS', '0')) or None
+
+# The sensor range is read as concurrent time slices: at most SENSOR_FETCH_WORKERS,
+# each at least SENSOR_SLICE_SECONDS long, so short nights stay one query
+SENSOR_FETCH_WORKERS = int(os.environ.get('SENSOR_FETCH_WORKERS', '4'))
+SENSOR_SLICE_SECONDS = int(os.environ.get('SENSOR_SLICE_SECONDS', '3600'))
 
 def fetch_session_data(session_uuid: str) -> list:
     try:
-        response = sleep_records_table.query(
-            KeyConditionExpression=boto3.dynamodb.conditions.Key('session_uuid').eq(session_uuid)
-        )
-        return response.get('Items', [])
+        return list(iter_query(
+            get_table(SLEEP_RECORDS_TABLE),
+            Key('session_uuid').eq(session_uuid),
+            projection=SESSION_FIELDS
+        ))
     except ClientError as e:
         logger.error(f"Error fetching session data: {str(e)}")
         raise
 
-class DecimalEncoder(json.JSONEncoder):
-    def default(self, obj):
-        if isinstance(obj, Decimal):
-            return float(obj)
-        return super(DecimalEncoder, self).default(obj)
+def sensor_range_params(client_uuid: str, start_time: Any, end_time: Any) -> Dict[str, Any]:
+    return {
+        'ExpressionAttributeNames': {
+            '#time': 'time'
+        },
+        'ExpressionAttributeValues': {
+            ':client_uuid': client_uuid,
+            ':start_time': start_time,
+            # Millisecond/sequence keys carry a fraction, cover the whole last second
+            ':end_time': range_end_key(end_time)
+        }
+    }
+
+def sensor_slice_count(start_time: Any, end_time: Any) -> int:
+    duration = float(end_time) - float(start_time)
+    return max(1, min(SENSOR_FETCH_WORKERS, math.ceil(duration / SENSOR_SLICE_SECONDS)))
 
-def fetch_sensor_data(client_uuid: str, start_time: int, end_time: int) -> list:
-    sensor_table = dynamodb.Table('sensor_data')
+def query_sensor_slice(client_uuid: str, low: Decimal, high: Decimal) -> Dict[str, Any]:
+    """Columns of one time slice, read with the low-level client (safe to share between threads)."""
+    items = iter_query(
+        get_client('dynamodb'),
+        'client_uuid = :client_uuid AND #time BETWEEN :start_time AND :end_time',
+        projection=['time', *SENSOR_FIELDS] if SENSOR_FIELDS else None,
+        page_size=SENSOR_PAGE_SIZE,
+        max_items=SENSOR_MAX_ITEMS,
+        TableName=SENSOR_TABLE,
+        ExpressionAttributeNames={'#time': 'time'},
+        ExpressionAttributeValues={
+            ':client_uuid': {'S': client_uuid},
+            ':start_time': {'N': str(low)},
+            ':end_time': {'N': str(high)}
+        }
+    )
+    # Only numbers become columns, parse them straight from the typed values
+    return rows_to_columns(
+        {key: float(value['N']) for key, value in item.items() if 'N' in value}
+        for item in items
+    )
+
+def fetch_sensor_data(client_uuid: str, start_time: int, end_time: int) -> Optional[Dict[str, Any]]:
+    """Read every sensor_data item of the window into float columns, time slices in parallel."""
     try:
         if not all([client_uuid, start_time, end_time]):
             logger.warning("Missing required parameters for sensor data fetch")
             return None
-            
-        response = sensor_table.query(
-            KeyConditionExpression='client_uuid = :client_uuid AND #time BETWEEN :start_time AND :end_time',
-            ExpressionAttributeNames={
-                '#time': 'time'
-            },
-            ExpressionAttributeValues={
-                ':client_uuid': client_uuid,
-                ':start_time': start_time,
-                ':end_time': end_time
-            }
-        )
-        items = response.get('Items', [])
 
-        return items
+        slices = time_slices(start_time, end_time, sensor_slice_count(start_time, end_time))
+        if len(slices) == 1:
+            parts = [query_sensor_slice(str(client_uuid), *slices[0])]
+        else:
+            with ThreadPoolExecutor(max_workers=len(slices)) as executor:
+                parts = list(executor.map(lambda bounds: query_sensor_slice(str(client_uuid), *bounds), slices))
+        columns = concat_columns(parts)
+        if SENSOR_MAX_ITEMS:
+            # Every slice stops at the cap, keep the first items of the night overall
+            columns = {field: values[:SENSOR_MAX_ITEMS] for field, values in columns.items()}
+        return columns
     except ClientError as e:
         logger.error(f"Error fetching sensor data: {str(e)}")
         return None
 
-
-def GPT(*data):
+def fetch_sensor_columns(client_uuid: str, start_time: int, end_time: int) -> Optional[Dict[str, Any]]:
+    chunk_table = get_table(CHUNK_TABLE_NAME)
     try:
-        openai_api_key=os.environ['OPENAI_API_KEY']
-        client = OpenAI(api_key=openai_api_key)
-
-        thread = client.beta.threads.create()
+        if not all([client_uuid, start_time, end_time]):
+            logger.warning("Missing required parameters for sensor data fetch")
+            return None
 
-        message = client.beta.threads.messages.create(
-            thread_id=thread.id,
-            role="user",
-            content=f"데이터: {data}"
+        # A chunk is keyed by its first sample, so chunks starting up to
+        # CHUNK_SECONDS before start_time can still hold samples in range
+        chunks = iter_query(
+            chunk_table,
+            'client_uuid = :client_uuid AND #time BETWEEN :start_time AND :end_time',
+            projection=['time', 'offsets', 'columns'],
+            page_size=SENSOR_PAGE_SIZE,
+            **sensor_range_params(client_uuid, start_time - CHUNK_SECONDS, end_time)
         )
+        # Samples uploaded one at a time are stored as sensor_data items
+        samples = fetch_sensor_data(client_uuid, start_time, end_time)
+        return decode_chunks(chunks, start_time, range_end_key(end_time), samples=samples)
+    except ClientError as e:
+        logger.error(f"Error fetching sensor chunks: {str(e)}")
+        return None
+
+
+ASSISTANT_ID = "asst_OiGYNlV63y7lopRWaauXezf6"
+
+# Bump whenever the prompt content or the assistant's instructions change,
+# so cached analyses made with the old prompt are not reused
+PROMPT_VERSION = 'features-v1'
+
+# Run statuses after which polling can stop ('requires_action' is terminal
+# here because the assistant has no tools this function could execute)
+TERMINAL_RUN_STATUSES = {'completed', 'failed', 'cancelled', 'expired', 'incomplete', 'requires_action'}
+
+# 'poll': create the run and poll it, 'stream': follow the run's event stream
+GPT_RUN_MODE = os.environ.get('GPT_RUN_MODE', 'poll')
+POLL_INITIAL_SECONDS = float(os.environ.get('GPT_POLL_INITIAL_SECONDS', '0.5'))
+POLL_MAX_SECONDS = float(os.environ.get('GPT_POLL_MAX_SECONDS', '5'))
+# Stop waiting when less than this much of the invocation is left
+DEADLINE_MARGIN_MS = int(os.environ.get('GPT_DEADLINE_MARGIN_MS', '15000'))
+MAX_RESUME_ATTEMPTS = int(os.environ.get('GPT_MAX_RESUME_ATTEMPTS', '3'))
+
+# Per-container OpenAI token budget (0: unlimited) and the tokens reserved for each answer
+OPENAI_TOKENS_PER_MINUTE = int(os.environ.get('OPENAI_TOKENS_PER_MINUTE', '0'))
+OPENAI_RESPONSE_TOKENS = int(os.environ.get('OPENAI_RESPONSE_TOKENS', '1000'))
+token_bucket = TokenBucket(OPENAI_TOKENS_PER_MINUTE / 60.0, OPENAI_TOKENS_PER_MINUTE) if OPENAI_TOKENS_PER_MINUTE else None
 
-        run = client.beta.threads.runs.create(
-            thread_id=thread.id,
-            assistant_id="asst_OiGYNlV63y7lopRWaauXezf6"
+# Sessions the queue worker analyzes at the same time
+WORKER_CONCURRENCY = int(os.environ.get('ANALYSIS_WORKER_CONCURRENCY', '4'))
+# Kept across warm invocations, so its threads keep their DynamoDB resources
+_worker_pool: Optional[ThreadPoolExecutor] = None
+
+class RunDeadlineExceeded(Exception):
+    """The invocation is about to time out while the assistant run is still going."""
+
+    def __init__(self, thread_id: str, run_id: str):
+        super().__init__(f"Run {run_id} on thread {thread_id} did not finish before the deadline")
+        self.thread_id = thread_id
+        self.run_id = run_id
+
+class TokenBudgetExceeded(Exception):
+    """The token budget has no room for the prompt before the invocation deadline."""
+
+def worker_pool() -> ThreadPoolExecutor:
+    global _worker_pool
+    if _worker_pool is None:
+        _worker_pool = ThreadPoolExecutor(max_workers=max(1, WORKER_CONCURRENCY), thread_name_prefix='analysis')
+    return _worker_pool
+
+def remaining_ms(context: Any) -> Optional[int]:
+    if context is None or not hasattr(context, 'get_remaining_time_in_millis'):
+        return None
+    return context.get_remaining_time_in_millis()
+
+def wait_for_run(client: Any, thread_id: str, run: Any, context: Any) -> Any:
+    """Poll a run with jittered exponential backoff until it reaches a terminal state."""
+    delay = POLL_INITIAL_SECONDS
+    while run.status not in TERMINAL_RUN_STATUSES:
+        left = remaining_ms(context)
+        if left is not None and left < DEADLINE_MARGIN_MS + delay * 1000:
+            raise RunDeadlineExceeded(thread_id, run.id)
+
+        time.sleep(random.uniform(delay / 2, delay))
+        delay = min(delay * 2, POLL_MAX_SECONDS)
+
+        run = client.beta.threads.runs.retrieve(
+            thread_id=thread_id,
+            run_id=run.id
         )
+    return run
+
+def wait_for_token_budget(content: str, context: Any) -> None:
+    if token_bucket is None:
+        return
+    left = remaining_ms(context)
+    timeout = None if left is None else max(0.0, (left - DEADLINE_MARGIN_MS) / 1000)
+    if not token_bucket.acquire(estimate_tokens(content, OPENAI_RESPONSE_TOKENS), timeout):
+        raise TokenBudgetExceeded(f"No token budget for a {len(content)} character prompt before the deadline")
+
+def stream_run(client: Any, thread_id: str, context: Any) -> Any:
+    """Create a run and follow its event stream until it reaches a terminal state."""
+    run = None
+    with client.beta.threads.runs.stream(thread_id=thread_id, assistant_id=ASSISTANT_ID) as stream:
+        for event in stream:
+            if event.event.startswith('thread.run.') and not event.event.startswith('thread.run.step.'):
+                run = event.data
+            left = remaining_ms(context)
+            if run is not None and left is not None and left < DEADLINE_MARGIN_MS:
+                raise RunDeadlineExceeded(thread_id, run.id)
+    # The stream can close before the final status event, poll for the rest
+    return wait_for_run(client, thread_id, run, context)
+
+def GPT(*data, context: Any = None, pending_run: Optional[Dict[str, Any]] = None):
+    """Ask the assistant to analyze ``data``.
 
-        # 실행 완료까지 대기
-        while run.status != "completed":
+    Resumes ``pending_run`` instead of starting a new thread when given.
+    Raises RunDeadlineExceeded when the run outlives the invocation and
+    TokenBudgetExceeded when the prompt does not fit the token budget.
+    """
+    try:
+        client = get_openai_client()
+
+        if pending_run:
+            thread_id = pending_run['thread_id']
             run = client.beta.threads.runs.retrieve(
-                thread_id=thread.id,
-                run_id=run.id
+                thread_id=thread_id,
+                run_id=pending_run['run_id']
             )
+            run = wait_for_run(client, thread_id, run, context)
+        else:
+            content = f"데이터: {dumps(data)}"
+            wait_for_token_budget(content, context)
+
+            thread = client.beta.threads.create()
+            thread_id = thread.id
+
+            message = client.beta.threads.messages.create(
+                thread_id=thread_id,
+                role="user",
+                content=content
+            )
+
+            if GPT_RUN_MODE == 'stream' and hasattr(client.beta.threads.runs, 'stream'):
+                run = stream_run(client, thread_id, context)
+            else:
+                run = client.beta.threads.runs.create(
+                    thread_id=thread_id,
+                    assistant_id=ASSISTANT_ID
+                )
+
+                # 실행 완료까지 대기
+                run = wait_for_run(client, thread_id, run, context)
+
+        if run.status != "completed":
+            logger.error(f"Run {run.id} ended with status {run.status}: {getattr(run, 'last_error', None)}")
+            return None
 
         # 메시지 출력
-        messages = client.beta.threads.messages.list(thread_id=thread.id)
+        messages = client.beta.threads.messages.list(thread_id=thread_id)
         messages = messages.data[0].content[0].text.value
-        logger.info(f"Assistant Message before parsing: {messages}")
+        log_payload(logger, 'Assistant message before parsing', messages)
 
         # Update regex pattern to find JSON block within ```json ... ``` markers
         json_match = re.search(r'```json\s*(\{.*?\})\s*```', messages, re.DOTALL)
         if json_match:
             json_str = json_match.group(1)
-            logger.info(f"Extracted JSON: {json_str}")
+            log_payload(logger, 'Extracted JSON', json_str)
             result = json.loads(json_str)
             return result
         else:
             logger.error("JSON 부분을 찾을 수 없습니다.")
             return None
 
+    except (RunDeadlineExceeded, TokenBudgetExceeded):
+        raise
     except json.JSONDecodeError as e:
         logger.error(f"JSON 파싱 에러: {str(e)}")
         return None
@@ -111,14 +307,149 @@ def GPT(*data):
         logger.error(f"GPT 처리 중 에러 발생: {str(e)}")
         return None
 
+def defer_run(session_uuid: str, data_version: Any, error: RunDeadlineExceeded, attempt: int, context: Any) -> Dict[str, Any]:
+    """Save the unfinished run and hand it to a follow-up invocation."""
+    save_pending_run(session_uuid, data_version, error.thread_id, error.run_id, attempt)
+    if attempt > MAX_RESUME_ATTEMPTS:
+        logger.error(f"Run {error.run_id} still unfinished after {MAX_RESUME_ATTEMPTS} resumes")
+        return create_response(504, {'error': 'GPT run did not finish in time'})
 
-def lambda_handler(event, context):
-    logger.info(f"Received event: {json.dumps(event)}")
+    get_client('lambda').invoke(
+        FunctionName=context.function_name,
+        InvocationType='Event',
+        Payload=dumps({
+            'session_uuid': session_uuid,
+            'resume_attempt': attempt
+        })
+    )
+    log_fields(logger, logging.INFO, 'Deferred unfinished GPT run', session_uuid=session_uuid, run_id=error.run_id, attempt=attempt)
+    return create_response(202, {'message': 'Analysis still running', 'resumable': True})
+
+def read_data_version(session_uuid: str) -> Optional[int]:
+    try:
+        return get_data_version(session_uuid)
+    except ClientError as e:
+        logger.warning(f"Error reading data version: {str(e)}")
+        return None
+
+def is_already_analyzed(session_uuid: str, data_version: Optional[int]) -> bool:
+    # Sessions uploaded before versions were counted have none, analyze them
+    if data_version is None:
+        return False
+    try:
+        return analysis_is_current(session_uuid, data_version)
+    except ClientError as e:
+        # A missing claim record must not block the analysis itself
+        logger.warning(f"Error reading analysis trigger state: {str(e)}")
+        return False
+
+def analysis_input_hash(stages: list, client_uuid: str, start_time: Any, end_time: Any) -> str:
+    """Stable hash of everything the analysis depends on."""
+    inputs = {
+        'stages': stages,
+        'sensor_window': [client_uuid, float(start_time), float(end_time), SENSOR_STORAGE_MODE],
+        'assistant': [ASSISTANT_ID, PROMPT_VERSION]
+    }
+    # Fixed encoding, not dumps: its output differs with and without orjson
+    encoded = json.dumps(inputs, sort_keys=True, separators=(',', ':'), default=decimal_default)
+    return hashlib.sha256(encoded.encode('utf-8')).hexdigest()
+
+def fetch_cached_analysis(session_uuid: str, input_hash: str) -> Optional[Dict[str, Any]]:
+    """Return the stored analysis if it was made from exactly these inputs."""
+    try:
+        response = get_table(ANALYSIS_TABLE).get_item(
+            Key={'session_uuid': session_uuid},
+            ProjectionExpression='score, analysis, input_hash'
+        )
+    except ClientError as e:
+        logger.warning(f"Error reading cached analysis: {str(e)}")
+        return None
+    item = response.get('Item')
+    if item and item.get('input_hash') == input_hash and item.get('analysis') is not None:
+        return item
+    return None
+
+def to_dynamodb(value: Any) -> Any:
+    # DynamoDB rejects floats, round-trip through JSON to turn them into Decimals
+    return json.loads(dumps(value), parse_float=Decimal)
+
+def local_score(session_data: list) -> Dict[str, Any]:
+    # Only a fallback, a failure here must not stop the assistant's analysis
+    try:
+        return score_sleep(session_data)
+    except Exception as e:
+        logger.warning(f"Error computing local score: {str(e)}")
+        return {'score': None, 'metrics': {}}
+
+def store_local_score(session_uuid: str, client_uuid: str, start_time: Any, local_result: Dict[str, Any]) -> None:
+    """Keep a score for the session when the assistant failed, without touching its analysis text."""
+    if local_result['score'] is None:
+        return
+    try:
+        previous = get_table(ANALYSIS_TABLE).update_item(
+            Key={'session_uuid': session_uuid},
+            UpdateExpression='SET score = :score, score_source = :source, local_score = :score, metrics = :metrics, '
+                             'start_time = :start',
+            ExpressionAttributeValues={
+                ':score': local_result['score'],
+                ':source': 'local',
+                ':metrics': to_dynamodb(local_result['metrics']),
+                ':start': start_time
+            },
+            ReturnValues='ALL_OLD'
+        ).get('Attributes', {})
+        previous_start_time = previous.get('start_time')
+        if previous_start_time is not None and summary_key(session_uuid, previous_start_time) != summary_key(session_uuid, start_time):
+            # The summary moves to the new key, keep the excerpt of the stored analysis
+            put_summary(session_uuid, client_uuid, start_time, local_result['score'], 'local', previous.get('analysis'))
+            remove_moved_summary(session_uuid, previous_start_time, start_time)
+        else:
+            update_summary_score(session_uuid, client_uuid, start_time, local_result['score'], 'local')
+        record_score(client_uuid, session_uuid, start_time, local_result['score'], 'local')
+    except ClientError as e:
+        logger.error(f"Error storing local score: {str(e)}")
+
+def store_summary(session_uuid: str, client_uuid: str, start_time: Any, score: Any, score_source: str,
+                  analysis: Optional[str], previous_start_time: Any = None) -> None:
+    # Summaries only feed the listing view and client history, never fail the analysis over them
+    try:
+        put_summary(session_uuid, client_uuid, start_time, score, score_source, analysis)
+        remove_moved_summary(session_uuid, previous_start_time, start_time)
+        record_score(client_uuid, session_uuid, start_time, score, score_source)
+    except ClientError as e:
+        logger.warning(f"Error storing analysis summary: {str(e)}")
+
+def record_analyzed(session_uuid: str, data_version: Optional[int]) -> None:
+    if data_version is None:
+        return
+    try:
+        mark_analyzed(session_uuid, data_version)
+    except ClientError as e:
+        logger.warning(f"Error recording analyzed version: {str(e)}")
+
+def load_pending_run(session_uuid: str, data_version: Any) -> Optional[Dict[str, Any]]:
+    try:
+        pending_run = get_pending_run(session_uuid)
+    except ClientError as e:
+        logger.warning(f"Error reading pending GPT run: {str(e)}")
+        return None
+    # A run started for older data is stale, newer records need a fresh run
+    if pending_run and pending_run.get('data_version') == data_version:
+        return pending_run
+    return None
+
+
+def analyze_session(event, context):
+    log_event(logger, event, session_uuid=event.get('session_uuid'))
     
     session_uuid = str(event.get('session_uuid'))
+
+    # Read before the records: records of any later upload raise the version again
+    data_version = read_data_version(session_uuid)
     
     # Fetch session data from DynamoDB
-    session_data = fetch_session_data(session_uuid)
+    with phase('session_query'):
+        session_data = fetch_session_data(session_uuid)
     
     if not session_data:
         return create_response(404, {'error': 'Session data not found'})
@@ -136,34 +467,152 @@ def lambda_handler(event, context):
         end_time = max(end_times)
 
         logger.info(f"Extracted values - client_uuid: {client_uuid}, start_time: {start_time}, end_time: {end_time}")
+
+        # Deterministic local score, the assistant is only needed for the narrative
+        with phase('local_score'):
+            local_result = local_score(session_data)
+
+        # Skip duplicate triggers unless an upload arrived after the last analysis
+        if not event.get('force') and is_already_analyzed(session_uuid, data_version):
+            return {
+                'message': 'Analysis already up to date',
+                'skipped': True
+            }
         
-        # Fetch sensor data from DynamoDB
-        sensor_data = fetch_sensor_data(client_uuid, start_time, end_time)
+        # Identical inputs were analyzed before: reuse the stored result
+        stages = compact_stages(session_data)
+        input_hash = analysis_input_hash(stages, client_uuid, start_time, end_time)
+        cached = None if event.get('bypass_cache') else fetch_cached_analysis(session_uuid, input_hash)
+        if cached:
+            log_fields(logger, logging.INFO, 'Analysis cache hit', session_uuid=session_uuid, input_hash=input_hash)
+            record_analyzed(session_uuid, data_version)
+            return {
+                'message': 'Analysis completed successfully',
+                'score': cached.get('score'),
+                'analysis': cached.get('analysis'),
+                'cached': True
+            }
+
+        # A previous invocation may have left an unfinished run for this data
+        pending_run = load_pending_run(session_uuid, data_version)
+
+        # Fetch sensor data from DynamoDB and reduce it to per-epoch features
+        # (a resumed run already has them)
+        if pending_run:
+            sensor_features = None
+        else:
+            with phase('sensor_query'):
+                if SENSOR_STORAGE_MODE == 'chunked':
+                    sensor_columns = fetch_sensor_columns(client_uuid, start_time, end_time)
+                else:
+                    sensor_columns = fetch_sensor_data(client_uuid, start_time, end_time)
+            with phase('features'):
+                sensor_features = summarize_sensor_data(sensor_columns, start_time, end_time)
     
     except Exception as e:
         logger.error(f"Error extracting values from session data: {str(e)}")
         return create_response(500, {'error': 'Error processing session data'})
         
     # GPT result
-    gpt_result = GPT(session_data, sensor_data)
+    try:
+        with phase('openai'):
+            gpt_result = GPT(stages, sensor_features, context=context, pending_run=pending_run)
+    except RunDeadlineExceeded as e:
+        return defer_run(session_uuid, data_version, e, int(event.get('resume_attempt', 0)) + 1, context)
+    except TokenBudgetExceeded as e:
+        # Not an assistant failure: no local fallback, the queue retries it later
+        log_fields(logger, logging.WARNING, 'Token budget exhausted', session_uuid=session_uuid, error=str(e))
+        return create_response(503, {'error': str(e)})
+    if pending_run:
+        clear_pending_run(session_uuid)
     if gpt_result is None:
-        return create_response(500, {'error': 'Error processing GPT request'})
+        store_local_score(session_uuid, client_uuid, start_time, local_result)
+        return create_response(500, {'error': 'Error processing GPT request', 'score': local_result['score']})
 
     # Generate random score and analysis
-    score = gpt_result.get('score')
+    if SCORE_SOURCE == 'local' or gpt_result.get('score') is None:
+        score, score_source = local_result['score'], 'local'
+    else:
+        score, score_source = gpt_result.get('score'), 'gpt'
     analysis = gpt_result.get('analysis')
     
     # Store analysis result in DynamoDB
     analysis_item = {
         'session_uuid': session_uuid,
         'score': score,
-        'analysis': analysis
+        'analysis': analysis,
+        'score_source': score_source,
+        'local_score': local_result['score'],
+        'metrics': to_dynamodb(local_result['metrics']),
+        'input_hash': input_hash,
+        # The summary is keyed by it, an earlier start moves the summary
+        'start_time': start_time
     }
-    analysis_table.put_item(Item=analysis_item)
-    logger.info(f"Stored analysis item: {json.dumps(analysis_item)}")
+    with phase('store'):
+        previous = get_table(ANALYSIS_TABLE).put_item(Item=analysis_item, ReturnValues='ALL_OLD').get('Attributes', {})
+        log_fields(logger, logging.INFO, 'Stored analysis item', session_uuid=session_uuid, score=score, analysis_chars=len(analysis or ''))
+        store_summary(session_uuid, client_uuid, start_time, score, score_source, analysis, previous.get('start_time'))
+        record_analyzed(session_uuid, data_version)
     
     return {
         'message': 'Analysis completed successfully',
         'score': score,
         'analysis': analysis
-    }
\ No newline at end of file
+    }
+
+@instrumented('sleep_data_analysis')
+def lambda_handler(event, context):
+    return analyze_session(event, context)
+
+def response_error(response: Dict[str, Any]) -> str:
+    try:
+        return str(json.loads(response.get('body') or '{}').get('error'))
+    except ValueError:
+        return str(response.get('body'))
+
+def process_message(record: Dict[str, Any], context: Any) -> Optional[str]:
+    """Analyze one queued session; returns its messageId when SQS should deliver it again."""
+    attempt = receive_count(record)
+    try:
+        message = parse_message(record)
+    except ValueError as e:
+        logger.error(f"Dead-lettering message {record.get('messageId')}: {str(e)}")
+        dead_letter(f"message:{record.get('messageId')}", None, attempt, str(e), record.get('body'))
+        return None
+
+    session_uuid = str(message['session_uuid'])
+    try:
+        response = analyze_session({'session_uuid': session_uuid}, context)
+        status = response.get('statusCode', 200)
+        error = response_error(response) if status >= 300 else None
+    except Exception as e:
+        logger.error(f"Analysis of {session_uuid} failed: {str(e)}")
+        status, error = 500, str(e)
+
+    # 2xx includes 202, an unfinished run handed to a follow-up invocation
+    if status < 300:
+        return None
+    try:
+        # 4xx (no records, invalid records) will not succeed on a retry
+        if status < 500 or attempt >= MAX_ATTEMPTS:
+            log_fields(logger, logging.ERROR, 'Analysis dead-lettered', session_uuid=session_uuid, attempts=attempt, error=error)
+            dead_letter(session_uuid, message.get('data_version'), attempt, error)
+            return None
+        delay = retry_later(record, attempt)
+        log_fields(logger, logging.WARNING, 'Analysis retry scheduled', session_uuid=session_uuid, attempt=attempt, delay=delay, error=error)
+    except ClientError as e:
+        # Redelivered after the queue's own visibility timeout
+        logger.error(f"Error scheduling retry of {session_uuid}: {str(e)}")
+    return record['messageId']
+
+@instrumented('sleep_analysis_worker')
+def queue_handler(event, context):
+    """SQS entry point for ANALYSIS_TRIGGER_MODE=queue (event source with ReportBatchItemFailures)."""
+    if 'Records' not in event:
+        # Follow-up invocations of deferred runs (see defer_run) are plain events
+        return analyze_session(event, context)
+
+    records = event['Records']
+    log_fields(logger, logging.INFO, 'Analysis batch', messages=len(records))
+    retries = [message_id for message_id in worker_pool().map(lambda record: process_message(record, context), records) if message_id]
+    return {'batchItemFailures': [{'itemIdentifier': message_id} for message_id in retries]}
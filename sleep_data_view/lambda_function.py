@@ -1,26 +1,38 @@
-import json
-import boto3
-import logging
-from typing import Dict, Any
+from typing import Dict, Any, Iterable, Optional
+from html import escape
+from urllib.parse import urlencode
+from boto3.dynamodb.conditions import Key
 from botocore.exceptions import ClientError
-from decimal import Decimal
+from sleep_common.body import get_header
+from sleep_common.logs import log_event
+from sleep_common.metrics import instrumented
+from sleep_common.query import decode_cursor, encode_cursor, fetch_page
+from sleep_common.runtime import get_logger, get_table, gzip_response, html_response
 from datetime import datetime
 
-logger = logging.getLogger()
-logger.setLevel(logging.INFO)
+logger = get_logger()
 
-dynamodb = boto3.resource('dynamodb')
-sleep_records_table = dynamodb.Table('sleep_records')
+SLEEP_RECORDS_TABLE = 'sleep_records'
+# Global secondary index of sleep_records: partition key client_uuid, sort key start_time
+CLIENT_INDEX = 'client_uuid-index'
+RECORD_FIELDS = ['session_uuid', 'client_uuid', 'start_time', 'end_time', 'stage']
 
-def decimal_default(obj):
-    if isinstance(obj, Decimal):
-        return float(obj)
-    raise TypeError
+DEFAULT_PAGE_SIZE = 100
+MAX_PAGE_SIZE = 1000
 
-def fetch_all_sleep_records() -> list:
+def fetch_sleep_records_page(limit: int, cursor: Optional[Dict[str, Any]] = None,
+                             client_uuid: Optional[str] = None, session_uuid: Optional[str] = None) -> tuple:
     try:
-        response = sleep_records_table.scan()
-        return response.get('Items', [])
+        table = get_table(SLEEP_RECORDS_TABLE)
+        if session_uuid:
+            # A session is one partition, no scan needed
+            return fetch_page(table, limit, cursor, key_condition=Key('session_uuid').eq(session_uuid),
+                              projection=RECORD_FIELDS)
+        if client_uuid:
+            # A client's records are one index partition, the page cost does not grow with the table
+            return fetch_page(table, limit, cursor, key_condition=Key('client_uuid').eq(client_uuid),
+                              projection=RECORD_FIELDS, IndexName=CLIENT_INDEX)
+        return fetch_page(table, limit, cursor, projection=RECORD_FIELDS)
     except ClientError as e:
         logger.error(f"Error fetching sleep records: {str(e)}")
         raise
@@ -28,8 +40,9 @@ def fetch_all_sleep_records() -> list:
 def epoch_to_java_instant(epoch_time: int) -> str:
     return datetime.utcfromtimestamp(epoch_time).isoformat() + 'Z'
 
-def generate_html_table(records: list) -> str:
-    html = """
+def generate_html_table(records: Iterable[Dict[str, Any]], next_url: Optional[str] = None) -> str:
+    # Rows are collected in a list and joined once, keeping rendering linear
+    parts = ["""
     <html>
     <head>
         <meta charset="UTF-8">
@@ -44,81 +57,81 @@ def generate_html_table(records: list) -> str:
                 <th>End Time</th>
                 <th>Stage</th>
             </tr>
-    """
+    """]
     for record in records:
         start_time = epoch_to_java_instant(int(record['start_time']))
         end_time = epoch_to_java_instant(int(record['end_time']))
-        html += f"""
+        parts.append(f"""
             <tr>
-                <td>{record['session_uuid']}</td>
+                <td>{escape(str(record['session_uuid']))}</td>
                 <td>{start_time}</td>
                 <td>{end_time}</td>
-                <td>{record['stage']}</td>
+                <td>{escape(str(record['stage']))}</td>
             </tr>
-        """
-    html += """
+        """)
+    parts.append("""
         </table>
+    """)
+    if next_url:
+        parts.append(f"""
+        <p><a href="{escape(next_url)}">Next page</a></p>
+    """)
+    parts.append("""
     </body>
     </html>
-    """
-    return html
+    """)
+    return ''.join(parts)
 
+def parse_limit(value: Optional[str]) -> int:
+    if not value:
+        return DEFAULT_PAGE_SIZE
+    limit = int(value)
+    if limit < 1:
+        raise ValueError('limit must be positive')
+    return min(limit, MAX_PAGE_SIZE)
+
+@instrumented('sleep_data_view')
 def lambda_handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
     try:
-        # Log full event for debugging
-        logger.info(f"Raw event: {json.dumps(event)}")
+        # Log event summary (full event only when payload logging is sampled)
+        log_event(logger, event)
+        
+        # Paging and filter parameters
+        query_params = event.get('queryStringParameters') or {}
+        client_uuid = query_params.get('client_uuid')
+        session_uuid = query_params.get('session_uuid')
+        try:
+            limit = parse_limit(query_params.get('limit'))
+            cursor = decode_cursor(query_params.get('cursor'))
+        except ValueError as e:
+            return html_response(400, f'<html><body><h1>Bad request: {escape(str(e))}</h1></body></html>')
         
-        # Fetch all sleep records
-        sleep_records = fetch_all_sleep_records()
+        # Fetch one page of sleep records
+        sleep_records, last_key = fetch_sleep_records_page(limit, cursor, client_uuid, session_uuid)
         
-        if not sleep_records:
-            return {
-                'statusCode': 404,
-                'headers': {
-                    'Content-Type': 'text/html; charset=UTF-8'
-                },
-                'body': '<html><body><h1>No sleep records found</h1></body></html>'
-            }
+        if not sleep_records and cursor is None:
+            return html_response(404, '<html><body><h1>No sleep records found</h1></body></html>')
         
-        # Extract relevant data
-        records = [
-            {
-                'session_uuid': record['session_uuid'],
-                'start_time': record['start_time'],
-                'end_time': record['end_time'],
-                'stage': record['stage']
-            }
-            for record in sleep_records
-        ]
+        next_url = None
+        if last_key:
+            next_params = {name: value for name, value in (
+                ('client_uuid', client_uuid),
+                ('session_uuid', session_uuid),
+                ('limit', str(limit)),
+                ('cursor', encode_cursor(last_key)),
+            ) if value}
+            next_url = f"{event.get('path') or ''}?{urlencode(next_params)}"
         
         # Generate HTML table
-        html_content = generate_html_table(records)
+        html_content = generate_html_table(sleep_records, next_url)
         
-        return {
-            'statusCode': 200,
-            'headers': {
-                'Content-Type': 'text/html; charset=UTF-8'
-            },
-            'body': html_content
-        }
+        return gzip_response(html_response(200, html_content), get_header(event, 'Accept-Encoding'))
 
     except ClientError as e:
         logger.error(f"DynamoDB error: {str(e)}")
-        return {
-            'statusCode': 500,
-            'headers': {
-                'Content-Type': 'text/html; charset=UTF-8'
-            },
-            'body': f'<html><body><h1>DynamoDB error: {str(e)}</h1></body></html>'
-        }
+        return html_response(500, f'<html><body><h1>DynamoDB error: {escape(str(e))}</h1></body></html>')
     except Exception as e:
         logger.error(f"Unexpected error: {str(e)}")
         import traceback
         logger.error(traceback.format_exc())
-        return {
-            'statusCode': 500,
-            'headers': {
-                'Content-Type': 'text/html; charset=UTF-8'
-            },
-            'body': f'<html><body><h1>Unexpected error: {str(e)}</h1></body></html>'
-        }
\ No newline at end of file
+        return html_response(500, f'<html><body><h1>Unexpected error: {escape(str(e))}</h1></body></html>')
\ No newline at end of file
@@ -0,0 +1,22 @@
+import os
+import sys
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+# The shared layer is importable as in Lambda, where it is mounted at /opt/python
+sys.path.insert(0, os.path.join(ROOT, 'layer', 'python'))
+sys.path.insert(0, os.path.join(ROOT, 'benchmarks'))
+
+@pytest.fixture
+def fakes():
+    """Fresh in-memory DynamoDB, Lambda, SQS and OpenAI stand-ins from benchmarks/fakes.py."""
+    pytest.importorskip('boto3')
+    from fakes import install_fakes
+    return install_fakes()
+
+@pytest.fixture
+def load_handler():
+    """Import a handler module fresh, so its module-level configuration is re-read."""
+    from bench_handlers import load_handler
+    return load_handler
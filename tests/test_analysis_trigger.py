@@ -0,0 +1,70 @@
+"""Claiming and releasing analysis runs against upload-counted data versions."""
+import json
+
+import pytest
+
+from bench_handlers import NIGHT_START, stage_rows
+
+@pytest.fixture
+def trigger(fakes):
+    from sleep_common import analysis_trigger
+    return analysis_trigger
+
+def upload_event(records):
+    return {'httpMethod': 'POST', 'queryStringParameters': {'client_uuid': 'client-0'},
+            'body': json.dumps({'sleep_data': records})}
+
+def sleep_records(rows, end=True):
+    records = [{'sessionId': row['session_uuid'], 'startTime': row['start_time'],
+                'endTime': row['end_time'], 'stage': row['stage']} for row in rows]
+    records[-1]['end'] = end
+    return records
+
+def test_record_upload_counts_uploads(trigger):
+    assert trigger.get_data_version('night') is None
+    assert [trigger.record_upload('night') for _ in range(3)] == [1, 2, 3]
+    assert trigger.get_data_version('night') == 3
+
+def test_a_version_is_claimed_once(trigger):
+    assert trigger.claim_analysis('night', 1)
+    assert not trigger.claim_analysis('night', 1)
+    assert trigger.claim_analysis('night', 2)
+    assert not trigger.claim_analysis('night', 1)
+
+def test_released_claims_can_be_claimed_again(trigger):
+    assert trigger.claim_analysis('night', 1)
+    trigger.release_claim('night', 1)
+    assert trigger.claim_analysis('night', 1)
+
+def test_expired_claims_are_reclaimed_until_analyzed(trigger, monkeypatch):
+    assert trigger.claim_analysis('night', 1)
+    monkeypatch.setattr(trigger, 'CLAIM_TIMEOUT_SECONDS', -1)
+    assert trigger.claim_analysis('night', 1)
+    trigger.mark_analyzed('night', 1)
+    assert not trigger.claim_analysis('night', 1)
+
+def test_analysis_is_current(trigger):
+    trigger.record_upload('night')
+    assert not trigger.analysis_is_current('night')
+    trigger.mark_analyzed('night', 1)
+    assert trigger.analysis_is_current('night') and trigger.analysis_is_current('night', 1)
+    trigger.record_upload('night')
+    assert not trigger.analysis_is_current('night')
+    assert trigger.analysis_is_current('night', 1) and not trigger.analysis_is_current('night', 2)
+
+def test_late_earlier_records_trigger_a_new_analysis(fakes, load_handler):
+    receive = load_handler('recieve_sleep_data')
+    analysis = load_handler('sleep_data_analysis')
+    rows = stage_rows('night', 20, start=NIGHT_START + 600)
+
+    assert receive.lambda_handler(upload_event(sleep_records(rows)), None)['statusCode'] == 200
+    assert len(fakes.lambda_client.invocations) == 1
+    assert 'skipped' not in analysis.lambda_handler({'session_uuid': 'night'}, None)
+    assert analysis.lambda_handler({'session_uuid': 'night'}, None)['skipped']
+
+    # Records from before the first upload's start arrive after its analysis
+    earlier = stage_rows('night', 20, start=NIGHT_START)
+    assert receive.lambda_handler(upload_event(sleep_records(earlier)), None)['statusCode'] == 200
+    assert len(fakes.lambda_client.invocations) == 2
+    result = analysis.lambda_handler({'session_uuid': 'night'}, None)
+    assert 'skipped' not in result and not result.get('cached')
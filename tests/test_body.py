@@ -0,0 +1,50 @@
+"""Decoding of ingest request bodies."""
+import base64
+import gzip
+import json
+
+import pytest
+
+from sleep_common import body
+from sleep_common.body import BodyDecodeError, decode_body
+
+PAYLOAD = {'client': 'client-0', 'samples': [{'timestamp_ms': 1700000000000, 'data': {'hr': 61}}]}
+
+def binary_event(raw, **headers):
+    return {'body': base64.b64encode(raw).decode('ascii'), 'isBase64Encoded': True, 'headers': headers}
+
+def test_plain_json_and_parsed_bodies():
+    assert decode_body({'body': json.dumps(PAYLOAD)}) == PAYLOAD
+    assert decode_body({'body': PAYLOAD}) == PAYLOAD
+
+def test_base64_gzip_json():
+    event = binary_event(gzip.compress(json.dumps(PAYLOAD).encode('utf-8')), **{'content-encoding': 'gzip'})
+    assert decode_body(event) == PAYLOAD
+    assert decode_body(binary_event(json.dumps(PAYLOAD).encode('utf-8'))) == PAYLOAD
+
+@pytest.mark.parametrize('event, status', [
+    ({}, 400),
+    ({'body': '{"client": '}, 400),
+    ({'body': '%%%', 'isBase64Encoded': True}, 400),
+    (binary_event(b'not gzip', **{'Content-Encoding': 'gzip'}), 400),
+    (binary_event(b'{}', **{'Content-Encoding': 'br'}), 415),
+])
+def test_invalid_bodies(event, status):
+    with pytest.raises(BodyDecodeError) as error:
+        decode_body(event)
+    assert error.value.status_code == status
+
+def test_decoded_size_is_limited(monkeypatch):
+    monkeypatch.setattr(body, 'MAX_DECODED_BYTES', 1024)
+    event = binary_event(gzip.compress(b'[' + b'0,' * 4096 + b'0]'), **{'Content-Encoding': 'gzip'})
+    with pytest.raises(BodyDecodeError) as error:
+        decode_body(event)
+    assert error.value.status_code == 413
+
+def test_missing_codecs_are_unsupported(monkeypatch):
+    monkeypatch.setattr(body, 'msgpack', None)
+    monkeypatch.setattr(body, 'cbor2', None)
+    for content_type in ('application/msgpack', 'application/cbor'):
+        with pytest.raises(BodyDecodeError) as error:
+            decode_body(binary_event(b'\x80', **{'Content-Type': content_type}))
+        assert error.value.status_code == 415
@@ -0,0 +1,24 @@
+"""Opaque pagination cursors."""
+from decimal import Decimal
+
+import pytest
+
+from sleep_common.query import decode_cursor, encode_cursor
+
+@pytest.mark.parametrize('last_key', [
+    {'client_uuid': 'client-0', 'time': Decimal('1700000000.123000001')},
+    {'month': '2023-11', 'sort_key': '2023-11-14T22:13:20Z#세션'},
+    {'session_uuid': 'night', 'start_time': Decimal(1700000000)},
+])
+def test_cursor_round_trip(last_key):
+    cursor = encode_cursor(last_key)
+    assert '=' not in cursor and '/' not in cursor and '+' not in cursor
+    assert decode_cursor(cursor) == last_key
+
+def test_empty_cursor():
+    assert encode_cursor(None) is None and decode_cursor('') is None
+
+@pytest.mark.parametrize('cursor', ['%%%', 'bm90IGpzb24', 'WzEsMl0'])
+def test_malformed_cursor(cursor):
+    with pytest.raises(ValueError):
+        decode_cursor(cursor)
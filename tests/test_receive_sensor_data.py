@@ -0,0 +1,42 @@
+"""receiveSensorData storage modes against the in-memory DynamoDB."""
+import json
+
+import pytest
+
+def sensor_event(**body):
+    return {'httpMethod': 'POST', 'body': json.dumps({'client': 'client-0', **body})}
+
+@pytest.fixture
+def receive(fakes, load_handler, monkeypatch):
+    module = load_handler('receiveSensorData')
+    monkeypatch.setattr(module, 'STORAGE_MODE', 'chunked')
+    return module
+
+def test_single_samples_stay_items_and_merge_into_chunks(fakes, receive, load_handler):
+    samples = [{'timestamp_ms': 1700000000000 + second * 1000, 'data': {'hr': 60 + second}} for second in range(0, 10, 2)]
+    assert receive.lambda_handler(sensor_event(samples=samples), None)['statusCode'] == 200
+    response = receive.lambda_handler(sensor_event(timestamp_ms=1700000003000, data={'hr': 63}), None)
+    assert response['statusCode'] == 200
+    assert len(fakes.dynamodb.Table('sensor_data_chunks').items) == 1
+    assert len(fakes.dynamodb.Table('sensor_data').items) == 1
+
+    analysis = load_handler('sleep_data_analysis')
+    columns = analysis.fetch_sensor_columns('client-0', 1700000000, 1700000010)
+    assert list(columns['hr']) == [60.0, 62.0, 63.0, 64.0, 66.0, 68.0]
+
+def test_batch_samples_beyond_float_range_are_rejected(receive):
+    samples = [{'timestamp_ms': 1700000000000, 'data': {'count': 2 ** 64}},
+               {'timestamp_ms': 1700000001000, 'data': {'count': 10 ** 400}}]
+    response = receive.lambda_handler(sensor_event(samples=samples), None)
+    assert json.loads(response['body']) == {'accepted': 1, 'rejected': 1}
+
+@pytest.mark.parametrize('body', [
+    {'data': {'hr': 61}},
+    {'client': '', 'data': {'hr': 61}},
+    {'client': ['client-0'], 'data': {'hr': 61}},
+    {'client': 'client-0'},
+    {'client': 'client-0', 'data': [61]},
+    {'client': 'client-0', 'samples': {'hr': 61}},
+])
+def test_malformed_bodies_are_rejected(receive, body):
+    assert receive.lambda_handler({'httpMethod': 'POST', 'body': json.dumps(body)}, None)['statusCode'] == 400
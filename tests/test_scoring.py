@@ -0,0 +1,44 @@
+"""Local sleep scoring from stage interval records."""
+import pytest
+
+pytest.importorskip('numpy')
+
+from sleep_common.scoring import score_sleep, sleep_metrics  # noqa: E402
+
+START = 1700000000
+
+def night(*stages, epoch=30):
+    """One record per ``epoch`` seconds with the given stage codes."""
+    return [
+        {'start_time': START + index * epoch, 'end_time': START + (index + 1) * epoch, 'stage': stage}
+        for index, stage in enumerate(stages)
+    ]
+
+def test_healthy_night_scores_high():
+    # 10 min awake, then 8 h of light, deep and REM sleep
+    records = night(*([1] * 20 + [4, 4, 5, 5, 6] * 192))
+    result = score_sleep(records)
+    assert result['score'] >= 85
+    assert result['metrics']['total_sleep_minutes'] == 480.0
+    assert result['metrics']['sleep_onset_latency_minutes'] == 10.0
+
+def test_night_without_sleep_scores_zero():
+    assert score_sleep(night(*[1] * 960))['score'] == 0
+
+def test_only_unknown_stages_have_no_score():
+    assert score_sleep(night(*[0] * 960))['score'] is None
+    assert score_sleep([])['score'] is None
+
+@pytest.mark.parametrize('stage', [-1, 8, 99])
+def test_out_of_range_stages_count_as_unknown(stage):
+    metrics = sleep_metrics(night(4, stage, 5))
+    assert metrics['stage_minutes'] == {'unknown': 0.5, 'light': 0.5, 'deep': 0.5}
+    assert score_sleep(night(*[stage] * 10))['score'] is None
+
+def test_overlapping_records_are_counted_once():
+    records = night(4, 4) + [{'start_time': START + 15, 'end_time': START + 45, 'stage': 4}]
+    assert sleep_metrics(records)['total_sleep_minutes'] == 1.0
+
+def test_records_missing_fields_are_ignored():
+    records = night(4, 5) + [{'start_time': START, 'stage': 4}, {'start_time': START, 'end_time': START + 30}]
+    assert sleep_metrics(records)['total_sleep_minutes'] == 1.0
@@ -0,0 +1,90 @@
+"""Round trips of the chunked sensor storage format."""
+import math
+import struct
+from decimal import Decimal
+
+import pytest
+
+from sleep_common import sensor_chunks
+from sleep_common.sensor_chunks import decode_chunks, decode_column, encode_chunks, encode_column
+
+@pytest.fixture(params=['numpy', 'array'])
+def decoder(request, monkeypatch):
+    """Run a test against both decode paths."""
+    if request.param == 'numpy':
+        pytest.importorskip('numpy')
+    else:
+        monkeypatch.setattr(sensor_chunks, 'np', None)
+    return request.param
+
+def bits(values):
+    return [struct.pack('<d', float(value)) for value in values]
+
+def test_int_column_round_trip(decoder):
+    values = [0, 5, -3, 2 ** 40, -(2 ** 40), 7]
+    assert encode_column(values)[:1] == sensor_chunks.INT_COLUMN
+    assert list(decode_column(encode_column(values))) == [float(value) for value in values]
+
+def test_int_column_beyond_int64_is_stored_as_floats(decoder):
+    values = [2 ** 63 - 1, -(2 ** 63), 2 ** 64]
+    assert encode_column(values)[:1] == sensor_chunks.FLOAT_COLUMN
+    assert list(decode_column(encode_column(values))) == [float(value) for value in values]
+    assert sensor_chunks.fits_column({'count': 2 ** 64}) and not sensor_chunks.fits_column({'count': Decimal('1e400')})
+
+def test_float_column_round_trip_is_bit_exact(decoder):
+    values = [72.5, 72.5, -0.0, 1e-300, 1e300, 0.1 + 0.2, float('inf')]
+    assert encode_column(values)[:1] == sensor_chunks.FLOAT_COLUMN
+    assert bits(decode_column(encode_column(values))) == bits(values)
+
+def test_missing_values_decode_as_nan(decoder):
+    decoded = list(decode_column(encode_column([1, None, 3])))
+    assert decoded[0] == 1.0 and math.isnan(decoded[1]) and decoded[2] == 3.0
+
+def test_decode_accepts_binary_wrappers(decoder):
+    class Binary:
+        def __init__(self, value):
+            self.value = value
+
+    assert list(decode_column(Binary(encode_column([1, 2])))) == [1.0, 2.0]
+
+def test_chunks_round_trip(decoder):
+    samples = [(Decimal('1700000000.001') + second, {'hr': 60 + second % 7, 'x': 0.25 * second})
+               for second in range(150)]
+    items = encode_chunks('client-0', samples)
+    assert len(items) == 3
+    assert all(item['time'] <= samples[-1][0] for item in items)
+
+    columns = decode_chunks(items)
+    assert [round(value, 3) for value in columns['time']] == [float(time) for time, _ in samples]
+    assert list(columns['hr']) == [float(data['hr']) for _, data in samples]
+    assert bits(columns['x']) == bits(data['x'] for _, data in samples)
+
+def test_fields_missing_from_a_chunk_are_nan(decoder):
+    samples = [(1700000000 + second, {'hr': 60} if second < 60 else {'hr': 61, 'spo2': 97})
+               for second in range(120)]
+    columns = decode_chunks(encode_chunks('client-0', samples))
+    assert all(math.isnan(value) for value in list(columns['spo2'])[:60])
+    assert list(columns['spo2'])[60:] == [97.0] * 60
+
+def test_non_numeric_fields_are_dropped(decoder):
+    columns = decode_chunks(encode_chunks('client-0', [(1700000000, {'hr': Decimal('61.5'), 'label': 'x', 'flag': True})]))
+    assert set(columns) == {'time', 'hr'}
+    assert list(columns['hr']) == [61.5]
+
+def test_decode_chunks_filters_the_range(decoder):
+    items = encode_chunks('client-0', [(1700000000 + second, {'hr': second}) for second in range(120)])
+    columns = decode_chunks(items, start=1700000010, end=1700000019)
+    assert list(columns['hr']) == [float(second) for second in range(10, 20)]
+    assert len(decode_chunks([])['time']) == 0
+
+def test_overlapping_chunks_merge_in_time_order(decoder):
+    # A retried request and a later one that both wrote into the same minutes
+    first = encode_chunks('client-0', [(1700000000 + second * 2, {'hr': second * 2}) for second in range(45)])
+    second = encode_chunks('client-0', [(1700000001 + second, {'hr': second + 1, 'spo2': 97}) for second in range(100)])
+    columns = decode_chunks(first + second + first)
+    assert list(columns['time']) == [float(1700000000 + second) for second in range(101)]
+    assert list(columns['hr']) == [float(second) for second in range(101)]
+    assert list(columns['spo2'])[1::2] == [97.0] * 50
+
+    columns = decode_chunks(first + second, start=1700000030, end=1700000039)
+    assert list(columns['hr']) == [float(second) for second in range(30, 40)]
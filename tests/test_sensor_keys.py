@@ -0,0 +1,46 @@
+"""Millisecond/sequence sort keys of sensor_data and their time slices."""
+from decimal import Decimal
+
+import pytest
+
+from sleep_common.sensor_keys import range_end_key, sample_time_key, sensor_time_key, time_slices
+
+def test_sensor_time_keys_order_and_collide_only_for_the_same_sample():
+    keys = [sensor_time_key(1700000000123, seq) for seq in range(3)] + [sensor_time_key(1700000000124)]
+    assert keys == sorted(keys) and len(set(keys)) == len(keys)
+    assert sample_time_key({'timestamp_ms': 1700000000123, 'seq': 1}) == keys[1]
+    assert sample_time_key({'time': 1700000000}) == Decimal(1700000000)
+
+@pytest.mark.parametrize('sample', [
+    {'timestamp_ms': 1700000000123, 'seq': -1},
+    {'timestamp_ms': 1700000000123, 'seq': 10 ** 6},
+    {'timestamp_ms': True},
+    {'timestamp_ms': 1700000000123.5},
+])
+def test_invalid_sample_keys(sample):
+    with pytest.raises(ValueError):
+        sample_time_key(sample)
+
+def test_range_end_key_covers_the_last_sample_of_the_second():
+    assert sensor_time_key(1700000000999, 10 ** 6 - 1) <= range_end_key(1700000000) < Decimal(1700000001)
+
+@pytest.mark.parametrize('start, end, slices', [
+    (1700000000, 1700028800, 4),
+    (Decimal('1700000000.5'), 1700000007, 3),
+    (1700000000, 1700000002, 8),
+    (1700000000, 1700000000, 4),
+])
+def test_time_slices_cover_every_key_once(start, end, slices):
+    ranges = time_slices(start, end, slices)
+    assert 1 <= len(ranges) <= slices
+    assert ranges[0][0] == Decimal(str(start)) and ranges[-1][1] == range_end_key(end)
+    for (_, high), (low, _) in zip(ranges, ranges[1:]):
+        assert high < low and low == int(low)
+
+    # The first and last keys of every second next to a slice boundary
+    seconds = {int(start), int(end)} | {int(low) + offset for low, _ in ranges for offset in (-1, 0)}
+    keys = [sensor_time_key(second * 1000 + millis, seq)
+            for second in seconds if int(start) <= second <= int(end)
+            for millis, seq in ((0, 0), (999, 10 ** 6 - 1))]
+    for key in [Decimal(str(start))] + [key for key in keys if key >= Decimal(str(start))]:
+        assert sum(low <= key <= high for low, high in ranges) == 1